@@ -0,0 +1,101 @@
+from ont.api import OntologyAPI
+
+import ont.management
+import os
+import time
+
+# Times OntologyAPI.remove_concept(include_usages=True) on a heavily used concept.
+# Run from the repository root against a live mongod, e.g.:
+#   python -m benchmarks.remove_concept usages=5000 subclasses=500
+
+DATABASE = "benchmark"
+COLLECTION = "remove_concept"
+
+
+def populate(collection, usages: int, subclasses: int):
+    concepts = [
+        {
+            "name": "all",
+            "parents": [],
+            "localProperties": [],
+            "overriddenFillers": [],
+            "totallyRemovedProperties": [],
+        },
+        {
+            "name": "popular",
+            "parents": ["all"],
+            "localProperties": [],
+            "overriddenFillers": [],
+            "totallyRemovedProperties": [],
+        },
+    ]
+
+    for i in range(subclasses):
+        concepts.append(
+            {
+                "name": "subclass-%d" % i,
+                "parents": ["popular"],
+                "localProperties": [],
+                "overriddenFillers": [],
+                "totallyRemovedProperties": [],
+            }
+        )
+
+    for i in range(usages):
+        concepts.append(
+            {
+                "name": "user-%d" % i,
+                "parents": ["all"],
+                "localProperties": [
+                    {"slot": "theme", "facet": "sem", "filler": "popular"},
+                    {"slot": "agent", "facet": "sem", "filler": "all"},
+                ],
+                "overriddenFillers": [],
+                "totallyRemovedProperties": [],
+            }
+        )
+
+    collection.insert_many(concepts)
+    ont.management.ensure_indexes(collection.name)
+    ont.management.invalidate(collection)
+
+
+def run(usages: int = 5000, subclasses: int = 500):
+    ont.management.DATABASE = DATABASE
+    os.environ[ont.management.ONTOLOGY_ACTIVE] = COLLECTION
+
+    client = ont.management.getclient()
+    client.drop_database(DATABASE)
+
+    try:
+        collection = ont.management.handle()
+        populate(collection, usages, subclasses)
+
+        start = time.time()
+        OntologyAPI(collection).remove_concept("popular", include_usages=True)
+        elapsed = time.time() - start
+
+        remaining = collection.count_documents({"localProperties.filler": "popular"})
+        orphaned = collection.count_documents({"parents": "popular"})
+
+        print(
+            "remove_concept: %d usages, %d subclasses in %.3fs (%d usages and %d subclasses left)"
+            % (usages, subclasses, elapsed, remaining, orphaned)
+        )
+    finally:
+        client.drop_database(DATABASE)
+
+
+if __name__ == "__main__":
+    import sys
+
+    kwargs = {}
+    for arg in sys.argv:
+        if "=" in arg:
+            k = arg.split("=")[0]
+            v = arg.split("=")[1]
+
+            if k in ["usages", "subclasses"]:
+                kwargs[k] = int(v)
+
+    run(**kwargs)
@@ -1,8 +1,81 @@
-from typing import Dict, List, Union
-
+from contextlib import contextmanager
+from ont.hierarchy import Hierarchy
+from pymongo import DeleteOne, InsertOne, UpdateMany, UpdateOne
+from typing import Dict, List, Set, Tuple, Union
+
+import functools
+import ont.hierarchy
+import ont.instrumentation
 import ont.management
+import ont.relations
+import pymongo.errors
+
+# The arguments each edit operation takes, and the update each property edit makes
+EDITS = {
+    "update_definition": ["concept", "definition"],
+    "insert_property": ["concept", "slot", "facet", "filler"],
+    "remove_property": ["concept", "slot", "facet", "filler"],
+    "block_property": ["concept", "slot", "facet", "filler"],
+    "unblock_property": ["concept", "slot", "facet", "filler"],
+    "add_parent": ["concept", "parent"],
+    "remove_parent": ["concept", "parent"],
+    "add_concept": ["concept", "parent", "definition"],
+    "remove_concept": ["concept", "include_usages"],
+}
+
+EDIT_DEFAULTS = {"include_usages": False}
+
+# The facets that constrain a slot's fillers, strictest first
+CONSTRAINT_FACETS = ["default", "sem", "relaxable-to"]
+
+PROPERTY_EDITS = {
+    "insert_property": ("$push", "localProperties"),
+    "remove_property": ("$pull", "localProperties"),
+    "block_property": ("$push", "totallyRemovedProperties"),
+    "unblock_property": ("$pull", "totallyRemovedProperties"),
+}
+
+
+def snapshot(method):
+    # Pins the collection version for the length of a multi-step read; if an edit was
+    # being made, or lands, while the read is running, the (possibly torn) result is
+    # discarded and the read retried. A read that cannot be made at a settled version
+    # fails rather than return what it saw.
+    @functools.wraps(method)
+    def pinned(self, *args, **kwargs):
+        if self._pinned:
+            return method(self, *args, **kwargs)
+
+        self._pinned = True
+        try:
+            for attempt in range(ont.management.READ_ATTEMPTS):
+                version, writing = ont.management.pinned_version(self.collection)
+                if version != self._version:
+                    self._cache = {}
+                    self._relations = None
+                    self._resolved = {}
+                    self._materialized_at = None
+                    self._version = version
+
+                result = method(self, *args, **kwargs)
+                if not writing and ont.management.version(self.collection) == version:
+                    return result
+
+                # What was cached may be torn, and the version need not move before the
+                # next attempt
+                self._version = None
+        finally:
+            self._pinned = False
+
+        raise Exception(
+            "Could not read %s at a settled version; it is being edited."
+            % self.collection.name
+        )
+
+    return pinned
 
 
+@ont.instrumentation.instrumented
 class OntologyAPI(object):
 
     def __init__(self, collection=None):
@@ -11,6 +84,11 @@ class OntologyAPI(object):
         else:
             self.collection = collection
         self._cache = {}
+        self._relations = None
+        self._resolved = {}
+        self._materialized_at = None
+        self._version = None
+        self._pinned = False
 
     def list(self) -> List[str]:
         pipeline = [
@@ -43,25 +121,75 @@ class OntologyAPI(object):
         results = list(map(lambda r: r["name"], results))
         return sorted(results)
 
+    @snapshot
     def get(
         self,
         concepts: Union[str, List[str]],
         local: bool = False,
         metadata: bool = False,
+        slots: List[str] = None,
+        facets: List[str] = None,
     ) -> List[dict]:
         if isinstance(concepts, str):
             concepts = [concepts]
 
         concepts = list(map(lambda c: c.lower(), concepts))
 
+        pipeline = [{"$match": {"name": {"$in": concepts}}}]
+        if not local:
+            # Fetches every ancestor along with the concepts, in the same round trip, so
+            # that inheritance then resolves in memory whatever the depth
+            pipeline.append(
+                {
+                    "$graphLookup": {
+                        "from": self.collection.name,
+                        "startWith": "$parents",
+                        "connectFromField": "parents",
+                        "connectToField": "name",
+                        "as": "_ancestors",
+                    }
+                }
+            )
+        if self._includes("subclasses", slots, facets):
+            # And the names of their children, so that a cold hierarchy index is never
+            # built just to list subclasses
+            pipeline.append(
+                {
+                    "$graphLookup": {
+                        "from": self.collection.name,
+                        "startWith": "$name",
+                        "connectFromField": "name",
+                        "connectToField": "parents",
+                        "as": "_children",
+                        "maxDepth": 0,
+                    }
+                }
+            )
+            pipeline.append({"$addFields": {"_children": "$_children.name"}})
+
+        records = list(self.collection.aggregate(pipeline))
+        children = {}
+        for record in records:
+            self.cache(record.pop("_ancestors", []))
+            children[record["name"]] = record.pop("_children", None)
+        self.cache(records)
+
         results = []
-        for record in self.collection.find(
-            {"$or": list(map(lambda concept: {"name": concept}, concepts))}
-        ):
-            results.append(self.format(record, local=local, metadata=metadata))
+        for record in records:
+            results.append(
+                self.format(
+                    record,
+                    local=local,
+                    metadata=metadata,
+                    slots=slots,
+                    facets=facets,
+                    subclasses=children[record["name"]],
+                )
+            )
 
         return results
 
+    @snapshot
     def ancestors(
         self,
         concept: str,
@@ -139,6 +267,7 @@ class OntologyAPI(object):
             return output[0]
         return output
 
+    @snapshot
     def descendants(
         self,
         concept: str,
@@ -176,7 +305,20 @@ class OntologyAPI(object):
                 }
             )
 
-        result = list(self.collection.aggregate(pipeline))[0]
+        if not immediate and self._materialized():
+            # An indexed lookup on the materialized ancestors, instead of a $graphLookup
+            records = list(
+                self.collection.find(
+                    {"$or": [{"name": concept}, {"ancestors": concept}]}
+                )
+            )
+            result = list(filter(lambda r: r["name"] == concept, records))[0]
+            result["descendants"] = list(
+                filter(lambda r: r["name"] != concept, records)
+            )
+        else:
+            result = list(self.collection.aggregate(pipeline))[0]
+
         self.cache([result])
         self.cache(result["descendants"])
 
@@ -230,43 +372,12 @@ class OntologyAPI(object):
     def siblings(self, concept: str) -> List[str]:
         concept = concept.lower()
 
-        pipeline = [
-            {"$match": {"name": concept}},
-            {
-                "$graphLookup": {
-                    "from": self.collection.name,
-                    "startWith": "$parents",
-                    "connectFromField": "name",
-                    "connectToField": "parents",
-                    "as": "children",
-                    "maxDepth": 1,
-                }
-            },
-            {"$unwind": "$children"},
-            {
-                "$project": {
-                    "name": "$children.name",
-                    "iparents": {
-                        "$gt": [
-                            {
-                                "$size": {
-                                    "$setIntersection": [
-                                        "$parents",
-                                        "$children.parents",
-                                    ]
-                                }
-                            },
-                            0,
-                        ]
-                    },
-                }
-            },
-            {"$match": {"name": {"$ne": concept}}},
-            {"$match": {"iparents": True}},
-        ]
+        hierarchy = self.hierarchy()
 
-        siblings = list(self.collection.aggregate(pipeline))
-        siblings = list(map(lambda s: s["name"], siblings))
+        siblings = set()
+        for parent in hierarchy.parents.get(concept, []):
+            siblings.update(hierarchy.children.get(parent, []))
+        siblings.discard(concept)
         siblings = sorted(siblings)
 
         return siblings
@@ -343,68 +454,71 @@ class OntologyAPI(object):
         return results
 
     def full_ancestry(self) -> dict:
-        pipeline = [
-            {
-                "$graphLookup": {
-                    "from": self.collection.name,
-                    "startWith": "$parents",
-                    "connectFromField": "parents",
-                    "connectToField": "name",
-                    "as": "ancestors",
-                }
-            },
-            {"$project": {"ancestry": "$ancestors.name", "name": 1}},
-        ]
-
         ancestry = {}
-        for d in self.collection.aggregate(pipeline):
-            ancestry[d["name"]] = set(d["ancestry"])
+        for concept, ancestors in self.hierarchy().closure().items():
+            ancestry[concept] = set(ancestors)
         return ancestry
 
+    @snapshot
     def relations_to_inverses(self) -> dict:
+        return dict(ont.relations.load(self.collection, self.hierarchy()))
+
+    @snapshot
+    def check_fillers(self, triples: List[Tuple[str, str, str]]) -> List[dict]:
+        # Tests each (concept, slot, filler) against the concept's inherited constraints on
+        # the slot. The constraints are resolved for all concepts and slots at once, and
+        # subsumption is answered from the hierarchy index, so the cost is one get() however
+        # many triples there are. The verdict is the strictest facet the filler satisfies.
+        triples = list(
+            map(lambda t: (t[0].lower().strip(), t[1].lower().strip(), t[2]), triples)
+        )
 
-        pipeline = [
-            {"$match": {"name": "relation"}},
-            {
-                "$graphLookup": {
-                    "from": self.collection.name,
-                    "startWith": "$name",
-                    "connectFromField": "name",
-                    "connectToField": "parents",
-                    "as": "descendants",
-                }
-            },
-            {"$unwind": {"path": "$descendants"}},
-            {"$replaceRoot": {"newRoot": "$descendants"}},
-            {
-                "$graphLookup": {
-                    "from": "canonical-v.1.0.1",
-                    "startWith": "$parents",
-                    "connectFromField": "parents",
-                    "connectToField": "name",
-                    "as": "ancestors",
-                }
-            },
-            {"$addFields": {"ancestry": {"$setUnion": ["$ancestors.name", ["$name"]]}}},
-            {"$project": {"ancestors": 0}},
-        ]
+        concepts = list(set(map(lambda t: t[0], triples)))
+        slots = list(set(map(lambda t: t[1], triples)))
 
-        results = list(self.collection.aggregate(pipeline))
+        frames = {}
+        if len(triples) > 0:
+            for frame in self.get(concepts, slots=slots, facets=CONSTRAINT_FACETS):
+                frames.update(frame)
+
+        hierarchy = self.hierarchy()
 
-        relations = {"relation": "relation"}
-        for r in results:
-            for lp in r["localProperties"]:
-                if lp["slot"] == "inverse":
-                    relations[r["name"]] = lp["filler"]
+        def fills(filler, constraint) -> bool:
+            if filler == constraint:
+                return True
+            return (
+                isinstance(filler, str)
+                and filler in hierarchy
+                and hierarchy.is_a(filler, constraint)
+            )
+
+        results = []
+        for concept, slot, filler in triples:
+            result = {
+                "concept": concept,
+                "slot": slot,
+                "filler": filler,
+                "known": concept in frames,
+                "constrained": False,
+                "verdict": None,
+            }
 
-        for r in results:
-            if r["name"] not in relations:
-                for ancestor in reversed(r["ancestry"]):
-                    if ancestor in relations:
-                        relations[r["name"]] = relations[ancestor]
+            constraints = frames.get(concept, {}).get(slot, {})
+            name = filler.lower().strip() if isinstance(filler, str) else filler
+            for facet in CONSTRAINT_FACETS:
+                fillers = constraints.get(facet, [])
+                if len(fillers) > 0:
+                    result["constrained"] = True
 
-        return relations
+                result[facet] = any(map(lambda f: fills(name, f), fillers))
+                if result[facet] and result["verdict"] is None:
+                    result["verdict"] = facet
 
+            results.append(result)
+
+        return results
+
+    @snapshot
     def report(
         self,
         concept: str,
@@ -503,193 +617,358 @@ class OntologyAPI(object):
         return report
 
     def update_definition(self, concept: str, definition: str):
-        concept = concept.lower().strip()
-
-        self.collection.update_one(
-            {
-                "name": concept.lower(),
-            },
-            {"$set": {"definition": definition}},
-        )
+        self._apply("update_definition", concept=concept, definition=definition)
 
     def insert_property(self, concept: str, slot: str, facet: str, filler: str):
-        concept = concept.lower().strip()
-
-        self.collection.update_one(
-            {
-                "name": concept,
-            },
-            {
-                "$push": {
-                    "localProperties": {
-                        "slot": slot.lower().strip(),
-                        "facet": facet.lower().strip(),
-                        "filler": filler.strip(),
-                    }
-                }
-            },
+        self._apply(
+            "insert_property", concept=concept, slot=slot, facet=facet, filler=filler
         )
 
     def remove_property(self, concept: str, slot: str, facet: str, filler: str):
-        concept = concept.lower().strip()
-
-        self.collection.update_one(
-            {
-                "name": concept,
-            },
-            {
-                "$pull": {
-                    "localProperties": {
-                        "slot": slot.lower().strip(),
-                        "facet": facet.lower().strip(),
-                        "filler": filler.strip(),
-                    }
-                }
-            },
+        self._apply(
+            "remove_property", concept=concept, slot=slot, facet=facet, filler=filler
         )
 
     def block_property(self, concept: str, slot: str, facet: str, filler: str):
-        concept = concept.lower().strip()
-
-        self.collection.update_one(
-            {
-                "name": concept,
-            },
-            {
-                "$push": {
-                    "totallyRemovedProperties": {
-                        "slot": slot.lower().strip(),
-                        "facet": facet.lower().strip(),
-                        "filler": filler.strip(),
-                    }
-                }
-            },
+        self._apply(
+            "block_property", concept=concept, slot=slot, facet=facet, filler=filler
         )
 
     def unblock_property(self, concept: str, slot: str, facet: str, filler: str):
-        concept = concept.lower().strip()
-
-        self.collection.update_one(
-            {
-                "name": concept,
-            },
-            {
-                "$pull": {
-                    "totallyRemovedProperties": {
-                        "slot": slot.lower().strip(),
-                        "facet": facet.lower().strip(),
-                        "filler": filler.strip(),
-                    }
-                }
-            },
+        self._apply(
+            "unblock_property", concept=concept, slot=slot, facet=facet, filler=filler
         )
 
     def add_parent(self, concept: str, parent: str):
-        concept = concept.lower().strip()
-        parent = parent.lower().strip()
+        self._apply("add_parent", concept=concept, parent=parent)
 
-        if concept == parent:
-            raise Exception("Cannot assign %s as a parent of itself." % concept)
+    def remove_parent(self, concept: str, parent: str):
+        self._apply("remove_parent", concept=concept, parent=parent)
 
-        self.collection.update_one(
-            {
-                "name": concept,
-            },
-            {"$push": {"parents": parent}},
+    def add_concept(self, concept: str, parent: Union[str, None], definition: str):
+        self._apply(
+            "add_concept", concept=concept, parent=parent, definition=definition
         )
 
-    def remove_parent(self, concept: str, parent: str):
-        concept = concept.lower().strip()
-        parent = parent.lower().strip()
+    def remove_concept(self, concept: str, include_usages: bool = False):
+        self._apply("remove_concept", concept=concept, include_usages=include_usages)
 
-        self.collection.update_one(
-            {
-                "name": concept,
-            },
-            {"$pull": {"parents": parent}},
+    def apply_edits(self, edits: List[dict]) -> List[dict]:
+        # Validates a list of edits (each a dict naming an "operation" and its arguments),
+        # and applies the valid ones, in order, as a single bulk write and a single version
+        results = []
+        staged = []
+        requests = []
+
+        existing = set()
+        names = set()
+        for edit in edits:
+            for key in ["concept", "parent"]:
+                if isinstance(edit, dict) and isinstance(edit.get(key), str):
+                    names.add(edit[key].lower().strip())
+        for record in self.collection.find(
+            {"name": {"$in": list(names)}}, {"name": 1, "_id": 0}
+        ):
+            existing.add(record["name"])
+
+        for index, edit in enumerate(edits):
+            result = {
+                "index": index,
+                "operation": edit.get("operation") if isinstance(edit, dict) else None,
+                "applied": False,
+                "error": None,
+            }
+            results.append(result)
+
+            try:
+                if not isinstance(edit, dict):
+                    raise Exception("Edit %d is not an object." % index)
+                operation = edit.get("operation")
+                arguments = self._normalize_edit(
+                    operation,
+                    {k: v for k, v in edit.items() if k != "operation"},
+                )
+                self._validate_edit(operation, arguments, existing)
+                if operation == "add_parent":
+                    self._check_acyclic(
+                        arguments,
+                        ont.hierarchy.parent_changes(
+                            self.hierarchy(), list(map(lambda e: e[1:], staged))
+                        ),
+                    )
+            except Exception as e:
+                result["error"] = str(e)
+                continue
+
+            if operation == "add_concept":
+                existing.add(arguments["concept"])
+            if operation == "remove_concept":
+                existing.discard(arguments["concept"])
+
+            staged.append((index, operation, arguments))
+            for request in self._edit_requests(operation, arguments):
+                requests.append((index, request))
+
+        if len(requests) == 0:
+            return results
+
+        with self._editing("apply_edits", {"edits": []}) as entry:
+            hierarchy = self._edited_hierarchy(entry)
+            failed = len(edits)
+            try:
+                self.collection.bulk_write(list(map(lambda r: r[1], requests)))
+            except pymongo.errors.BulkWriteError as e:
+                error = e.details["writeErrors"][0]
+                failed = requests[error["index"]][0]
+                results[failed]["error"] = error["errmsg"]
+
+                # An edit of several writes (a cascading remove_concept) can fail after
+                # some of them were made; the entry then no longer describes the change,
+                # and the materialized fields cannot be maintained from it
+                first = min(i for i, r in enumerate(requests) if r[0] == failed)
+                if error["index"] > first:
+                    results[failed]["error"] = "Partly applied; " + error["errmsg"]
+                    entry["partial"] = True
+                    if hierarchy is not None:
+                        ont.management.set_materialized(self.collection, False)
+                        hierarchy = None
+
+            for index, operation, arguments in staged:
+                if index > failed:
+                    results[index]["error"] = "Not applied; an earlier edit failed."
+                if index >= failed:
+                    continue
+
+                results[index]["applied"] = True
+                entry["arguments"]["edits"].append(
+                    {"operation": operation, "arguments": arguments}
+                )
+
+            # Only the edits that were applied move the materialized fields
+            if hierarchy is not None:
+                materialized = ont.hierarchy.materialized_requests(
+                    hierarchy,
+                    list(
+                        map(
+                            lambda e: (e["operation"], e["arguments"]),
+                            entry["arguments"]["edits"],
+                        )
+                    ),
+                )
+                if len(materialized) > 0:
+                    self.collection.bulk_write(materialized)
+
+        return results
+
+    def hierarchy(self) -> Hierarchy:
+        version = (
+            self._version if self._pinned else ont.management.version(self.collection)
         )
+        return ont.hierarchy.load(self.collection, version)
+
+    def version(self) -> int:
+        return ont.management.version(self.collection)
+
+    @contextmanager
+    def _editing(self, operation: str, arguments: dict):
+        # Logs the edit, and applies it to this process's hierarchy index too, so that the
+        # index never needs rebuilding
+        try:
+            with ont.management.editing(self.collection, operation, arguments) as edit:
+                yield edit
+        except:
+            ont.hierarchy.discard(self.collection)
+            raise
+
+        ont.hierarchy.maintain(self.collection, edit)
+
+    def _apply(self, operation: str, **arguments):
+        arguments = self._normalize_edit(operation, arguments)
+        if operation == "add_parent":
+            self._check_acyclic(arguments)
+        requests = self._edit_requests(operation, arguments)
+
+        with self._editing(operation, arguments) as edit:
+            hierarchy = self._edited_hierarchy(edit)
+            if hierarchy is not None:
+                requests.extend(
+                    ont.hierarchy.materialized_requests(
+                        hierarchy, [(operation, arguments)]
+                    )
+                )
+            self.collection.bulk_write(requests)
+
+    def _edited_hierarchy(self, edit: dict) -> Union[Hierarchy, None]:
+        # The hierarchy an edit is made to, when the collection's materialized fields are
+        # to be maintained with it
+        if not edit["materialized"]:
+            return None
+        return ont.hierarchy.load(self.collection, edit["_id"] - 1)
+
+    def _normalize_edit(self, operation: str, arguments: dict) -> dict:
+        if operation not in EDITS:
+            raise Exception("Unknown edit operation %s." % operation)
+
+        normalized = {}
+        for key in EDITS[operation]:
+            if key not in arguments and key in EDIT_DEFAULTS:
+                arguments = dict(arguments, **{key: EDIT_DEFAULTS[key]})
+            if key not in arguments:
+                raise Exception("Missing %s for %s." % (key, operation))
+
+            value = arguments[key]
+            if key == "include_usages" and not isinstance(value, bool):
+                raise Exception("The %s of %s must be a boolean." % (key, operation))
+            if key != "include_usages" and not isinstance(value, (str, type(None))):
+                raise Exception("The %s of %s must be a string." % (key, operation))
+            if key in ["concept", "parent", "slot", "facet"] and value is not None:
+                value = value.lower().strip()
+            elif key == "filler":
+                value = value.strip()
+            normalized[key] = value
+
+        if "parent" in normalized and normalized["concept"] == normalized["parent"]:
+            raise Exception(
+                "Cannot assign %s as a parent of itself." % normalized["concept"]
+            )
 
-    def add_concept(self, concept: str, parent: Union[str, None], definition: str):
-        concept = concept.lower().strip()
+        return normalized
 
-        if parent is not None:
-            parent = parent.lower().strip()
+    def _validate_edit(self, operation: str, arguments: dict, existing: set):
+        if operation == "add_concept":
+            if arguments["concept"] in existing:
+                raise Exception("Concept %s already exists." % arguments["concept"])
+        elif arguments["concept"] not in existing:
+            raise Exception("Unknown concept %s." % arguments["concept"])
 
-        parents = [parent]
-        if parent is None:
-            parents = []
+        if operation == "add_parent" or (
+            operation == "add_concept" and arguments["parent"] is not None
+        ):
+            if arguments["parent"] not in existing:
+                raise Exception("Unknown concept %s." % arguments["parent"])
+
+    def _check_acyclic(self, arguments: dict, changes: dict = None):
+        # A cycle would send inheritance and path building round forever
+        if self.hierarchy().would_cycle(
+            arguments["concept"], arguments["parent"], changes
+        ):
+            raise Exception(
+                "Cannot assign %s as a parent of %s; %s is already its descendant."
+                % (arguments["parent"], arguments["concept"], arguments["parent"])
+            )
 
-        if concept in parents:
-            raise Exception("Cannot assign %s as a parent of itself." % concept)
+    def _edit_requests(self, operation: str, arguments: dict) -> list:
+        concept = arguments["concept"]
 
-        self.collection.insert_one(
-            {
-                "name": concept,
-                "parents": parents,
-                "definition": definition,
-                "notes": "",
-                "reified": False,
-                "reified_in": "",
-                "localProperties": [],
-                "overriddenFillers": [],
-                "totallyRemovedProperties": [],
+        if operation == "update_definition":
+            return [
+                UpdateOne(
+                    {"name": concept}, {"$set": {"definition": arguments["definition"]}}
+                )
+            ]
+
+        if operation in PROPERTY_EDITS:
+            action, field = PROPERTY_EDITS[operation]
+            property = {
+                "slot": arguments["slot"],
+                "facet": arguments["facet"],
+                "filler": arguments["filler"],
             }
-        )
+            return [UpdateOne({"name": concept}, {action: {field: property}})]
 
-    def remove_concept(self, concept: str, include_usages: bool = False):
-        concept = concept.lower().strip()
+        if operation == "add_parent":
+            return [
+                UpdateOne(
+                    {"name": concept}, {"$push": {"parents": arguments["parent"]}}
+                )
+            ]
 
-        if include_usages:
-            report = self.report(concept, include_usage=True)
-            for child in report["usage"]["subclasses"]:
-                self.collection.update_one(
-                    {"name": child}, {"$pull": {"parents": concept}}
+        if operation == "remove_parent":
+            return [
+                UpdateOne(
+                    {"name": concept}, {"$pull": {"parents": arguments["parent"]}}
                 )
-            for inverse in report["usage"]["inverses"]:
-                self.collection.update_one(
-                    {"name": inverse["concept"]},
+            ]
+
+        if operation == "add_concept":
+            parents = [] if arguments["parent"] is None else [arguments["parent"]]
+            return [
+                InsertOne(
                     {
-                        "$pull": {
-                            "localProperties": {
-                                "slot": inverse["slot"],
-                                "facet": inverse["facet"],
-                                "filler": inverse["filler"],
-                            }
-                        }
-                    },
+                        "name": concept,
+                        "parents": parents,
+                        "definition": arguments["definition"],
+                        "notes": "",
+                        "reified": False,
+                        "reified_in": "",
+                        "localProperties": [],
+                        "overriddenFillers": [],
+                        "totallyRemovedProperties": [],
+                    }
                 )
+            ]
+
+        if operation == "remove_concept":
+            # The cascade is a pair of multi-document updates (served by the parents and
+            # localProperties.filler indexes), not one update per subclass and usage
+            requests = []
+            if arguments["include_usages"]:
+                requests.append(
+                    UpdateMany({"parents": concept}, {"$pull": {"parents": concept}})
+                )
+                requests.append(
+                    UpdateMany(
+                        {"localProperties.filler": concept},
+                        {"$pull": {"localProperties": {"filler": concept}}},
+                    )
+                )
+            requests.append(DeleteOne({"name": concept}))
+            return requests
 
-        self.collection.delete_one({"name": concept})
+        raise Exception("Unknown edit operation %s." % operation)
 
     def cache(self, concepts):
         for concept in concepts:
             self._cache[concept["name"]] = concept
 
-    def format(self, concept, local: bool = False, metadata: bool = False):
-        output = {
-            "is-a": {"value": concept["parents"]},
-            "subclasses": {
-                "value": list(
-                    map(
-                        lambda record: record["name"],
-                        self.collection.find({"parents": concept["name"]}),
-                    )
-                )
-            },
-        }
+    def format(
+        self,
+        concept,
+        local: bool = False,
+        metadata: bool = False,
+        slots: List[str] = None,
+        facets: List[str] = None,
+        subclasses: List[str] = None,
+    ):
+        # With slots (and/or facets), only those are resolved and returned. Subclasses
+        # already fetched with the concept can be passed in, else the hierarchy is used.
+        if slots is not None:
+            slots = set(map(lambda s: s.lower().strip(), slots))
+        if facets is not None:
+            facets = set(map(lambda f: f.lower().strip(), facets))
+
+        output = {}
+        if self._includes("is-a", slots, facets):
+            output["is-a"] = {"value": concept["parents"]}
+        if self._includes("subclasses", slots, facets):
+            if subclasses is None:
+                subclasses = self.hierarchy().children.get(concept["name"], [])
+            output["subclasses"] = {"value": list(subclasses)}
 
         if local:
-            properties = concept["localProperties"]
+            properties = self._project(concept["localProperties"], slots, facets)
             for p in properties:
                 if metadata:
-                    p["metadata"] = {"defined_in": concept["name"]}
+                    p = dict(p, metadata={"defined_in": concept["name"]})
                 self._add_property(output, p, metadata=metadata)
         else:
-            for property in self._inherit(concept, metadata=metadata):
+            for property in self._inherit(
+                concept, metadata=metadata, slots=slots, facets=facets
+            ):
                 self._add_property(output, property, metadata=metadata)
 
         if metadata:
-            relations = self.relations(inverses=True)
+            relations = self._relation_names()
             for property in output:
                 output[property]["is_relation"] = property in relations
 
@@ -697,6 +976,33 @@ class OntologyAPI(object):
 
         return {concept["name"]: output}
 
+    def _includes(self, key: str, slots: List[str] = None, facets: List[str] = None):
+        # Whether "is-a" or "subclasses" (each held in a "value" facet) is formatted: when
+        # named among the slots, or with no slots given, unless the facets leave "value" out
+        if slots is not None:
+            return key in map(lambda s: s.lower().strip(), slots)
+        return facets is None or "value" in map(lambda f: f.lower().strip(), facets)
+
+    def _materialized(self) -> bool:
+        if self._materialized_at is not None and self._pinned:
+            return self._materialized_at
+
+        materialized = ont.management.materialized(self.collection)
+        if self._pinned:
+            self._materialized_at = materialized
+        return materialized
+
+    def _relation_names(self) -> set:
+        # Formatting a batch with metadata needs the relations once, not once per concept;
+        # they are kept for as long as the pinned version is
+        if self._relations is not None and self._pinned:
+            return self._relations
+
+        relations = set(self.relations(inverses=True))
+        if self._pinned:
+            self._relations = relations
+        return relations
+
     def _add_property(self, output, property, metadata: bool = False):
         slot = property["slot"]
         facet = property["facet"]
@@ -722,12 +1028,43 @@ class OntologyAPI(object):
         else:
             output[slot][facet].append(filler)
 
-    def _inherit(self, concept, metadata: bool = False):
-        properties = concept["localProperties"]
+    def _project(self, properties, slots: Set[str] = None, facets: Set[str] = None):
+        if slots is not None:
+            properties = [p for p in properties if p["slot"] in slots]
+        if facets is not None:
+            properties = [p for p in properties if p["facet"] in facets]
+        return properties
+
+    def _inherit(
+        self,
+        concept,
+        metadata: bool = False,
+        slots: Set[str] = None,
+        facets: Set[str] = None,
+    ):
+        # Overrides, blocks and duplicates only ever match properties of the same slot and
+        # facet, so projecting each level before merging gives the same result, cheaper.
+        # Within a pinned read, each concept's resolved list is kept and shared by all of its
+        # descendants, so a batch resolves every distinct ancestor once; the lists (and their
+        # properties) are never modified once built.
+        key = (
+            concept["name"],
+            metadata,
+            None if slots is None else frozenset(slots),
+            None if facets is None else frozenset(facets),
+        )
+        if self._pinned and key in self._resolved:
+            return self._resolved[key]
+
+        properties = self._project(concept["localProperties"], slots, facets)
 
         if metadata:
-            for p in properties:
-                p["metadata"] = {"defined_in": concept["name"]}
+            properties = list(
+                map(
+                    lambda p: dict(p, metadata={"defined_in": concept["name"]}),
+                    properties,
+                )
+            )
 
         for parent_name in concept["parents"]:
             parent = (
@@ -739,7 +1076,9 @@ class OntologyAPI(object):
             if parent_name not in self._cache:
                 self.cache([parent])
 
-            inherited = self._inherit(parent, metadata=metadata)
+            inherited = self._inherit(
+                parent, metadata=metadata, slots=slots, facets=facets
+            )
             inherited = self._remove_overridden_fillers(
                 inherited, concept["overriddenFillers"]
             )
@@ -752,6 +1091,9 @@ class OntologyAPI(object):
 
             properties = properties + inherited
 
+        if self._pinned:
+            self._resolved[key] = properties
+
         return properties
 
     def _remove_overridden_fillers(self, properties, overridden_fillers):
@@ -768,14 +1110,19 @@ class OntologyAPI(object):
                     properties,
                 )
             )
+            # Marks copies, as the inherited properties may be shared with other concepts
+            blocked = []
             for inherited in properties:
                 if {
                     "slot": inherited["slot"],
                     "facet": inherited["facet"],
                     "filler": inherited["filler"],
                 } in deleted_fillers:
-                    inherited["metadata"]["blocked"] = True
-            return properties
+                    inherited = dict(
+                        inherited, metadata=dict(inherited["metadata"], blocked=True)
+                    )
+                blocked.append(inherited)
+            return blocked
 
         return self._prune_list(properties, deleted_fillers)
 
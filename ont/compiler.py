@@ -0,0 +1,784 @@
+from multiprocessing import Pool
+from ont.api import OntologyAPI
+from ont.hierarchy import Closure, Hierarchy
+from pymongo import ReturnDocument, UpdateOne
+from threading import Event, Thread
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+import copy
+import json
+import ont.hashing
+import ont.management
+import ont.relations
+import os
+import pymongo.errors
+import socket
+import time
+import uuid
+
+PROGRESS = "PROGRESS"
+
+# Worker processes to compile frames across; 1 compiles them in the calling process
+PROCESSES = (
+    int(os.environ["COMPILE_PROCESSES"]) if "COMPILE_PROCESSES" in os.environ else 1
+)
+
+# Concepts handed to a worker process at a time
+CHUNK_SIZE = 200
+
+# Frames written per insert, and the least time (in seconds) between PROGRESS updates or
+# the most frames, whichever comes first; progress is only reported once a batch is written
+BATCH_SIZE = 500
+PROGRESS_INTERVAL = 1.0
+PROGRESS_FRAMES = 5000
+
+# Seconds between a running compile's heartbeats, and without one before its lock is
+# considered stale (its process having died) and another compile may take it over
+HEARTBEAT_INTERVAL = 10.0
+HEARTBEAT_TIMEOUT = (
+    float(os.environ["COMPILE_HEARTBEAT_TIMEOUT"])
+    if "COMPILE_HEARTBEAT_TIMEOUT" in os.environ
+    else 60.0
+)
+
+# Edits that change which concepts are whose parents
+HIERARCHY_EDITS = {"add_parent", "remove_parent", "add_concept", "remove_concept"}
+
+
+def compile(
+    collection: str,
+    compile_inherited_values: bool = False,
+    compile_domains_and_ranges: bool = False,
+    compile_inverses: bool = False,
+    incremental: bool = True,
+    processes: int = None,
+    batch_size: int = None,
+):
+    Compiler(
+        collection,
+        compile_inherited_values=compile_inherited_values,
+        compile_domains_and_ranges=compile_domains_and_ranges,
+        compile_inverses=compile_inverses,
+    ).run(incremental=incremental, processes=processes, batch_size=batch_size)
+
+
+def running(progress: dict) -> bool:
+    # Whether a compile holds the lock, and has beaten recently enough to still be alive
+    if progress is None or progress["finished"] is not None:
+        return False
+    if progress.get("owner") is None or progress.get("heartbeat") is None:
+        return False
+    return time.time() - progress["heartbeat"] < HEARTBEAT_TIMEOUT
+
+
+def cancel(collection: str) -> bool:
+    # Asks a running compile to stop at its next checkpoint; what it has written is kept,
+    # and the next compile resumes from there. A compile whose heartbeat has expired is not
+    # running, so there is nothing to cancel.
+    client = ont.management.getclient()
+    compiled = client[ont.management.DATABASE]["compiled_" + collection]
+
+    result = compiled.update_one(
+        {
+            "_id": PROGRESS,
+            "finished": None,
+            "owner": {"$ne": None},
+            "heartbeat": {"$gt": time.time() - HEARTBEAT_TIMEOUT},
+        },
+        {"$set": {"cancelled": time.time()}},
+    )
+    return result.modified_count > 0
+
+
+class Snapshot(object):
+    # A read-only copy of a collection at one version, with the indexes frames are compiled
+    # from; it holds no connection, so it can be handed to worker processes
+
+    def __init__(self, records: Dict[str, dict], version: int = None):
+        self.records = records
+        self.version = version
+
+        self.hierarchy = Hierarchy(
+            {name: record.get("parents", []) for name, record in records.items()},
+            version=version,
+        )
+        self.closure = Closure(self.hierarchy)
+
+        # Every (concept, filler) pair of each slot, for domains and ranges
+        self.usages = {}
+        inverses = {}
+        for name, record in records.items():
+            for lp in record.get("localProperties", []):
+                self.usages.setdefault(lp["slot"], []).append((name, lp["filler"]))
+                if lp["slot"] == "inverse":
+                    inverses[name] = lp["filler"]
+
+        self.relations = ont.relations.registry(self.hierarchy, inverses)
+
+    @classmethod
+    def load(cls, collection) -> "Snapshot":
+        # One scan of the collection, repeated if an edit was being made, or lands, while it
+        # is being read
+        for attempt in range(ont.management.READ_ATTEMPTS):
+            version, writing = ont.management.pinned_version(collection)
+
+            records = {}
+            for record in collection.find({"name": {"$exists": True}}, {"_id": 0}):
+                records[record["name"]] = record
+
+            if not writing and ont.management.version(collection) == version:
+                return cls(records, version=version)
+
+        raise Exception(
+            "Could not read %s at a settled version; it is being edited."
+            % collection.name
+        )
+
+
+class Frames(object):
+    # Compiles the frames of single concepts from a snapshot, in whichever process holds it
+
+    def __init__(self, snapshot: Snapshot, options: dict):
+        self.snapshot = snapshot
+        self.options = options
+
+        # Each resolved concept's inherited properties, as (key, property) pairs
+        self.resolved = {}
+
+    def resolve(self, concepts: Iterable[str]):
+        # Resolves the inherited properties of the concepts, and of any of their ancestors
+        # not yet resolved, in one pass from the roots down: each concept's properties are
+        # derived from its parents' already resolved lists, with its overrides and blocks
+        # applied on the way, so no ancestor is ever resolved twice
+        records = self.snapshot.records
+
+        pending = set()
+        frontier = list(concepts)
+        while len(frontier) > 0:
+            c = frontier.pop()
+            if c in pending or c in self.resolved or c not in records:
+                continue
+            pending.add(c)
+            frontier.extend(records[c]["parents"])
+
+        waiting = {}
+        children = {}
+        for c in pending:
+            parents = set(filter(lambda p: p in pending, records[c]["parents"]))
+            waiting[c] = len(parents)
+            for parent in parents:
+                children.setdefault(parent, []).append(c)
+
+        ready = [c for c, n in waiting.items() if n == 0]
+        while len(waiting) > 0:
+            if len(ready) == 0:
+                # Only cycles are left (which should never be stored); break one anywhere
+                ready.append(min(waiting))
+
+            c = ready.pop()
+            waiting.pop(c)
+            self.resolved[c] = self._inherit(records[c])
+
+            for child in children.get(c, []):
+                if child in waiting:
+                    waiting[child] -= 1
+                    if waiting[child] == 0:
+                        ready.append(child)
+
+    def _inherit(self, record: dict) -> List[Tuple[tuple, dict]]:
+        # As OntologyAPI._inherit: local properties first, then each parent's in turn, less
+        # the overridden and blocked fillers and any already present; the membership tests
+        # are set lookups, so this is linear in the properties involved
+        properties = [(_key(p), p) for p in record["localProperties"]]
+        present = set(k for k, p in properties if len(p) == 3)
+
+        removed = set()
+        for p in record["overriddenFillers"] + record["totallyRemovedProperties"]:
+            if len(p) == 3:
+                removed.add(_key(p))
+
+        for parent in record["parents"]:
+            inherited = [
+                (k, p)
+                for k, p in self.resolved.get(parent, [])
+                if k not in removed and k not in present
+            ]
+            properties.extend(inherited)
+            present.update(k for k, p in inherited if len(p) == 3)
+
+        return properties
+
+    def get_domain_range(self, property: str) -> Tuple[Set[str], Set[str]]:
+        # Determines the domains and ranges of a given property
+        results = self.snapshot.usages.get(property, [])
+
+        domains = set(map(lambda r: r[0], results))
+        ranges = set(map(lambda r: r[1], results))
+
+        domains = self.snapshot.closure.minimal(domains)
+
+        if self.snapshot.closure.has_ancestor(property, "relation"):
+            ranges = self.snapshot.closure.minimal(ranges)
+
+        return domains, ranges
+
+    def compile_concept(self, c: str) -> dict:
+        record = self.snapshot.records[c]
+
+        if self.options["compile_inherited_values"]:
+            if c not in self.resolved:
+                self.resolve([c])
+            properties = map(lambda r: r[1], self.resolved[c])
+        else:
+            properties = record["localProperties"]
+
+        frame = {
+            c: {
+                "is-a": {"value": list(record["parents"])},
+                "subclasses": {
+                    "value": list(self.snapshot.hierarchy.children.get(c, []))
+                },
+            }
+        }
+        for p in properties:
+            declare_slot_facet(frame[c], p["slot"], p["facet"])
+            frame[c][p["slot"]][p["facet"]].append(p["filler"])
+
+        closure = self.snapshot.closure
+        if self.options["compile_domains_and_ranges"] and closure.has_ancestor(
+            c, "property"
+        ):
+            domains, ranges = self.get_domain_range(c)
+
+            declare_slot_facet(frame[c], "domain", "sem")
+            frame[c]["domain"]["sem"] = domains
+
+            declare_slot_facet(frame[c], "range", "sem")
+            frame[c]["range"]["sem"] = ranges
+
+        # Convert frame names, slots, facets, and relation fillers to upper case
+        return format_frame_for_insert(c, frame)
+
+
+# Each worker process's frame compiler, made once per process from the snapshot it was given
+_frames = None
+
+
+def _start_worker(snapshot: Snapshot, options: dict):
+    global _frames
+    _frames = Frames(snapshot, options)
+
+
+def _compile_chunk(concepts: List[str]) -> List[Tuple[str, dict]]:
+    if _frames.options["compile_inherited_values"]:
+        _frames.resolve(concepts)
+    return list(map(lambda c: (c, _frames.compile_concept(c)), concepts))
+
+
+def _key(property: dict) -> tuple:
+    # What a property is matched on when pruning: its slot, facet and filler. Only those
+    # holding nothing else prune others, as in OntologyAPI._prune_list.
+    filler = property["filler"]
+    try:
+        hash(filler)
+    except TypeError:
+        filler = ("json", json.dumps(filler, sort_keys=True, default=str))
+
+    return property["slot"], property["facet"], filler
+
+
+class Compiler(object):
+
+    def __init__(
+        self,
+        collection: str,
+        compile_inherited_values: bool = False,
+        compile_domains_and_ranges: bool = False,
+        compile_inverses: bool = False,
+    ):
+        client = ont.management.getclient()
+        db = client[ont.management.DATABASE]
+
+        self.source = db[collection]
+        self.compiled = db["compiled_" + collection]
+        self.options = {
+            "compile_inherited_values": compile_inherited_values,
+            "compile_domains_and_ranges": compile_domains_and_ranges,
+            "compile_inverses": compile_inverses,
+        }
+
+        self.api = OntologyAPI(collection=self.source)
+        self.relations = None
+        self.closure = None
+
+        # Who holds the lock, and why this compile stopped early ("cancelled" or "lost")
+        self.owner = "%s:%d:%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        self.stopped = None
+
+    def run(
+        self, incremental: bool = True, processes: int = None, batch_size: int = None
+    ):
+        if processes is None:
+            processes = PROCESSES
+        if batch_size is None:
+            batch_size = BATCH_SIZE
+
+        # Take the lock, unless another compile is running; it is held with heartbeats from
+        # a background thread, and released however the compile ends
+        progress = self.claim()
+        beating = Event()
+        heart = Thread(target=self.heartbeat, args=(beating,), daemon=True)
+        heart.start()
+        try:
+            self.compile(progress, incremental, processes, batch_size)
+        finally:
+            beating.set()
+            heart.join()
+            self.compiled.update_one(
+                {"_id": PROGRESS, "owner": self.owner}, {"$set": {"owner": None}}
+            )
+
+    def claim(self) -> dict:
+        # Marks the PROGRESS document as this compile's, and returns it as it was; raises
+        # PermissionError if a compile is running (whose heartbeat is not stale)
+        progress = self.compiled.find_one({"_id": PROGRESS})
+        if running(progress):
+            raise PermissionError
+
+        # Taken over only if no one else has claimed it since it was read; if another has,
+        # the upsert collides with their document
+        try:
+            claimed = self.compiled.find_one_and_update(
+                {
+                    "_id": PROGRESS,
+                    "owner": None if progress is None else progress.get("owner"),
+                    "heartbeat": (
+                        None if progress is None else progress.get("heartbeat")
+                    ),
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "heartbeat": time.time(),
+                        "finished": None,
+                    },
+                    "$setOnInsert": {
+                        "status": {"count": 0, "total": 0, "last": None},
+                        "started": time.time(),
+                    },
+                    "$unset": {"cancelled": ""},
+                },
+                upsert=True,
+            )
+        except pymongo.errors.DuplicateKeyError:
+            raise PermissionError
+
+        return claimed
+
+    def heartbeat(self, stopped: Event):
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            self.beat()
+
+    def beat(self):
+        # Records that this compile is alive, and notes whether it has been cancelled (or
+        # has lost its lock, having been presumed dead)
+        progress = self.compiled.find_one_and_update(
+            {"_id": PROGRESS, "owner": self.owner},
+            {"$set": {"heartbeat": time.time()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if progress is None:
+            self.stopped = "lost"
+        elif progress.get("cancelled") is not None:
+            self.stopped = "cancelled"
+
+    def compile(
+        self, progress: dict, incremental: bool, processes: int, batch_size: int
+    ):
+        # Every frame is compiled from the same snapshot of the collection
+        snapshot = Snapshot.load(self.source)
+        version = snapshot.version
+
+        # List all of the concepts
+        concepts = set(snapshot.records.keys())
+
+        # Recompile only what the edits since the last compile could have changed, if the
+        # edit log accounts for all of them; otherwise, reset the compiled database
+        changes = self.changes(progress, snapshot) if incremental else None
+        resumed = changes is not None and progress["finished"] is None
+        done = set()
+        if changes is None:
+            self.compiled.delete_many({"_id": {"$ne": PROGRESS}})
+            affected = concepts
+            removed = set()
+            inverses = []
+        else:
+            affected, removed = changes
+            inverses = progress.get("inverses", [])
+
+        # An interrupted compile's frames are its checkpoints: those it wrote are kept unless
+        # edited since, and the rest of its concepts are compiled along with any edited
+        if resumed:
+            job = set(progress["concepts"])
+            written = self.compiled.find(
+                {"_id": {"$in": list(map(lambda c: c.upper(), job))}}, {"_id": 1}
+            )
+            written = set(map(lambda f: f["_id"], written))
+            done = set(filter(lambda c: c.upper() in written, job))
+            done = done.difference(affected, removed).intersection(concepts)
+            affected = affected.union(job.difference(done))
+
+        affected = affected.difference(done).intersection(concepts)
+
+        # Note what is being compiled, so that exports of an identical compile can be reused
+        source = {
+            "hash": ont.hashing.collection_hash(self.source),
+            "options": self.options,
+        }
+
+        # The relations and inverses, and the ancestry of every concept
+        self.relations = snapshot.relations
+        self.closure = snapshot.closure
+
+        # Clear out the frames being replaced. The inverses derive from the relation frames
+        # and the relations' inverses, so they are rebuilt whenever anything is recompiled
+        # (or a compile that may have been writing them is resumed); the old ones go first,
+        # so none can be mistaken for a frame compiled since.
+        stale = list(map(lambda c: c.upper(), affected.union(removed)))
+        rebuild = self.options["compile_inverses"] and (len(stale) > 0 or resumed)
+        if changes is not None and rebuild:
+            self.remove_inverses(inverses)
+            inverses = []
+        if changes is not None and len(stale) > 0:
+            self.compiled.delete_many({"_id": {"$in": stale}})
+
+        # Prime the PROGRESS document with the concepts being compiled, against which their
+        # written frames are checked if this compile is resumed
+        self.compiled.update_one(
+            {"_id": PROGRESS},
+            {
+                "$set": {
+                    "status": {
+                        "count": len(done),
+                        "total": len(done) + len(affected),
+                        "last": None,
+                    },
+                    "started": time.time(),
+                    "finished": None,
+                    "source": source,
+                    "version": version,
+                    "inverses": inverses,
+                    "concepts": sorted(done.union(affected)),
+                }
+            },
+        )
+
+        # Compile each concept, writing the frames in batches; each batch written is a
+        # checkpoint, after which the compile stops if it has been cancelled
+        count = len(done)
+        last = None
+        batch = []
+        reported = time.time()
+        reported_count = count
+        for c, frame in self.frames(snapshot, sorted(affected), processes):
+            if self.stopped is not None:
+                break
+
+            count += 1
+            last = c
+            batch.append(frame)
+            if len(batch) < batch_size:
+                continue
+
+            self.compiled.insert_many(batch)
+            batch = []
+            self.beat()
+            if (
+                time.time() - reported >= PROGRESS_INTERVAL
+                or count - reported_count >= PROGRESS_FRAMES
+            ):
+                self.report(count, last)
+                reported = time.time()
+                reported_count = count
+
+        # A compile presumed dead must not write over the one that took its lock
+        if self.stopped == "lost":
+            return
+
+        if len(batch) > 0:
+            self.compiled.insert_many(batch)
+        if last is not None:
+            self.report(count, last)
+        if self.stopped is not None:
+            return
+
+        # Compile each inverse property
+        if rebuild:
+            self.compile_inverses()
+
+        # Mark the task as finished
+        self.compiled.update_one(
+            {"_id": PROGRESS},
+            {"$set": {"finished": time.time()}, "$unset": {"concepts": ""}},
+        )
+
+    def report(self, count: int, last: str):
+        self.compiled.update_one(
+            {"_id": PROGRESS}, {"$set": {"status.count": count, "status.last": last}}
+        )
+
+    def frames(
+        self, snapshot: Snapshot, concepts: List[str], processes: int
+    ) -> Iterator[Tuple[str, dict]]:
+        # Compiles the frames in this process, or in chunks across a pool of worker processes
+        # that each hold a copy of the snapshot; either way they are written from here, and
+        # are the same frames
+        if processes <= 1 or len(concepts) <= CHUNK_SIZE:
+            frames = Frames(snapshot, self.options)
+            if self.options["compile_inherited_values"]:
+                frames.resolve(concepts)
+            for c in concepts:
+                yield c, frames.compile_concept(c)
+            return
+
+        chunks = [
+            concepts[i : i + CHUNK_SIZE] for i in range(0, len(concepts), CHUNK_SIZE)
+        ]
+        with Pool(
+            processes, initializer=_start_worker, initargs=(snapshot, self.options)
+        ) as pool:
+            for compiled in pool.imap_unordered(_compile_chunk, chunks):
+                yield from compiled
+
+    def changes(
+        self, progress: dict, snapshot: Snapshot
+    ) -> Union[Tuple[Set[str], Set[str]], None]:
+        # The concepts whose frames may differ from the last compile (and those that have
+        # since been removed), from the edit log since the version it compiled; None if
+        # there is no finished (or resumable) compile with the same options, or the log is
+        # incomplete
+        if progress is None or "version" not in progress:
+            return None
+        if progress["finished"] is None and "concepts" not in progress:
+            return None
+        if progress["source"]["options"] != self.options:
+            return None
+
+        entries = ont.management.edits_since(
+            self.source, progress["version"], snapshot.version
+        )
+        if entries is None:
+            return None
+
+        edits = []
+        for entry in entries:
+            if entry["operation"] == "apply_edits":
+                for edit in entry["arguments"]["edits"]:
+                    edits.append((edit["operation"], edit["arguments"]))
+            else:
+                edits.append((entry["operation"], entry["arguments"]))
+
+        touched = set()
+        reparented = set()
+        parents = set()
+        slots = set()
+        for operation, arguments in edits:
+            if operation in ont.hashing.UNTRACKED_EDITS:
+                return None
+            if operation == "remove_concept" and arguments["include_usages"]:
+                return None
+            if "concept" not in arguments:
+                continue
+
+            touched.add(arguments["concept"])
+            if operation in HIERARCHY_EDITS:
+                reparented.add(arguments["concept"])
+            if arguments.get("parent") is not None:
+                parents.add(arguments["parent"])
+            if "slot" in arguments:
+                slots.add(arguments["slot"])
+
+        hierarchy = snapshot.hierarchy
+
+        # A reparented concept's previous parents listed it among their subclasses, and a
+        # removed concept's slots may have given properties their domains
+        for frame in self.compiled.find(
+            {"_id": {"$in": list(map(lambda c: c.upper(), reparented))}}
+        ):
+            parents.update(map(lambda p: p.lower(), frame["IS-A"]["VALUE"]))
+            if frame["_id"].lower() not in hierarchy:
+                slots.update(map(lambda s: s.lower(), frame.keys()))
+
+        affected = touched.union(parents)
+        if self.options["compile_inherited_values"]:
+            for concept in touched:
+                affected.update(hierarchy.descendants(concept))
+
+        # Domains and ranges are reduced by ancestry, so any change to the hierarchy can
+        # change those of every property; and a concept that has left the property subtree
+        # (with a reparented or removed ancestor) must lose its own. Any concept whose
+        # ancestors changed is, in the new hierarchy, a descendant of a reparented or
+        # removed concept (or one itself), as removed concepts keep their children here.
+        if self.options["compile_domains_and_ranges"]:
+            affected.update(slots)
+            if len(reparented) > 0:
+                affected.update(hierarchy.descendants("property"))
+            for concept in reparented:
+                affected.update(hierarchy.descendants(concept))
+
+        removed = set(filter(lambda c: c not in hierarchy, touched))
+
+        return affected, removed
+
+    def populate_inverses(self, c: str, frame: dict):
+        # Explicitly populates a frame with its inverses (NOT USED AT THIS TIME)
+        usages = self.api.report(
+            c,
+            include_usage=True,
+            usage_with_inheritance=self.options["compile_inherited_values"],
+        )
+        inv_slots = set()
+        for inv in usages["usage"]["inverses"]:
+            try:
+                slot = self.relations[inv["slot"]]
+            except:
+                slot = inv["slot"]
+            facet = inv["facet"]
+            filler = inv["concept"]
+
+            if slot not in frame[c]:
+                frame[c][slot] = {}
+            if facet not in frame[c][slot]:
+                frame[c][slot][facet] = []
+            frame[c][slot][facet].append(filler)
+
+            # Note which inverses have been used in this frame
+            inv_slots.add(slot)
+
+        # Reduce all inverse to their common ancestors
+        for slot in inv_slots:
+            for facet in frame[c][slot].keys():
+                fillers = set(frame[c][slot][facet])
+                fillers = self.closure.minimal(fillers)
+                frame[c][slot][facet] = list(fillers)
+
+    def remove_inverses(self, previous: List[dict]):
+        # Removes the inverses a previous compile wrote, and their SUBCLASSES listings
+        if len(previous) == 0:
+            return
+
+        inserted = [i["_id"] for i in previous if i["inserted"]]
+        self.compiled.delete_many({"_id": {"$in": inserted}})
+        self.compiled.update_many(
+            {"_id": {"$in": list(map(lambda i: i["parent"], previous))}},
+            {
+                "$pull": {
+                    "SUBCLASSES.VALUE": {"$in": list(map(lambda i: i["_id"], previous))}
+                }
+            },
+        )
+
+    def compile_inverses(self) -> List[dict]:
+        # Derives an inverse from each relation frame; returns a record of each, of whether
+        # it was written, and of the parent it was listed under. The record is kept before
+        # anything is written, so a compile interrupted midway can remove what it wrote.
+        relations = filter(
+            lambda c: self.closure.has_ancestor(c, "relation"), self.closure.ids.keys()
+        )
+        # Read in full before any SUBCLASSES are pushed, so each inverse copies its relation
+        # frame as compiled; in name order, so that where two relations share an inverse,
+        # the same one takes it however the frames were written
+        properties = sorted(
+            self.compiled.find(
+                {"_id": {"$in": list(map(lambda c: c.upper(), relations))}}
+            ),
+            key=lambda p: p["_id"],
+        )
+
+        frames = []
+        inverses = []
+        for property in properties:
+            inverse = copy.deepcopy(property)
+            inverse["_id"] = self.relations[property["_id"].lower()].upper()
+
+            if inverse["_id"].lower() in self.relations.keys():
+                continue
+
+            inverse["INVERSE"] = {"VALUE": [property["_id"]]}
+
+            declare_slot_facet(inverse, "DOMAIN", "SEM")
+            declare_slot_facet(inverse, "RANGE", "SEM")
+
+            inverse["DOMAIN"]["SEM"] = property["RANGE"]["SEM"]
+            inverse["RANGE"]["SEM"] = property["DOMAIN"]["SEM"]
+
+            frames.append(inverse)
+            inverses.append(
+                {
+                    "_id": inverse["_id"],
+                    "parent": property["IS-A"]["VALUE"][0],
+                    "inserted": True,
+                }
+            )
+
+        # An inverse whose name is already taken (by a frame, or an earlier inverse) is
+        # skipped
+        taken = self.compiled.find(
+            {"_id": {"$in": list(map(lambda f: f["_id"], frames))}}, {"_id": 1}
+        )
+        taken = set(map(lambda f: f["_id"], taken))
+        for inverse in inverses:
+            if inverse["_id"] in taken:
+                print("Duplicate key %s" % inverse["_id"])
+                inverse["inserted"] = False
+            taken.add(inverse["_id"])
+
+        self.compiled.update_one({"_id": PROGRESS}, {"$set": {"inverses": inverses}})
+
+        frames = [f for f, i in zip(frames, inverses) if i["inserted"]]
+        if len(frames) > 0:
+            self.compiled.insert_many(frames)
+
+        # Add each inverse as an explicit SUBCLASSES value of its parent
+        if len(inverses) > 0:
+            self.compiled.bulk_write(
+                list(
+                    map(
+                        lambda i: UpdateOne(
+                            {"_id": i["parent"]},
+                            {"$push": {"SUBCLASSES.VALUE": i["_id"]}},
+                        ),
+                        inverses,
+                    )
+                )
+            )
+
+        return inverses
+
+
+def declare_slot_facet(frame: dict, slot: str, facet: str):
+    # Declares a slot/facet if needed
+    if slot not in frame:
+        frame[slot] = {}
+    if facet not in frame[slot]:
+        frame[slot][facet] = []
+
+
+def format_frame_for_insert(c: str, frame: dict) -> dict:
+    # Formats the frame (with upper casing, etc.)
+    frame = frame[c]
+    for slot_name in list(frame.keys()):
+        slot = frame.pop(slot_name)
+        frame[slot_name.upper()] = slot
+
+        for facet_name in list(slot.keys()):
+            facet = slot.pop(facet_name)
+            slot[facet_name.upper()] = list(
+                map(
+                    lambda filler: (filler.upper() if type(filler) == str else filler),
+                    facet,
+                )
+            )
+
+    frame["_id"] = c.upper()
+    return frame
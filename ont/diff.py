@@ -0,0 +1,143 @@
+from pymongo import ASCENDING
+from typing import Iterator, List
+
+import hashlib
+import json
+import ont.hashing
+import ont.management
+import sys
+
+# The fields compared between two versions of a concept
+LIST_FIELDS = [
+    "parents",
+    "localProperties",
+    "overriddenFillers",
+    "totallyRemovedProperties",
+]
+SCALAR_FIELDS = ["definition"]
+
+PROJECTION = dict(
+    [("_id", 0), ("name", 1)] + [(f, 1) for f in LIST_FIELDS + SCALAR_FIELDS]
+)
+
+
+def content_hash(concept: dict, ordered: bool = True) -> str:
+    # A digest of the compared fields. List order matters to what a concept means (its
+    # first parent's inverse is the one taken, and fillers are inherited in order), so it
+    # is hashed; a diff, which reports what was added to or removed from each list, hashes
+    # them unordered, as sorted, canonically serialized items
+    canonical = {}
+    for field in LIST_FIELDS:
+        items = list(map(_canonical, concept.get(field, [])))
+        canonical[field] = items if ordered else sorted(items)
+    for field in SCALAR_FIELDS:
+        canonical[field] = concept.get(field, "")
+
+    return hashlib.sha1(_canonical(canonical).encode("utf-8")).hexdigest()
+
+
+def diff(original, updated, under: str = None) -> Iterator[dict]:
+    # Streams both collections in name order (served by the name index) and merge-joins
+    # them, yielding one delta per added, removed or changed concept. Only the two current
+    # documents are held in memory. The collections' hashes settle identical collections
+    # without reading either, and narrow a diff under a concept to the subtrees that differ.
+    if ont.hashing.identical(original, updated):
+        return
+
+    names = None
+    if under is not None:
+        names = ont.hashing.changed_under(original, updated, under)
+        if len(names) == 0:
+            return
+
+    a = _concepts(original, names)
+    b = _concepts(updated, names)
+
+    old = next(a, None)
+    new = next(b, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old["name"] < new["name"]):
+            yield {"concept": old["name"], "change": "removed"}
+            old = next(a, None)
+        elif old is None or new["name"] < old["name"]:
+            yield {"concept": new["name"], "change": "added"}
+            new = next(b, None)
+        else:
+            if content_hash(old, ordered=False) != content_hash(new, ordered=False):
+                yield {
+                    "concept": new["name"],
+                    "change": "changed",
+                    "fields": _field_deltas(old, new),
+                }
+            old = next(a, None)
+            new = next(b, None)
+
+
+def summarize(deltas: Iterator[dict]) -> dict:
+    summary = {"added": [], "removed": [], "changed": []}
+    for delta in deltas:
+        summary[delta["change"]].append(delta["concept"])
+    return summary
+
+
+def _concepts(collection, names: List[str] = None) -> Iterator[dict]:
+    query = {"name": {"$exists": True}} if names is None else {"name": {"$in": names}}
+    cursor = collection.find(query, PROJECTION)
+    return iter(cursor.sort("name", ASCENDING))
+
+
+def _field_deltas(old: dict, new: dict) -> dict:
+    deltas = {}
+
+    for field in LIST_FIELDS:
+        before = dict(map(lambda v: (_canonical(v), v), old.get(field, [])))
+        after = dict(map(lambda v: (_canonical(v), v), new.get(field, [])))
+
+        added = [after[k] for k in sorted(after.keys() - before.keys())]
+        removed = [before[k] for k in sorted(before.keys() - after.keys())]
+        if len(added) > 0 or len(removed) > 0:
+            deltas[field] = {"added": added, "removed": removed}
+
+    for field in SCALAR_FIELDS:
+        if old.get(field, "") != new.get(field, ""):
+            deltas[field] = {"old": old.get(field, ""), "new": new.get(field, "")}
+
+    return deltas
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+if __name__ == "__main__":
+    original = None
+    updated = ont.management.active()
+    under = None
+    summary = False
+
+    for arg in sys.argv:
+        if "=" in arg:
+            k = arg.split("=")[0]
+            v = arg.split("=")[1]
+
+            if k == "original":
+                original = v
+            if k == "updated":
+                updated = v
+            if k == "under":
+                under = v
+            if k == "summary":
+                summary = v.lower() == "true"
+
+    if original is None or updated is None:
+        raise Exception("Specify original=<collection> (and updated=<collection>).")
+
+    client = ont.management.getclient()
+    db = client[ont.management.DATABASE]
+
+    deltas = diff(db[original], db[updated], under=under)
+    if summary:
+        print(json.dumps(summarize(deltas), indent=2))
+    else:
+        for delta in deltas:
+            print(json.dumps(delta))
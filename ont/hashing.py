@@ -0,0 +1,335 @@
+from ont.hierarchy import Hierarchy
+from pymongo import DeleteOne, ReplaceOne
+from typing import Dict, List, Set
+
+import hashlib
+import ont.diff
+import ont.hierarchy
+import ont.management
+
+# Merkle hashes of a collection, kept in _hashes_<name> as one document per concept:
+#   {"_id": name, "parents": [...], "concept": <content hash>, "subtree": <subtree hash>}
+# A subtree hash covers the concept and the subtree hashes of its children, so two
+# collections agree under a concept exactly when its subtree hashes match. The collection
+# hash is the XOR of each concept's (name, content hash) digest, so an edit updates it in
+# constant time. The version the hashes were computed at is kept on the version document.
+
+# Bumped whenever content hashes change what they cover, so that hashes stored under an
+# earlier scheme are rebuilt rather than mixed with new ones (2: list order is hashed)
+SCHEME = 2
+
+# Edits whose touched concepts are not all named in their arguments
+UNTRACKED_EDITS = {"import_concepts", "invalidate"}
+
+EMPTY = "0" * 40
+
+
+def hash_collection(collection):
+    return collection.database[ont.management.HASHES + collection.name]
+
+
+def collection_hash(collection) -> str:
+    return refresh(collection)["collection"]
+
+
+def subtree_hash(collection, concept: str) -> str:
+    refresh(collection)
+    record = hash_collection(collection).find_one({"_id": concept})
+    return None if record is None else record["subtree"]
+
+
+def identical(a, b) -> bool:
+    return collection_hash(a) == collection_hash(b)
+
+
+def refresh(collection) -> dict:
+    # Brings the stored hashes up to the current version: from the edit log if it accounts
+    # for every step since they were computed, else by rehashing the whole collection
+    version, writing = ont.management.pinned_version(collection)
+    hashes = ont.management._version_document(collection).get("hashes")
+    if hashes is not None and hashes.get("scheme") != SCHEME:
+        hashes = None
+
+    if hashes is not None and hashes["version"] == version:
+        return hashes
+
+    touched = None
+    if hashes is not None:
+        touched = _touched(
+            ont.management.edits_since(collection, hashes["version"], version)
+        )
+
+    # Unrecorded while the per-concept documents are rewritten, so an interrupted refresh
+    # is never mistaken for a complete one
+    _record(collection, None)
+    if touched is None:
+        hashes = rebuild(collection, version)
+    else:
+        hashes = _update(collection, hashes, touched, version)
+
+    # Hashes read across an edit may not match any version; drop them rather than record them
+    if writing or ont.management.version(collection) != version:
+        hash_collection(collection).drop()
+    else:
+        _record(collection, hashes)
+
+    return hashes
+
+
+def rebuild(collection, version: int) -> dict:
+    concepts = {}
+    parents = {}
+    for record in collection.find({"name": {"$exists": True}}):
+        concepts[record["name"]] = ont.diff.content_hash(record)
+        parents[record["name"]] = record.get("parents", [])
+
+    hierarchy = Hierarchy(parents)
+    subtrees = _subtrees(hierarchy, concepts, set(concepts.keys()), {})
+
+    combined = 0
+    for name, digest in concepts.items():
+        combined ^= _digest(name, digest)
+
+    target = hash_collection(collection)
+    target.drop()
+    documents = list(
+        map(
+            lambda name: {
+                "_id": name,
+                "parents": parents[name],
+                "concept": concepts[name],
+                "subtree": subtrees[name],
+            },
+            concepts.keys(),
+        )
+    )
+    for i in range(0, len(documents), 1000):
+        target.insert_many(documents[i : i + 1000])
+
+    return {"version": version, "scheme": SCHEME, "collection": "%040x" % combined}
+
+
+def changed_under(original, updated, concept: str) -> List[str]:
+    # The concepts under (and including) concept whose content differs between the two
+    # collections, found by descending only into children whose subtree hashes differ
+    refresh(original)
+    refresh(updated)
+
+    a = hash_collection(original)
+    b = hash_collection(updated)
+
+    changed = []
+    seen = set()
+    frontier = [concept]
+    while len(frontier) > 0:
+        names = list(set(frontier) - seen)
+        seen.update(names)
+        if len(names) == 0:
+            break
+
+        old = dict(map(lambda r: (r["_id"], r), a.find({"_id": {"$in": names}})))
+        new = dict(map(lambda r: (r["_id"], r), b.find({"_id": {"$in": names}})))
+
+        differing = []
+        for name in names:
+            if old.get(name, {}).get("subtree") == new.get(name, {}).get("subtree"):
+                continue
+            if old.get(name, {}).get("concept") != new.get(name, {}).get("concept"):
+                changed.append(name)
+            differing.append(name)
+
+        # Children of a differing concept, in either version
+        frontier = []
+        for children in [
+            a.find({"parents": {"$in": differing}}, {"_id": 1}),
+            b.find({"parents": {"$in": differing}}, {"_id": 1}),
+        ]:
+            frontier.extend(map(lambda r: r["_id"], children))
+
+    return sorted(changed)
+
+
+def current(collection) -> dict:
+    # The stored hashes, if they are for the collection's current version
+    hashes = ont.management._version_document(collection).get("hashes")
+    if hashes is not None and hashes.get("scheme") != SCHEME:
+        hashes = None
+    if hashes is None or hashes["version"] != ont.management.version(collection):
+        return None
+    return hashes
+
+
+def adopt(original, target, hashes: dict, move: bool = False):
+    # Gives target, an unedited copy (or renaming) of original, the hashes original had
+    source = hash_collection(original)
+    hash_collection(target).drop()
+
+    exists = source.name in original.database.list_collection_names()
+    if hashes is None or not exists:
+        if move:
+            source.drop()
+        return
+
+    if move:
+        source.rename(hash_collection(target).name)
+        _record(original, None)
+    else:
+        source.aggregate([{"$match": {}}, {"$out": hash_collection(target).name}])
+
+    _record(target, dict(hashes, version=ont.management.version(target)))
+
+
+def _touched(entries) -> Set[str]:
+    if entries is None:
+        return None
+
+    touched = set()
+    for entry in entries:
+        if not _collect(entry["operation"], entry["arguments"], touched):
+            return None
+
+    return touched
+
+
+def _collect(operation: str, arguments: dict, touched: Set[str]) -> bool:
+    if operation in UNTRACKED_EDITS:
+        return False
+    if operation == "apply_edits":
+        for edit in arguments["edits"]:
+            if not _collect(edit["operation"], edit["arguments"], touched):
+                return False
+        return True
+    if operation == "remove_concept" and arguments["include_usages"]:
+        # The concepts using it as a filler are not recorded
+        return False
+    if "concept" in arguments:
+        touched.add(arguments["concept"])
+    return True
+
+
+def _update(collection, hashes: dict, touched: Set[str], version: int) -> dict:
+    target = hash_collection(collection)
+
+    old = dict(
+        map(lambda r: (r["_id"], r), target.find({"_id": {"$in": list(touched)}}))
+    )
+    new = {}
+    for record in collection.find({"name": {"$in": list(touched)}}):
+        new[record["name"]] = record
+
+    hierarchy = ont.hierarchy.load(collection, version)
+
+    # Subtrees change along every path up from a touched concept, through its new parents
+    # and the parents it had when last hashed
+    seeds = set(touched)
+    for name in touched:
+        seeds.update(old.get(name, {}).get("parents", []))
+        seeds.update(new.get(name, {}).get("parents", []))
+
+    dirty = set()
+    for name in seeds:
+        if name in hierarchy:
+            dirty.add(name)
+            dirty.update(hierarchy.ancestors(name))
+
+    concepts = {}
+    for name in dirty:
+        if name in new:
+            concepts[name] = ont.diff.content_hash(new[name])
+        elif name in old:
+            concepts[name] = old[name]["concept"]
+    missing = list(filter(lambda n: n not in concepts, dirty))
+    for record in target.find({"_id": {"$in": missing}}, {"concept": 1}):
+        concepts[record["_id"]] = record["concept"]
+
+    stored = {}
+    children = set()
+    for name in dirty:
+        children.update(hierarchy.children.get(name, []))
+    children = list(filter(lambda c: c not in dirty and c in hierarchy, children))
+    for record in target.find({"_id": {"$in": children}}, {"subtree": 1}):
+        stored[record["_id"]] = record["subtree"]
+
+    subtrees = _subtrees(hierarchy, concepts, dirty, stored)
+
+    combined = int(hashes["collection"], 16)
+    for name in touched:
+        if name in old:
+            combined ^= _digest(name, old[name]["concept"])
+        if name in new:
+            combined ^= _digest(name, ont.diff.content_hash(new[name]))
+
+    requests = []
+    for name in touched:
+        if name not in new:
+            requests.append(DeleteOne({"_id": name}))
+    for name in dirty:
+        document = {
+            "_id": name,
+            "parents": hierarchy.parents[name],
+            "concept": concepts.get(name, EMPTY),
+            "subtree": subtrees[name],
+        }
+        requests.append(ReplaceOne({"_id": name}, document, upsert=True))
+    if len(requests) > 0:
+        target.bulk_write(requests)
+
+    return {"version": version, "scheme": SCHEME, "collection": "%040x" % combined}
+
+
+def _subtrees(
+    hierarchy: Hierarchy,
+    concepts: Dict[str, str],
+    names: Set[str],
+    stored: Dict[str, str],
+) -> Dict[str, str]:
+    # Subtree hashes for the given concepts, children first; children outside the set use
+    # their stored hashes. A child that closes a cycle is left out, so cycles terminate.
+    subtrees = {}
+    for root in names:
+        stack = [(root, False)]
+        visiting = set()
+        while len(stack) > 0:
+            name, expanded = stack.pop()
+            if name in subtrees:
+                continue
+
+            children = list(
+                filter(lambda c: c in names, hierarchy.children.get(name, []))
+            )
+
+            if not expanded:
+                visiting.add(name)
+                stack.append((name, True))
+                for child in children:
+                    if child not in subtrees and child not in visiting:
+                        stack.append((child, False))
+                continue
+
+            hashes = []
+            for child in set(hierarchy.children.get(name, [])):
+                if child in subtrees:
+                    hashes.append(subtrees[child])
+                elif child in stored:
+                    hashes.append(stored[child])
+
+            digest = hashlib.sha1(concepts.get(name, EMPTY).encode("utf-8"))
+            for h in sorted(hashes):
+                digest.update(h.encode("utf-8"))
+            subtrees[name] = digest.hexdigest()
+            visiting.discard(name)
+
+    return subtrees
+
+
+def _digest(name: str, concept: str) -> int:
+    return int(hashlib.sha1((name + ":" + concept).encode("utf-8")).hexdigest(), 16)
+
+
+def _record(collection, hashes: dict):
+    ont.management._version_document(collection)
+    versions = collection.database[ont.management.VERSIONS]
+    if hashes is None:
+        versions.update_one({"_id": collection.name}, {"$unset": {"hashes": ""}})
+    else:
+        versions.update_one({"_id": collection.name}, {"$set": {"hashes": hashes}})
@@ -0,0 +1,544 @@
+from pymongo import UpdateOne
+from threading import RLock
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+import ont.management
+import sys
+
+# Edits that never change the hierarchy, and can be replayed as no-ops
+PROPERTY_EDITS = {
+    "update_definition",
+    "insert_property",
+    "remove_property",
+    "block_property",
+    "unblock_property",
+}
+
+
+class Hierarchy(object):
+
+    def __init__(self, parents: Dict[str, List[str]], version: int = None):
+        self.version = version
+        self.parents = {}
+        self.children = {}
+        self._ancestors = {}
+        self._depths = {}
+
+        for concept, concept_parents in parents.items():
+            self.parents[concept] = list(concept_parents)
+            self.children.setdefault(concept, [])
+            for parent in concept_parents:
+                self.children.setdefault(parent, []).append(concept)
+
+    @classmethod
+    def from_collection(cls, collection, version: int = None) -> "Hierarchy":
+        parents = {}
+        for record in collection.find({}, {"name": 1, "parents": 1, "_id": 0}):
+            if "name" in record:
+                parents[record["name"]] = record.get("parents", [])
+
+        return cls(parents, version=version)
+
+    def copy(self) -> "Hierarchy":
+        # Edits rebind the lists and sets they change rather than mutate them, so a copy
+        # shares them with the original until either is edited
+        copied = Hierarchy({}, version=self.version)
+        copied.parents = dict(self.parents)
+        copied.children = dict(self.children)
+        copied._ancestors = dict(self._ancestors)
+        copied._depths = dict(self._depths)
+        return copied
+
+    def __contains__(self, concept: str) -> bool:
+        return concept in self.parents
+
+    def ancestors(self, concept: str) -> Set[str]:
+        if concept in self._ancestors:
+            return self._ancestors[concept]
+
+        # Iterative post-order walk, so deep hierarchies do not hit the recursion limit and
+        # a cycle (which should never be stored, but can be) does not loop forever
+        stack = [(concept, False)]
+        visiting = set()
+        while len(stack) > 0:
+            name, expanded = stack.pop()
+            if name in self._ancestors:
+                continue
+
+            parents = list(
+                filter(lambda p: p in self.parents, self.parents.get(name, []))
+            )
+
+            if not expanded:
+                visiting.add(name)
+                stack.append((name, True))
+                for parent in parents:
+                    if parent not in self._ancestors and parent not in visiting:
+                        stack.append((parent, False))
+                continue
+
+            ancestors = set(parents)
+            for parent in parents:
+                ancestors |= self._ancestors.get(parent, set())
+            self._ancestors[name] = ancestors
+            visiting.discard(name)
+
+        return self._ancestors[concept]
+
+    def depth(self, concept: str) -> int:
+        # The length of the longest path up to a root, so every concept is deeper than each
+        # of its parents
+        if concept in self._depths:
+            return self._depths[concept]
+
+        stack = [(concept, False)]
+        visiting = set()
+        while len(stack) > 0:
+            name, expanded = stack.pop()
+            if name in self._depths:
+                continue
+
+            parents = list(
+                filter(lambda p: p in self.parents, self.parents.get(name, []))
+            )
+
+            if not expanded:
+                visiting.add(name)
+                stack.append((name, True))
+                for parent in parents:
+                    if parent not in self._depths and parent not in visiting:
+                        stack.append((parent, False))
+                continue
+
+            depths = [self._depths[p] + 1 for p in parents if p in self._depths]
+            self._depths[name] = max(depths, default=0)
+            visiting.discard(name)
+
+        return self._depths[concept]
+
+    def descendants(self, concept: str) -> Set[str]:
+        descendants = set()
+        frontier = list(self.children.get(concept, []))
+        while len(frontier) > 0:
+            child = frontier.pop()
+            if child in descendants:
+                continue
+            descendants.add(child)
+            frontier.extend(self.children.get(child, []))
+
+        return descendants
+
+    def is_a(self, concept: str, ancestor: str) -> bool:
+        return concept == ancestor or ancestor in self.ancestors(concept)
+
+    def would_cycle(
+        self, concept: str, parent: str, changes: Dict[str, List[str]] = None
+    ) -> bool:
+        # Whether making parent a parent of concept closes a cycle, i.e. whether concept is
+        # (or is an ancestor of) parent; changes overrides the parents of some concepts, for
+        # edits staged but not yet applied
+        if concept == parent:
+            return True
+        if changes is None or len(changes) == 0:
+            return concept in self.ancestors(parent)
+
+        seen = {parent}
+        frontier = [parent]
+        while len(frontier) > 0:
+            name = frontier.pop()
+            parents = changes[name] if name in changes else self.parents.get(name)
+            for p in parents or []:
+                if p == concept:
+                    return True
+                if p not in seen:
+                    seen.add(p)
+                    frontier.append(p)
+
+        return False
+
+    def closure(self) -> Dict[str, Set[str]]:
+        return {concept: self.ancestors(concept) for concept in self.parents}
+
+    def add_concept(self, concept: str, parents: Iterable[str]):
+        self.parents[concept] = list(parents)
+        self.children.setdefault(concept, [])
+        for parent in self.parents[concept]:
+            self.children[parent] = self.children.get(parent, []) + [concept]
+
+        # The concept may previously have been named as a (dangling) parent
+        self._forget(self.descendants(concept) | {concept})
+
+    def remove_concept(self, concept: str):
+        cone = self.descendants(concept)
+
+        for parent in self.parents.pop(concept, []):
+            if concept in self.children.get(parent, []):
+                self.children[parent] = list(
+                    filter(lambda c: c != concept, self.children[parent])
+                )
+
+        # Any remaining children keep naming the concept as a (now dangling) parent, exactly
+        # as their stored documents do
+        if len(self.children.get(concept, [])) == 0:
+            self.children.pop(concept, None)
+
+        self._forget(cone | {concept})
+
+    def add_parent(self, concept: str, parent: str):
+        if concept not in self.parents:
+            return
+
+        self.parents[concept] = self.parents[concept] + [parent]
+        self.children[parent] = self.children.get(parent, []) + [concept]
+
+        if parent not in self.parents:
+            return
+
+        # Adding an edge only ever grows the closures of the concept's descendant cone
+        added = self.ancestors(parent) | {parent}
+        for descendant in self.descendants(concept) | {concept}:
+            if descendant in self._ancestors:
+                self._ancestors[descendant] = self._ancestors[descendant] | added
+            self._depths.pop(descendant, None)
+
+    def remove_parent(self, concept: str, parent: str):
+        if concept not in self.parents:
+            return
+
+        self.parents[concept] = list(
+            filter(lambda p: p != parent, self.parents[concept])
+        )
+        if parent in self.children:
+            self.children[parent] = list(
+                filter(lambda c: c != concept, self.children[parent])
+            )
+
+        # Removing an edge can shrink closures only within the concept's descendant cone
+        self._forget(self.descendants(concept) | {concept})
+
+    def apply(self, operation: str, arguments: dict) -> bool:
+        # Replays a logged edit; returns False if the edit cannot be replayed
+        if operation == "add_parent":
+            self.add_parent(arguments["concept"], arguments["parent"])
+        elif operation == "remove_parent":
+            self.remove_parent(arguments["concept"], arguments["parent"])
+        elif operation == "add_concept":
+            parents = [] if arguments["parent"] is None else [arguments["parent"]]
+            self.add_concept(arguments["concept"], parents)
+        elif operation == "remove_concept":
+            concept = arguments["concept"]
+            if arguments["include_usages"]:
+                for child in list(self.children.get(concept, [])):
+                    self.remove_parent(child, concept)
+            self.remove_concept(concept)
+        elif operation == "materialize_ancestors":
+            pass
+        elif operation == "apply_edits":
+            for edit in arguments["edits"]:
+                if not self.apply(edit["operation"], edit["arguments"]):
+                    return False
+        elif operation not in PROPERTY_EDITS:
+            return False
+
+        return True
+
+    def _forget(self, concepts: Iterable[str]):
+        for concept in concepts:
+            self._ancestors.pop(concept, None)
+            self._depths.pop(concept, None)
+
+
+class Closure(object):
+    # A static snapshot of a hierarchy's ancestry as int bitsets: each concept gets an integer
+    # ID, and its ancestors are the set bits of one int. IDs follow a topological order
+    # (parents first), so a concept's bitset only spans the IDs below its own. Subsumption is
+    # one bit test, and reducing a set of concepts to its minimal elements is an OR to build
+    # the set and an AND per member.
+
+    def __init__(self, hierarchy: Hierarchy):
+        waiting = {}
+        for concept, parents in hierarchy.parents.items():
+            waiting[concept] = len(set(filter(lambda p: p in hierarchy, parents)))
+
+        order = []
+        ready = sorted(filter(lambda c: waiting[c] == 0, waiting), reverse=True)
+        while len(ready) > 0:
+            concept = ready.pop()
+            del waiting[concept]
+            order.append(concept)
+            for child in sorted(set(hierarchy.children.get(concept, []))):
+                if child in waiting:
+                    waiting[child] -= 1
+                    if waiting[child] == 0:
+                        ready.append(child)
+
+        # Concepts on (or below) a cycle, which should never be stored, go last
+        order.extend(sorted(waiting))
+
+        self.ids = {concept: i for i, concept in enumerate(order)}
+        self.ancestors = [0] * len(order)
+        for i, concept in enumerate(order):
+            if concept in waiting:
+                for ancestor in hierarchy.ancestors(concept):
+                    self.ancestors[i] |= 1 << self.ids[ancestor]
+                continue
+
+            for parent in set(hierarchy.parents[concept]):
+                if parent in self.ids:
+                    p = self.ids[parent]
+                    self.ancestors[i] |= self.ancestors[p] | (1 << p)
+
+    def __contains__(self, concept) -> bool:
+        return concept in self.ids
+
+    def has_ancestor(self, concept, ancestor: str) -> bool:
+        if concept not in self.ids or ancestor not in self.ids:
+            return False
+        return self.ancestors[self.ids[concept]] >> self.ids[ancestor] & 1 == 1
+
+    def minimal(self, concepts: Set) -> Set:
+        # The members none of whose ancestors are also members; anything that is not a
+        # concept (a literal filler, say) has no ancestors, and is always kept
+        members = 0
+        for concept in concepts:
+            if concept in self.ids:
+                members |= 1 << self.ids[concept]
+
+        return set(
+            filter(
+                lambda c: c not in self.ids
+                or self.ancestors[self.ids[c]] & members == 0,
+                concepts,
+            )
+        )
+
+
+# Each collection's indexes, by version. An index is never edited once shared: edits are
+# applied to a copy, which is shared in its place, so readers iterating an index never see
+# it change. The last few versions are kept, for readers pinned to a version an edit has
+# since moved past.
+HISTORY = 4
+
+_lock = RLock()
+_indexes = {}
+
+
+def _key(collection):
+    return collection.database.name, collection.name
+
+
+def load(collection, version: int) -> Hierarchy:
+    with _lock:
+        indexes = _indexes.get(_key(collection), {})
+        if version in indexes:
+            return indexes[version]
+
+        # Catch up on edits made by other processes from the edit log, if it is complete
+        earlier = list(filter(lambda v: v < version, indexes.keys()))
+        if len(earlier) > 0:
+            index = indexes[max(earlier)].copy()
+            entries = ont.management.edits_since(collection, index.version, version)
+            if _replay(index, entries):
+                index.version = version
+                _store(collection, index)
+                return index
+
+    index = Hierarchy.from_collection(collection, version=version)
+
+    # Only share the index if no edit landed while it was being read
+    if ont.management.version(collection) == version:
+        with _lock:
+            _store(collection, index)
+
+    return index
+
+
+def _store(collection, index: Hierarchy):
+    indexes = _indexes.setdefault(_key(collection), {})
+    indexes[index.version] = index
+    for version in sorted(indexes.keys())[:-HISTORY]:
+        indexes.pop(version)
+
+
+def _replay(index: Hierarchy, entries) -> bool:
+    if entries is None:
+        return False
+
+    for entry in entries:
+        if not index.apply(entry["operation"], entry["arguments"]):
+            return False
+
+    return True
+
+
+def maintain(collection, edit: dict):
+    # Shares an index with an edit made by this process applied, when there is an index of
+    # the version the edit began at (and the edit was made in full)
+    with _lock:
+        index = _indexes.get(_key(collection), {}).get(edit["_id"] - 1)
+        if index is None or not edit["replayable"]:
+            return
+
+        index = index.copy()
+        if _replay(index, [edit]):
+            index.version = edit["_id"] + 1
+            _store(collection, index)
+
+
+def discard(collection):
+    with _lock:
+        _indexes.pop(_key(collection), None)
+
+
+def parent_changes(
+    hierarchy: Hierarchy, edits: List[Tuple[str, dict]]
+) -> Dict[str, Union[List[str], None]]:
+    # The parents each concept will have once the edits are made (None if it is removed)
+    changes = {}
+
+    def current(concept):
+        return (
+            changes[concept] if concept in changes else hierarchy.parents.get(concept)
+        )
+
+    for operation, arguments in edits:
+        concept = arguments["concept"]
+        parents = current(concept)
+
+        if operation == "add_parent" and parents is not None:
+            changes[concept] = parents + [arguments["parent"]]
+        elif operation == "remove_parent" and parents is not None:
+            changes[concept] = list(filter(lambda p: p != arguments["parent"], parents))
+        elif operation == "add_concept":
+            parent = arguments["parent"]
+            changes[concept] = [] if parent is None else [parent]
+        elif operation == "remove_concept":
+            if arguments["include_usages"]:
+                children = set(hierarchy.children.get(concept, []))
+                children |= {c for c, ps in changes.items() if ps and concept in ps}
+                for child in children:
+                    if current(child) is not None:
+                        changes[child] = list(
+                            filter(lambda p: p != concept, current(child))
+                        )
+            changes[concept] = None
+
+    return changes
+
+
+def materialize(
+    hierarchy: Hierarchy, changes: Dict[str, Union[List[str], None]]
+) -> Dict[str, dict]:
+    # The ancestors and depth fields of every concept the parent changes can affect: the
+    # changed concepts' (current) descendant cones. Anything outside the cones keeps its
+    # fields, so the walk reads those straight from the (unchanged) hierarchy.
+    cone = set()
+    for concept in changes:
+        cone |= hierarchy.descendants(concept) | {concept}
+
+    def exists(name):
+        return changes[name] is not None if name in changes else name in hierarchy
+
+    def parents_of(name):
+        parents = changes[name] if name in changes else hierarchy.parents.get(name, [])
+        return list(filter(exists, parents or []))
+
+    ancestors = {}
+    depths = {}
+
+    def lookup(name):
+        if name in cone:
+            return ancestors.get(name, set()), depths.get(name, -1)
+        return hierarchy.ancestors(name), hierarchy.depth(name)
+
+    for concept in cone:
+        stack = [(concept, False)]
+        visiting = set()
+        while len(stack) > 0:
+            name, expanded = stack.pop()
+            if name in ancestors or not exists(name):
+                continue
+
+            if not expanded:
+                visiting.add(name)
+                stack.append((name, True))
+                for parent in parents_of(name):
+                    if parent in cone and parent not in ancestors:
+                        if parent not in visiting:
+                            stack.append((parent, False))
+                continue
+
+            ancestors[name] = set()
+            depths[name] = 0
+            for parent in parents_of(name):
+                parent_ancestors, parent_depth = lookup(parent)
+                ancestors[name] |= parent_ancestors | {parent}
+                depths[name] = max(depths[name], parent_depth + 1)
+            visiting.discard(name)
+
+    return {
+        name: {"ancestors": sorted(ancestors[name]), "depth": depths[name]}
+        for name in ancestors
+    }
+
+
+def materialized_requests(
+    hierarchy: Hierarchy, edits: List[Tuple[str, dict]]
+) -> List[UpdateOne]:
+    changes = parent_changes(hierarchy, edits)
+    if len(changes) == 0:
+        return []
+
+    return list(
+        map(
+            lambda item: UpdateOne({"name": item[0]}, {"$set": item[1]}),
+            sorted(materialize(hierarchy, changes).items()),
+        )
+    )
+
+
+def backfill(collection, batch_size: int = 1000) -> int:
+    # Stores every concept's ancestors and depth, and marks the collection as materialized,
+    # so that edits keep the fields current from then on. Each batch is written as an edit
+    # of its own, so that readers wait for a batch at most; until the last, the collection
+    # is not read as materialized.
+    hierarchy = Hierarchy.from_collection(collection)
+    concepts = list(hierarchy.parents)
+
+    for i in range(0, len(concepts), batch_size):
+        requests = []
+        for concept in concepts[i : i + batch_size]:
+            fields = {
+                "ancestors": sorted(hierarchy.ancestors(concept)),
+                "depth": hierarchy.depth(concept),
+            }
+            requests.append(UpdateOne({"name": concept}, {"$set": fields}))
+
+        with ont.management.editing(collection, "materialize_ancestors", {}):
+            collection.bulk_write(requests, ordered=False)
+
+    with ont.management.editing(collection, "materialize_ancestors", {}):
+        ont.management.set_materialized(collection, True)
+
+    return len(concepts)
+
+
+if __name__ == "__main__":
+    collection = ont.management.active()
+
+    for arg in sys.argv:
+        if "=" in arg:
+            k = arg.split("=")[0]
+            v = arg.split("=")[1]
+
+            if k == "collection":
+                collection = v
+
+    if collection is None:
+        raise Exception("No collection specified, and no ontology is active.")
+
+    client = ont.management.getclient()
+    count = backfill(client[ont.management.DATABASE][collection])
+    print(
+        "Materialized ancestors and depth for %d concepts in %s." % (count, collection)
+    )
@@ -0,0 +1,191 @@
+from typing import Callable, Iterable, Union
+
+import json
+import ont.hierarchy
+import ont.management
+import pymongo.errors
+import sys
+import time
+
+CHUNK_SIZE = 5000
+
+# Fields every concept document carries, with the values add_concept gives a new concept
+DEFAULTS = {
+    "parents": [],
+    "definition": "",
+    "notes": "",
+    "reified": False,
+    "reified_in": "",
+    "localProperties": [],
+    "overriddenFillers": [],
+    "totallyRemovedProperties": [],
+}
+
+
+def import_concepts(
+    collection,
+    lines: Iterable[Union[str, bytes]],
+    chunk_size: int = CHUNK_SIZE,
+    progress: Callable[[dict], None] = None,
+) -> dict:
+    # Streams NDJSON concepts (one JSON document per line) into the collection. Duplicates
+    # and malformed lines are checked against an in-memory set of names and skipped; parents
+    # may be defined later in the stream, and any never defined are reported as dangling.
+    report = {
+        "read": 0,
+        "inserted": 0,
+        "duplicates": [],
+        "errors": [],
+        "dangling": {},
+        "seconds": 0.0,
+    }
+
+    started = time.time()
+
+    names = set()
+    for record in collection.find({}, {"name": 1, "_id": 0}):
+        if "name" in record:
+            names.add(record["name"])
+
+    # Parents named before (or without) being defined: parent -> concepts naming it
+    pending = {}
+
+    # Imported documents carry no materialized fields, so the collection is not read as
+    # materialized until they have all been recomputed
+    materialized = ont.management.materialized(collection)
+    if materialized:
+        ont.management.set_materialized(collection, False)
+
+    def flush(chunk):
+        if len(chunk) == 0:
+            return
+
+        # Each chunk is an edit of its own, so that readers wait for a chunk at most, and
+        # read a consistent version between chunks
+        inserted = len(chunk)
+        with ont.management.editing(collection, "import_concepts", {}) as edit:
+            try:
+                collection.insert_many(chunk, ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                for error in e.details["writeErrors"]:
+                    inserted -= 1
+                    report["errors"].append(
+                        {
+                            "concept": chunk[error["index"]]["name"],
+                            "error": error["errmsg"],
+                        }
+                    )
+
+            edit["arguments"] = {"inserted": inserted}
+
+        report["inserted"] += inserted
+        report["seconds"] = time.time() - started
+        if progress is not None:
+            progress(report)
+
+    chunk = []
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if len(line.strip()) == 0:
+            continue
+
+        report["read"] += 1
+
+        try:
+            concept = _normalize(json.loads(line))
+        except Exception as e:
+            report["errors"].append({"line": number, "error": str(e)})
+            continue
+
+        name = concept["name"]
+        if name in names:
+            report["duplicates"].append(name)
+            continue
+
+        names.add(name)
+        pending.pop(name, None)
+        for parent in concept["parents"]:
+            if parent not in names:
+                pending.setdefault(parent, []).append(name)
+
+        chunk.append(concept)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+
+    flush(chunk)
+
+    if materialized:
+        ont.hierarchy.backfill(collection)
+
+    report["dangling"] = pending
+    report["seconds"] = time.time() - started
+
+    return report
+
+
+def _normalize(concept: dict) -> dict:
+    if not isinstance(concept, dict) or not isinstance(concept.get("name"), str):
+        raise Exception("Concept has no name.")
+
+    concept = dict(concept)
+    concept.pop("_id", None)
+
+    for field, default in DEFAULTS.items():
+        if field not in concept:
+            concept[field] = list(default) if type(default) is list else default
+
+    # A single parent may be given as a bare name
+    if isinstance(concept["parents"], str):
+        concept["parents"] = [concept["parents"]]
+    if not isinstance(concept["parents"], list) or not all(
+        map(lambda p: isinstance(p, str), concept["parents"])
+    ):
+        raise Exception("Parents of %s are not a list of names." % concept["name"])
+
+    concept["name"] = concept["name"].lower().strip()
+    concept["parents"] = list(map(lambda p: p.lower().strip(), concept["parents"]))
+
+    if concept["name"] in concept["parents"]:
+        raise Exception("Cannot assign %s as a parent of itself." % concept["name"])
+
+    return concept
+
+
+if __name__ == "__main__":
+    collection = ont.management.active()
+    path = None
+    chunk_size = CHUNK_SIZE
+
+    for arg in sys.argv:
+        if "=" in arg:
+            k = arg.split("=")[0]
+            v = arg.split("=")[1]
+
+            if k == "collection":
+                collection = v
+            if k == "path":
+                path = v
+            if k == "chunk":
+                chunk_size = int(v)
+
+    if collection is None:
+        raise Exception("No collection specified, and no ontology is active.")
+
+    def print_progress(report):
+        sys.stderr.write(
+            "%d read, %d inserted (%.1fs)\n"
+            % (report["read"], report["inserted"], report["seconds"])
+        )
+
+    client = ont.management.getclient()
+    target = client[ont.management.DATABASE][collection]
+
+    if path is None or path == "-":
+        result = import_concepts(target, sys.stdin, chunk_size, print_progress)
+    else:
+        with open(path, "r") as f:
+            result = import_concepts(target, f, chunk_size, print_progress)
+
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+from typing import Callable, List
+
+import functools
+import pymongo.monitoring
+import threading
+import time
+
+# Hooks called with a measurement of every instrumented call, once it returns (or raises):
+#   {"method": "OntologyAPI.get", "seconds": 0.012, "commands": 3, "documents": 41}
+# Nested calls are measured too, and their commands also count toward the enclosing call.
+_hooks = []
+
+_local = threading.local()
+
+# Whether the command listener has been registered with pymongo; it is only once there is
+# something to count, so that pymongo builds no command events for a process that never
+# measures anything
+_listening = False
+_lock = threading.Lock()
+
+
+def register(hook: Callable[[dict], None]):
+    _listen()
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def unregister(hook: Callable[[dict], None]):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+@contextmanager
+def measuring():
+    # Collects the measurements made inside the block, e.g. for a test or a profiling script
+    measurements = []
+    register(measurements.append)
+    try:
+        yield measurements
+    finally:
+        unregister(measurements.append)
+
+
+@contextmanager
+def counting():
+    # Counts the Mongo commands (and documents) issued inside the block on this thread,
+    # instrumented calls or not, e.g. for asserting a round-trip budget in a test
+    _listen()
+    counters = {"commands": 0, "documents": 0}
+    active = _active()
+    active.append(counters)
+    try:
+        yield counters
+    finally:
+        active.remove(counters)
+
+
+def instrumented(cls):
+    # Wraps every public method of the class; with no hooks registered, a wrapped call costs
+    # one extra function call and a list check
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not callable(method):
+            continue
+        setattr(cls, name, _measure(cls.__name__ + "." + name, method))
+
+    return cls
+
+
+def _measure(label: str, method):
+    @functools.wraps(method)
+    def measured(*args, **kwargs):
+        if len(_hooks) == 0:
+            return method(*args, **kwargs)
+
+        counters = {"commands": 0, "documents": 0}
+        active = _active()
+        active.append(counters)
+
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            active.pop()
+
+            measurement = {
+                "method": label,
+                "seconds": seconds,
+                "commands": counters["commands"],
+                "documents": counters["documents"],
+            }
+            for hook in list(_hooks):
+                hook(measurement)
+
+    return measured
+
+
+def _active() -> List[dict]:
+    if not hasattr(_local, "active"):
+        _local.active = []
+    return _local.active
+
+
+class CommandCounter(pymongo.monitoring.CommandListener):
+    # Attributes each Mongo command (and the documents it returns) to every measurement
+    # active on the issuing thread; pymongo publishes command events on that thread
+
+    def started(self, event):
+        for counters in _active():
+            counters["commands"] += 1
+
+    def succeeded(self, event):
+        active = _active()
+        if len(active) == 0:
+            return
+
+        cursor = event.reply.get("cursor", {})
+        documents = len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+        for counters in active:
+            counters["documents"] += documents
+
+    def failed(self, event):
+        pass
+
+
+def _listen():
+    # Registered globally, so it applies to every client created afterwards (getclient()
+    # makes a new one on each call, so only a client held from before the first hook or
+    # count goes uncounted); pymongo cannot unregister it
+    global _listening
+    with _lock:
+        if not _listening:
+            pymongo.monitoring.register(CommandCounter())
+            _listening = True
@@ -0,0 +1,184 @@
+from typing import Dict, List
+
+import json
+import ont.management
+import sys
+import time
+
+# Slots whose fillers name relations rather than concepts
+SKIPPED_SLOTS = {"inverse"}
+
+
+def check(collection) -> dict:
+    # Validates the whole collection in a single scan: duplicate names, cycles in the
+    # hierarchy, parents that do not exist, and relation fillers naming concepts that do not
+    # exist. Everything after the scan is linear in the number of concepts and properties.
+    started = time.time()
+
+    report = {
+        "concepts": 0,
+        "duplicates": [],
+        "cycles": [],
+        "dangling_parents": {},
+        "dangling_fillers": [],
+        "seconds": 0.0,
+    }
+
+    parents = {}
+    properties = {}
+    for record in collection.find(
+        {}, {"name": 1, "parents": 1, "localProperties": 1, "_id": 0}
+    ):
+        name = record.get("name")
+        if name is None:
+            continue
+        if name in parents:
+            report["duplicates"].append(name)
+            continue
+
+        parents[name] = record.get("parents", [])
+        properties[name] = record.get("localProperties", [])
+
+    report["concepts"] = len(parents)
+
+    for concept, concept_parents in parents.items():
+        missing = list(filter(lambda p: p not in parents, concept_parents))
+        if len(missing) > 0:
+            report["dangling_parents"][concept] = missing
+
+    report["cycles"] = cycles(parents)
+
+    relations = _relations(parents, properties)
+    for concept, concept_properties in properties.items():
+        for p in concept_properties:
+            if p["slot"] in SKIPPED_SLOTS or p["slot"] not in relations:
+                continue
+            if isinstance(p["filler"], str) and p["filler"] not in parents:
+                report["dangling_fillers"].append(
+                    {
+                        "concept": concept,
+                        "slot": p["slot"],
+                        "facet": p["facet"],
+                        "filler": p["filler"],
+                    }
+                )
+
+    report["seconds"] = time.time() - started
+
+    return report
+
+
+def cycles(parents: Dict[str, List[str]]) -> List[List[str]]:
+    # Tarjan's strongly connected components, iteratively (ontologies are deep enough to hit
+    # the recursion limit); every component of more than one concept, or a concept that is
+    # its own parent, is a cycle
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    found = []
+    counter = 0
+
+    for root in parents:
+        if root in index:
+            continue
+
+        work = [(root, 0)]
+        while len(work) > 0:
+            concept, position = work.pop()
+
+            if position == 0:
+                index[concept] = lowlink[concept] = counter
+                counter += 1
+                stack.append(concept)
+                on_stack.add(concept)
+
+            edges = list(filter(lambda p: p in parents, parents[concept]))
+
+            recursed = False
+            while position < len(edges):
+                parent = edges[position]
+                position += 1
+
+                if parent not in index:
+                    work.append((concept, position))
+                    work.append((parent, 0))
+                    recursed = True
+                    break
+                if parent in on_stack:
+                    lowlink[concept] = min(lowlink[concept], index[parent])
+
+            if recursed:
+                continue
+
+            if lowlink[concept] == index[concept]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == concept:
+                        break
+
+                if len(component) > 1 or concept in parents[concept]:
+                    found.append(sorted(component))
+
+            if len(work) > 0:
+                caller = work[-1][0]
+                lowlink[caller] = min(lowlink[caller], lowlink[concept])
+
+    return found
+
+
+def _relations(parents: Dict[str, List[str]], properties: Dict[str, list]) -> set:
+    # The relation subtree, plus the inverses its relations name
+    children = {}
+    for concept, concept_parents in parents.items():
+        for parent in concept_parents:
+            children.setdefault(parent, []).append(concept)
+
+    relations = set()
+    frontier = ["relation"] if "relation" in parents else []
+    while len(frontier) > 0:
+        relation = frontier.pop()
+        if relation in relations:
+            continue
+        relations.add(relation)
+        frontier.extend(children.get(relation, []))
+
+    for relation in list(relations):
+        for p in properties.get(relation, []):
+            if p["slot"] == "inverse" and isinstance(p["filler"], str):
+                relations.add(p["filler"])
+
+    return relations
+
+
+def valid(report: dict) -> bool:
+    return (
+        len(report["duplicates"]) == 0
+        and len(report["cycles"]) == 0
+        and len(report["dangling_parents"]) == 0
+        and len(report["dangling_fillers"]) == 0
+    )
+
+
+if __name__ == "__main__":
+    collection = ont.management.active()
+
+    for arg in sys.argv:
+        if "=" in arg:
+            k = arg.split("=")[0]
+            v = arg.split("=")[1]
+
+            if k == "collection":
+                collection = v
+
+    if collection is None:
+        raise Exception("No collection specified, and no ontology is active.")
+
+    client = ont.management.getclient()
+    result = check(client[ont.management.DATABASE][collection])
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if valid(result) else 1)
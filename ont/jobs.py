@@ -0,0 +1,301 @@
+from multiprocessing import Process
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from typing import Dict, List
+
+import ont.management
+import os
+import socket
+import sys
+import time
+import traceback
+import uuid
+
+# Long-running management tasks (compiles, exports, archives and restores) are queued as
+# jobs in the _jobs collection and run by a runner, each in a process of its own, so that
+# none of them competes with the service for its interpreter. A job document holds:
+#   {"_id", "kind", "arguments", "status", "submitted", "started", "finished", "seconds",
+#    "runner", "heartbeat", "cancelling", "log", "result", "error"}
+# Its status moves from queued to running, and then to finished, failed or cancelled.
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# The function of ont.management each kind of job calls, with the job's arguments
+KINDS = {
+    "compile": "compile",
+    "export": "export",
+    "archive": "archive_collection",
+    "restore": "install_archive",
+}
+
+# Kinds of job that cannot be stopped partway without leaving a collection renamed or
+# half restored, so are only cancelled while queued
+UNINTERRUPTIBLE = {"archive", "restore"}
+
+# Jobs a runner runs at once, and at most of any one kind; a compile already spreads
+# across COMPILE_PROCESSES of its own
+WORKERS = int(os.environ["JOB_WORKERS"]) if "JOB_WORKERS" in os.environ else 2
+LIMITS = {"compile": 1}
+
+# Seconds between a runner's polls of the queue, and without a heartbeat from a job's
+# runner before the job is presumed lost with it
+POLL_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 60.0
+
+# Lines of output kept in each job's log
+LOG_LINES = 1000
+
+
+def jobs_collection():
+    client = ont.management.getclient()
+    return client[ont.management.DATABASE][ont.management.JOBS]
+
+
+def submit(kind: str, **arguments) -> str:
+    if kind not in KINDS:
+        raise Exception("Unknown job kind " + kind + ".")
+
+    id = uuid.uuid4().hex
+    jobs_collection().insert_one(
+        {
+            "_id": id,
+            "kind": kind,
+            "arguments": arguments,
+            "status": QUEUED,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "log": [],
+        }
+    )
+    return id
+
+
+def get(id: str) -> dict:
+    return jobs_collection().find_one({"_id": id})
+
+
+def list_jobs(limit: int = 20) -> List[dict]:
+    # The most recently submitted jobs, less their logs
+    cursor = jobs_collection().find({}, {"log": 0})
+    return list(cursor.sort("submitted", DESCENDING).limit(limit))
+
+
+def cancel(id: str) -> bool:
+    # A queued job is cancelled outright; a running one is stopped by its runner, unless it
+    # cannot be interrupted
+    jobs = jobs_collection()
+
+    result = jobs.update_one(
+        {"_id": id, "status": QUEUED},
+        {"$set": {"status": CANCELLED, "finished": time.time()}},
+    )
+    if result.modified_count > 0:
+        return True
+
+    result = jobs.update_one(
+        {"_id": id, "status": RUNNING, "kind": {"$nin": list(UNINTERRUPTIBLE)}},
+        {"$set": {"cancelling": time.time()}},
+    )
+    return result.modified_count > 0
+
+
+def execute(id: str):
+    # Runs a claimed job, in the process started for it, recording its output, its result
+    # or error, and how long it took
+    jobs = jobs_collection()
+    job = jobs.find_one({"_id": id})
+
+    log = Log(jobs, id)
+    stdout = sys.stdout
+    sys.stdout = log
+
+    update = {}
+    try:
+        function = getattr(ont.management, KINDS[job["kind"]])
+        update["result"] = function(**job["arguments"])
+        update["status"] = FINISHED
+    except Exception as e:
+        traceback.print_exc(file=log)
+        update["error"] = str(e) or type(e).__name__
+        update["status"] = FAILED
+    finally:
+        sys.stdout = stdout
+        log.flush()
+
+    # A compile asked to stop returns early, from its last checkpoint
+    job = jobs.find_one({"_id": id}, {"started": 1, "cancelling": 1})
+    if update["status"] == FINISHED and job.get("cancelling") is not None:
+        update["status"] = CANCELLED
+
+    update["finished"] = time.time()
+    update["seconds"] = update["finished"] - job["started"]
+    jobs.update_one({"_id": id}, {"$set": update})
+
+
+class Log(object):
+    # A file-like object appending what is written to it to a job's log, a line at a time
+
+    def __init__(self, jobs, id: str):
+        self.jobs = jobs
+        self.id = id
+        self.buffer = ""
+
+    def write(self, text: str):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.append(line)
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.append(self.buffer)
+            self.buffer = ""
+
+    def append(self, line: str):
+        self.jobs.update_one(
+            {"_id": self.id},
+            {"$push": {"log": {"$each": [line], "$slice": -LOG_LINES}}},
+        )
+
+
+class Runner(object):
+    # Claims queued jobs, oldest first, and runs each in a process of its own, as many at
+    # once as its workers and the limits on each kind allow. The limits are per runner.
+
+    def __init__(self, workers: int = None, limits: Dict[str, int] = None):
+        self.workers = WORKERS if workers is None else workers
+        self.limits = LIMITS if limits is None else limits
+        self.name = "%s:%d" % (socket.gethostname(), os.getpid())
+
+        # The job and process of each job running
+        self.running = {}
+        self.stopping = set()
+
+    def serve(self):
+        while True:
+            self.poll()
+            time.sleep(POLL_INTERVAL)
+
+    def poll(self):
+        jobs = jobs_collection()
+
+        # Jobs whose processes exited without recording how their jobs ended have failed
+        for id, (job, process) in list(self.running.items()):
+            if process.is_alive():
+                continue
+
+            process.join()
+            self.running.pop(id)
+            self.stopping.discard(id)
+            jobs.update_one(
+                {"_id": id, "status": RUNNING},
+                {
+                    "$set": {
+                        "status": FAILED,
+                        "finished": time.time(),
+                        "error": "Exited with code %s." % process.exitcode,
+                    }
+                },
+            )
+
+        if len(self.running) > 0:
+            jobs.update_many(
+                {"_id": {"$in": list(self.running.keys())}},
+                {"$set": {"heartbeat": time.time()}},
+            )
+
+        for job in jobs.find(
+            {"_id": {"$in": list(self.running.keys())}, "cancelling": {"$ne": None}}
+        ):
+            if job["_id"] not in self.stopping:
+                self.stop(job)
+
+        # Running jobs of runners that have stopped beating are presumed lost
+        jobs.update_many(
+            {"status": RUNNING, "heartbeat": {"$lt": time.time() - HEARTBEAT_TIMEOUT}},
+            {
+                "$set": {
+                    "status": FAILED,
+                    "finished": time.time(),
+                    "error": "Lost with its runner.",
+                }
+            },
+        )
+
+        job = self.claim()
+        while job is not None:
+            process = Process(target=execute, args=(job["_id"],))
+            process.start()
+            self.running[job["_id"]] = (job, process)
+            job = self.claim()
+
+    def claim(self) -> dict:
+        # The oldest queued job there is room to run, marked as running here
+        if len(self.running) >= self.workers:
+            return None
+
+        kinds = list(map(lambda r: r[0]["kind"], self.running.values()))
+        full = [k for k, limit in self.limits.items() if kinds.count(k) >= limit]
+
+        return jobs_collection().find_one_and_update(
+            {"status": QUEUED, "kind": {"$nin": full}},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "started": time.time(),
+                    "runner": self.name,
+                    "heartbeat": time.time(),
+                }
+            },
+            sort=[("submitted", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def stop(self, job: dict):
+        # A compile is asked to stop at its next checkpoint, so that it can be resumed; any
+        # other job (or a compile not yet under way) is terminated, unless terminating it
+        # would skip its cleanup
+        self.stopping.add(job["_id"])
+        if job["kind"] in UNINTERRUPTIBLE:
+            return
+
+        if job["kind"] == "compile":
+            if ont.management.cancel_compile(job["arguments"]["collection"]):
+                return
+
+        process = self.running[job["_id"]][1]
+        process.terminate()
+        jobs_collection().update_one(
+            {"_id": job["_id"], "status": RUNNING},
+            {"$set": {"status": CANCELLED, "finished": time.time()}},
+        )
+
+
+def serve(workers: int = None):
+    Runner(workers=workers).serve()
+
+
+def start(workers: int = None) -> Process:
+    # Starts a runner in a process of its own; it is not a daemon, as its jobs start
+    # processes of their own
+    process = Process(target=serve, args=(workers,))
+    process.start()
+    return process
+
+
+if __name__ == "__main__":
+    workers = None
+
+    for arg in sys.argv:
+        if "=" in arg:
+            k = arg.split("=")[0]
+            v = arg.split("=")[1]
+
+            if k == "workers":
+                workers = int(v)
+
+    serve(workers=workers)
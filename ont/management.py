@@ -1,8 +1,12 @@
+from bson import ObjectId
+from contextlib import contextmanager
 from os.path import join
-from pymongo import MongoClient
-from typing import Set, Tuple
+from pymongo import ASCENDING, MongoClient, ReturnDocument
+from typing import List, Tuple, Union
 
 import boto3
+import botocore.exceptions
+import json
 import os
 import pymongo.errors
 import subprocess
@@ -16,9 +20,45 @@ MONGO_HOST = os.environ["MONGO_HOST"] if "MONGO_HOST" in os.environ else "localh
 MONGO_PORT = int(os.environ["MONGO_PORT"]) if "MONGO_PORT" in os.environ else 27017
 DATABASE = "leia-ontology"
 
+# Collections prefixed with an underscore hold service bookkeeping, not ontologies
+VERSIONS = "_versions"
+EDIT_LOG = "_editlog_"
+HASHES = "_hashes_"
+JOBS = "_jobs"
+
+EXPORT_EXTENSIONS = {"python": ".p", "lisp": ".lisp"}
+
+# Writers that have not finished an edit within this many seconds are presumed dead
+WRITER_TIMEOUT = 60.0
+READ_ATTEMPTS = 5
+READ_DELAY = 0.01
+
+# Indexes every ontology collection carries, for the lookups the API makes by name, by
+# parent (subclasses, $graphLookup descendants) and by slot or filler (domains and ranges,
+# usage reports, the remove_concept cascade), and by the ancestors and depth fields of
+# materialized collections
+INDEXES = [
+    ("name", True),
+    ("parents", False),
+    ("localProperties.slot", False),
+    ("localProperties.filler", False),
+    ("ancestors", False),
+    ("depth", False),
+]
+
+# Representative queries the API issues, used to verify that none of them scans
+HOT_QUERIES = [
+    {"name": "all"},
+    {"name": {"$in": ["all"]}},
+    {"parents": "all"},
+    {"localProperties.slot": "is-a"},
+    {"localProperties.filler": "all"},
+]
+
 
 def activate(collection):
     os.environ[ONTOLOGY_ACTIVE] = collection
+    ensure_indexes(collection)
 
 
 def active():
@@ -45,7 +85,10 @@ def list_collections():
     client = getclient()
     db = client[DATABASE]
     return sorted(
-        filter(lambda c: not c.startswith("compiled_"), db.list_collection_names())
+        filter(
+            lambda c: not c.startswith("compiled_") and not c.startswith("_"),
+            db.list_collection_names(),
+        )
     )
 
 
@@ -59,7 +102,20 @@ def rename_collection(original_name, new_name):
             "Cannot rename to " + new_name + ", that ontology already exists."
         )
 
+    import ont.hashing
+
+    hashes = ont.hashing.current(collection)
+    fields = materialized(collection)
+
     collection.rename(new_name)
+    invalidate(collection)
+    invalidate(db[new_name])
+
+    # Renaming leaves the content unchanged, so the hashes (and the materialized fields)
+    # go with it
+    ont.hashing.adopt(collection, db[new_name], hashes, move=True)
+    set_materialized(db[new_name], fields)
+    set_materialized(collection, False)
 
     if active() == original_name:
         activate(new_name)
@@ -70,6 +126,9 @@ def delete_collection(name):
     db = client[DATABASE]
     collection = db[name]
     collection.drop()
+    db[VERSIONS].delete_one({"_id": name})
+    db[EDIT_LOG + name].drop()
+    db[HASHES + name].drop()
 
 
 def make_collection(name):
@@ -100,6 +159,15 @@ def copy_collection(original_name, copied_name):
     out = {"$out": copied_name}
 
     collection.aggregate([match, out])
+    invalidate(db[copied_name])
+    ensure_indexes(copied_name)
+
+    # The copy is identical, so it can start from the original's hashes, and carries its
+    # materialized fields
+    import ont.hashing
+
+    ont.hashing.adopt(collection, db[copied_name], ont.hashing.current(collection))
+    set_materialized(db[copied_name], materialized(collection))
 
 
 def publish_archive(name):
@@ -110,8 +178,20 @@ def publish_archive(name):
 
     path = path + "/" + name + ".gz"
 
+    # Skip the upload if the repository already holds an archive of the same content
+    hash = _read_sidecar(path)
+
     s3 = boto3.resource("s3")
-    s3.Object("leia-ontology-repository", name + ".gz").put(Body=open(path, "rb"))
+    remote = s3.Object("leia-ontology-repository", name + ".gz")
+    if hash is not None:
+        try:
+            if remote.metadata.get("hash") == hash:
+                return
+        except botocore.exceptions.ClientError:
+            pass
+
+    metadata = {} if hash is None else {"hash": hash}
+    remote.put(Body=open(path, "rb"), Metadata=metadata)
 
 
 def list_remote_archives():
@@ -136,6 +216,13 @@ def download_archive(name):
 def collection_to_file(collection, path):
     path = join(path, collection + ".gz")
 
+    # An archive is only rewritten if the collection's content has changed since
+    import ont.hashing
+
+    hash = ont.hashing.collection_hash(getclient()[DATABASE][collection])
+    if os.path.exists(path) and _read_sidecar(path) == hash:
+        return
+
     cmd = (
         "mongodump --archive="
         + path
@@ -149,6 +236,39 @@ def collection_to_file(collection, path):
         + str(MONGO_PORT)
     )
     print(subprocess.check_output(cmd, stderr=subprocess.STDOUT, shell=True))
+    _write_sidecar(path, hash)
+
+
+def archive_collection(collection, name):
+    # Archives the collection to ARCHIVE_PATH as <name>.gz
+    path = os.environ[ARCHIVE_PATH] if ARCHIVE_PATH in os.environ else None
+
+    if path is None:
+        raise Exception("Unknown ARCHIVE_PATH variable.")
+
+    if name != collection and name in list_collections():
+        raise Exception("Cannot archive using another name that already exists.")
+
+    if name != collection:
+        rename_collection(collection, name)
+
+    try:
+        collection_to_file(name, path)
+    finally:
+        if name != collection:
+            rename_collection(name, collection)
+
+    return join(path, name + ".gz")
+
+
+def install_archive(name):
+    # Restores the archive <name>.gz from ARCHIVE_PATH
+    path = os.environ[ARCHIVE_PATH] if ARCHIVE_PATH in os.environ else None
+
+    if path is None:
+        raise Exception("Unknown ARCHIVE_PATH variable.")
+
+    file_to_collection(path + "/" + name + ".gz")
 
 
 def file_to_collection(path):
@@ -165,6 +285,23 @@ def file_to_collection(path):
     )
     print(subprocess.check_output(cmd, stderr=subprocess.STDOUT, shell=True))
 
+    client = getclient()
+    invalidate(client[DATABASE][name])
+    ensure_indexes(name)
+    rematerialize(client[DATABASE][name])
+
+
+def rematerialize(collection):
+    # Restored documents carry whatever ancestors and depth fields they were archived with,
+    # whatever the flag says; they are recomputed if there are any, and flagged as absent
+    # if not
+    import ont.hierarchy
+
+    if collection.find_one({"ancestors": {"$exists": True}}, {"_id": 1}) is not None:
+        ont.hierarchy.backfill(collection)
+    else:
+        set_materialized(collection, False)
+
 
 def list_local_archives():
     path = os.environ[ARCHIVE_PATH] if ARCHIVE_PATH in os.environ else None
@@ -191,238 +328,290 @@ def delete_local_archive(name):
 
     path = path + "/" + name + ".gz"
     os.remove(path)
+    if os.path.exists(path + ".hash"):
+        os.remove(path + ".hash")
 
 
-def compile_progress():
-    results = {}
+def _read_sidecar(path) -> Union[str, None]:
+    # Archives and exports are stamped with the hash of the content they were written from,
+    # in a <file>.hash file alongside
+    try:
+        with open(path + ".hash") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
 
-    for c in list_collections():
-        client = getclient()
-        db = client[DATABASE]
-        compiled = db["compiled_" + c]
 
-        progress = compiled.find_one({"_id": "PROGRESS"})
-        if progress is not None:
-            progress["status"]["percent"] = int(
-                100.0
-                * (
-                    float(progress["status"]["count"])
-                    / float(progress["status"]["total"])
-                )
-            )
+def _write_sidecar(path, hash: str):
+    with open(path + ".hash", "w") as f:
+        f.write(hash)
 
-        results[c] = {
-            "collection": c,
-            "compiled_collection": compiled.name,
-            "progress": progress,
-        }
 
-    return results
+def ensure_indexes(name):
+    client = getclient()
+    db = client[DATABASE]
+    collection = db[name]
 
+    # An index already on a field is kept whatever its options: a legacy collection's name
+    # index may be unconstrained, and asking for a unique one over it would conflict
+    existing = collection.index_information()
 
-def compile(
-    collection: str,
-    compile_inherited_values: bool = False,
-    compile_domains_and_ranges: bool = False,
-    compile_inverses: bool = False,
-):
+    for field, unique in INDEXES:
+        if field + "_1" in existing:
+            continue
+        try:
+            collection.create_index(field, unique=unique)
+        except pymongo.errors.DuplicateKeyError:
+            # Legacy collections may hold duplicate names; index them anyway, unconstrained
+            collection.create_index(field)
+
+
+def verify_indexes(name) -> List[dict]:
+    # Explains each hot query, and returns those whose winning plan still scans the collection
     client = getclient()
     db = client[DATABASE]
-    compiled = db["compiled_" + collection]
+    collection = db[name]
 
-    # Check to see if a compile operation is in progress
-    progress = compiled.find_one({"_id": "PROGRESS"})
-    if progress is not None:
-        if progress["finished"] is None:
-            raise PermissionError
+    def stages(plan):
+        found = [plan["stage"]]
+        if "inputStage" in plan:
+            found.extend(stages(plan["inputStage"]))
+        for input in plan.get("inputStages", []):
+            found.extend(stages(input))
+        return found
 
-    # Reset the compiled database
-    compiled.drop()
+    scans = []
+    for query in HOT_QUERIES:
+        plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+        plan_stages = stages(plan)
+        if "COLLSCAN" in plan_stages:
+            scans.append({"query": query, "stages": plan_stages})
 
-    # Connect to the API
-    from ont.api import OntologyAPI
+    return scans
 
-    api = OntologyAPI(collection=db[collection])
 
-    # List all of the concepts
-    concepts = set(api.list())
+def version(collection) -> int:
+    return _version_document(collection)["version"]
 
-    # Prime the PROGRESS document
-    compiled.insert_one(
-        {
-            "_id": "PROGRESS",
-            "status": {"count": 0, "total": len(concepts), "last": None},
-            "started": time.time(),
-            "finished": None,
-        }
-    )
 
-    # Calculate the relations and inverses
-    relations = api.relations_to_inverses()
+def _version_document(collection) -> dict:
+    # Versions start from the current time in microseconds, so a collection that is
+    # dropped and recreated never repeats a version an older cache may have pinned
+    versions = collection.database[VERSIONS]
 
-    # Calculate the full ancestry and define a helper method
-    ancestry = api.full_ancestry()
+    document = versions.find_one({"_id": collection.name})
+    if document is None:
+        versions.update_one(
+            {"_id": collection.name},
+            {"$setOnInsert": {"version": int(time.time() * 1000000), "writers": []}},
+            upsert=True,
+        )
+        document = versions.find_one({"_id": collection.name})
 
-    def ancestors_or_default(c):
-        try:
-            return ancestry[c]
-        except:
-            return set()
+    return document
 
-    # Define a helper method for reducing any set of concepts to their common set of ancestors
-    def reduce_to_common_ancestors(concepts: Set[str]) -> Set[str]:
-        to_prune = set()
 
-        for c in concepts:
-            # If any of the filler's ancestors are in the list of concepts it can be pruned
-            ancestors = ancestors_or_default(c)
-            if len(ancestors.intersection(concepts)) > 0:
-                to_prune.add(c)
+def materialized(collection) -> bool:
+    # Whether the concept documents carry maintained ancestors and depth fields
+    return _version_document(collection).get("materialized", False)
 
-        return concepts.difference(to_prune)
 
-    # Define a helper method for determining the domains and ranges of a given property
-    def get_domain_range(property: str) -> Tuple[Set[str], Set[str]]:
-        coll = api.collection
+def set_materialized(collection, materialized: bool):
+    _version_document(collection)
+    collection.database[VERSIONS].update_one(
+        {"_id": collection.name}, {"$set": {"materialized": materialized}}
+    )
 
-        pipeline = [
-            {"$match": {"localProperties.slot": property}},
-            {"$project": {"localProperties": 1, "_id": "$name"}},
-            {"$unwind": "$localProperties"},
-            {"$match": {"localProperties.slot": property}},
-            {"$project": {"range": "$localProperties.filler"}},
-        ]
-        results = list(coll.aggregate(pipeline))
 
-        domains = set(map(lambda r: r["_id"], results))
-        ranges = set(map(lambda r: r["range"], results))
+def pinned_version(collection) -> Tuple[int, bool]:
+    # Waits (briefly) for any live writers to finish before handing out a version to read
+    # at, and says whether one was still writing when it gave up. Edits bump the version
+    # before they write, so a read made while one is writing may be torn even though the
+    # version has not moved by the end of it.
+    document = _version_document(collection)
+    for attempt in range(READ_ATTEMPTS):
+        if not _writing(document):
+            break
 
-        domains = reduce_to_common_ancestors(domains)
+        time.sleep(READ_DELAY * (2**attempt))
+        document = _version_document(collection)
 
-        if "relation" in ancestors_or_default(property):
-            ranges = reduce_to_common_ancestors(ranges)
+    return document["version"], _writing(document)
 
-        return domains, ranges
 
-    # Define a helper method for explicitly populating a frame with its inverses (NOT USED AT THIS TIME)
-    def populate_inverses(c: str, frame: dict):
-        usages = api.report(
-            c, include_usage=True, usage_with_inheritance=compile_inherited_values
-        )
-        inv_slots = set()
-        for inv in usages["usage"]["inverses"]:
-            try:
-                slot = relations[inv["slot"]]
-            except:
-                slot = inv["slot"]
-            facet = inv["facet"]
-            filler = inv["concept"]
-
-            if slot not in frame[c]:
-                frame[c][slot] = {}
-            if facet not in frame[c][slot]:
-                frame[c][slot][facet] = []
-            frame[c][slot][facet].append(filler)
-
-            # Note which inverses have been used in this frame
-            inv_slots.add(slot)
-
-        # Reduce all inverse to their common ancestors
-        for slot in inv_slots:
-            for facet in frame[c][slot].keys():
-                fillers = set(frame[c][slot][facet])
-                fillers = reduce_to_common_ancestors(fillers)
-                frame[c][slot][facet] = list(fillers)
-
-    # Define a helper method to declare a slot/facet if needed
-    def declare_slot_facet(frame: dict, slot: str, facet: str):
-        if slot not in frame:
-            frame[slot] = {}
-        if facet not in frame[slot]:
-            frame[slot][facet] = []
-
-    # Define a helper method to format the frame (with upper casing, etc.)
-    def format_frame_for_insert(frame: dict) -> dict:
-        frame = frame[c]
-        for slot_name in list(frame.keys()):
-            slot = frame.pop(slot_name)
-            frame[slot_name.upper()] = slot
-
-            for facet_name in list(slot.keys()):
-                facet = slot.pop(facet_name)
-                slot[facet_name.upper()] = list(
-                    map(
-                        lambda filler: (
-                            filler.upper() if type(filler) == str else filler
-                        ),
-                        facet,
-                    )
-                )
+def _writing(document: dict) -> bool:
+    return any(
+        map(lambda w: time.time() - w["since"] < WRITER_TIMEOUT, document["writers"])
+    )
 
-        frame["_id"] = c.upper()
-        return frame
 
-    # Initialize the state
-    count = 0
-    properties = []
+def edit_log(collection):
+    return collection.database[EDIT_LOG + collection.name]
 
-    # Compile each concept
-    local = not compile_inherited_values
-    for c in concepts:
-        frame = api.get(c, local=local)[0]
 
-        if compile_domains_and_ranges and "property" in ancestors_or_default(c):
-            domains, ranges = get_domain_range(c)
+def edits_since(collection, since: int, until: int = None) -> Union[List[dict], None]:
+    # Returns the logged edits that account for every version step in (since, until], or
+    # None if any step is unaccounted for (an unlogged, failed or still running edit)
+    if until is None:
+        until = version(collection)
 
-            declare_slot_facet(frame[c], "domain", "sem")
-            frame[c]["domain"]["sem"] = domains
+    if since == until:
+        return []
 
-            declare_slot_facet(frame[c], "range", "sem")
-            frame[c]["range"]["sem"] = ranges
+    entries = list(
+        edit_log(collection)
+        .find({"_id": {"$gt": since - 2, "$lte": until}})
+        .sort("_id", ASCENDING)
+    )
+    entries = list(filter(lambda e: e["_id"] + e["span"] - 1 > since, entries))
+
+    steps = sum(map(lambda e: e["span"], entries))
+    if steps != until - since or not all(map(lambda e: e["replayable"], entries)):
+        return None
+    if len(entries) > 0 and entries[0]["_id"] <= since:
+        return None
+
+    return entries
+
+
+@contextmanager
+def editing(collection, operation: str, arguments: dict):
+    # Edits bump the version both before and after writing; a reader that pinned a version
+    # and still sees it afterwards cannot have observed a partially applied edit. Versions
+    # and the edit log only know of writes made through here: anything else that writes to
+    # a collection (a script, or a test inserting documents directly) must call
+    # invalidate() afterwards, or cached hierarchy indexes will not see its writes.
+    versions = collection.database[VERSIONS]
+
+    writer = ObjectId()
+    opening = {
+        "$inc": {"version": 1},
+        "$push": {"writers": {"id": writer, "since": time.time()}},
+    }
+    document = versions.find_one_and_update(
+        {"_id": collection.name}, opening, return_document=ReturnDocument.AFTER
+    )
+    if document is None:
+        # The first edit of a collection creates its version document
+        _version_document(collection)
+        document = versions.find_one_and_update(
+            {"_id": collection.name}, opening, return_document=ReturnDocument.AFTER
+        )
 
-        # Convert frame names, slots, facets, and relation fillers to upper case
-        frame = format_frame_for_insert(frame)
+    # The log entry is keyed by the version the edit started at, and written before the
+    # closing bump, so anyone who can see the new version can also see its entry. It also
+    # records whether the edit had materialized fields to maintain, as read by the opening
+    # bump, so that editors need not read the flag separately.
+    edit = {
+        "_id": document["version"],
+        "span": 2,
+        "operation": operation,
+        "arguments": arguments,
+        "time": time.time(),
+        "replayable": False,
+        "materialized": document.get("materialized", False),
+    }
+    try:
+        yield edit
+        # A caller that finds its edit only partly made marks it partial, so it is never
+        # replayed
+        edit["replayable"] = not edit.pop("partial", False)
+    finally:
+        edit_log(collection).insert_one(edit)
+        versions.update_one(
+            {"_id": collection.name},
+            {"$inc": {"version": 1}, "$pull": {"writers": {"id": writer}}},
+        )
 
-        if compile_inverses and "relation" in ancestors_or_default(c):
-            properties.append(frame)
 
-        count += 1
-        compiled.insert_one(frame)
-        compiled.update_one(
-            {"_id": "PROGRESS"}, {"$set": {"status.count": count, "status.last": c}}
-        )
+def invalidate(collection):
+    # Mark out-of-band rewrites (restores, copies, renames, direct writes) as a new version
+    _version_document(collection)
+    document = collection.database[VERSIONS].find_one_and_update(
+        {"_id": collection.name},
+        {"$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    edit_log(collection).insert_one(
+        {
+            "_id": document["version"],
+            "span": 1,
+            "operation": "invalidate",
+            "arguments": {},
+            "time": time.time(),
+            "replayable": False,
+        }
+    )
+
 
-    # Compile each inverse property (this list will be empty if compile_inverses is False)
-    import copy
+def compile_progress():
+    import ont.compiler
 
-    for property in properties:
-        inverse = copy.deepcopy(property)
-        inverse["_id"] = relations[property["_id"].lower()].upper()
+    results = {}
 
-        if inverse["_id"].lower() in relations.keys():
-            continue
+    for c in list_collections():
+        client = getclient()
+        db = client[DATABASE]
+        compiled = db["compiled_" + c]
+
+        # Less the list of concepts being compiled, which is only kept to resume from
+        progress = compiled.find_one({"_id": "PROGRESS"}, {"concepts": 0})
+        if progress is not None:
+            progress["running"] = ont.compiler.running(progress)
+        if progress is not None and progress["status"]["total"] == 0:
+            # An incremental compile may have nothing to recompile; until a compile has
+            # counted what it will compile, it has done none of it
+            finished = progress["finished"] is not None
+            progress["status"]["percent"] = 100 if finished else 0
+        elif progress is not None:
+            progress["status"]["percent"] = int(
+                100.0
+                * (
+                    float(progress["status"]["count"])
+                    / float(progress["status"]["total"])
+                )
+            )
+
+        results[c] = {
+            "collection": c,
+            "compiled_collection": compiled.name,
+            "progress": progress,
+        }
+
+    return results
 
-        inverse["INVERSE"] = {"VALUE": [property["_id"]]}
 
-        declare_slot_facet(inverse, "DOMAIN", "SEM")
-        declare_slot_facet(inverse, "RANGE", "SEM")
+def compile(
+    collection: str,
+    compile_inherited_values: bool = False,
+    compile_domains_and_ranges: bool = False,
+    compile_inverses: bool = False,
+    incremental: bool = True,
+    processes: int = None,
+    batch_size: int = None,
+):
+    # Recompiles only the concepts edited since the last compile (see ont.compiler), unless
+    # incremental is False or that compile cannot be caught up from the edit log; frames
+    # are compiled across a pool of processes (by default, COMPILE_PROCESSES of them). A
+    # compile that was interrupted or cancelled is resumed from its last checkpoint.
+    import ont.compiler
+
+    ont.compiler.compile(
+        collection,
+        compile_inherited_values=compile_inherited_values,
+        compile_domains_and_ranges=compile_domains_and_ranges,
+        compile_inverses=compile_inverses,
+        incremental=incremental,
+        processes=processes,
+        batch_size=batch_size,
+    )
 
-        inverse["DOMAIN"]["SEM"] = property["RANGE"]["SEM"]
-        inverse["RANGE"]["SEM"] = property["DOMAIN"]["SEM"]
 
-        try:
-            compiled.insert_one(inverse)
-        except pymongo.errors.DuplicateKeyError as e:
-            print("Duplicate key %s" % inverse["_id"])
-
-        # Add the inverse as an explicit SUBCLASSES value of its parent
-        compiled.update_one(
-            {"_id": property["IS-A"]["VALUE"][0]},
-            {"$push": {"SUBCLASSES.VALUE": inverse["_id"]}},
-        )
+def cancel_compile(collection: str) -> bool:
+    # Stops a running compile at its next checkpoint; the next compile resumes from there
+    import ont.compiler
 
-    # Mark the task as finished
-    compiled.update_one({"_id": "PROGRESS"}, {"$set": {"finished": time.time()}})
+    return ont.compiler.cancel(collection)
 
 
 def export(collection: str, format: str):
@@ -505,9 +694,23 @@ def export(collection: str, format: str):
 
         return filename
 
+    if format not in EXPORT_EXTENSIONS:
+        raise Exception
+
+    # A file exported from a compile of the same content, with the same options, is current
+    filename = path + "/" + "ontology_" + collection + EXPORT_EXTENSIONS[format]
+    source = progress.get("source")
+    if source is not None:
+        source = json.dumps(source, sort_keys=True)
+        if os.path.exists(filename) and _read_sidecar(filename) == source:
+            return filename
+
     if format == "python":
-        return export_as_python(concepts)
+        filename = export_as_python(concepts)
     if format == "lisp":
-        return export_as_lisp(concepts)
+        filename = export_as_lisp(concepts)
+
+    if source is not None:
+        _write_sidecar(filename, source)
 
-    raise Exception
+    return filename
@@ -123,13 +123,17 @@ class Ontology:
 
         raise Exception("Concept " + concept + " not found.")
 
-    def get(self, concepts, local=True):
+    def get(self, concepts, local=True, slots=None, facets=None):
         if type(concepts) is not list:
             concepts = [concepts]
 
-        results = self.__rget(
-            "/ontology/api/get", params={"concept": concepts, "local": local}
-        )
+        params = {"concept": concepts, "local": local}
+        if slots is not None:
+            params["slot"] = slots
+        if facets is not None:
+            params["facet"] = facets
+
+        results = self.__rget("/ontology/api/get", params=params)
         return json.loads(results)
 
     def search(self, name_like: str = None):
@@ -224,12 +228,27 @@ class Ontology:
         results = self.__rget("/ontology/api/relations", params={"inverses": inverses})
         return json.loads(results)
 
+    def relations_to_inverses(self):
+        results = self.__rget("/ontology/api/relations_to_inverses", params={})
+        return json.loads(results)
+
+    def check_fillers(self, triples: list):
+        triples = list(map(list, triples))
+        response = self.__rpost(
+            "/ontology/api/check_fillers", data={"triples": triples}
+        )
+        return json.loads(response.read())
+
     def domains_and_ranges(self, property: str):
         results = self.__rget(
             "/ontology/api/domains_and_ranges", params={"property": property}
         )
         return json.loads(results)
 
+    def version(self):
+        results = self.__rget("/ontology/api/version", params={})
+        return json.loads(results)
+
     def update_definition(self, concept: str, definition: str):
         self.__rpost(
             "/ontology/edit/define/" + concept, data={"definition": definition}
@@ -276,3 +295,7 @@ class Ontology:
             "/ontology/edit/remove_concept/" + concept,
             data={"include_usages": include_usages},
         )
+
+    def apply_edits(self, edits: list):
+        response = self.__rpost("/ontology/edit/batch", data={"edits": edits})
+        return json.loads(response.read())
@@ -0,0 +1,69 @@
+from ont.hierarchy import Hierarchy
+from threading import RLock
+from typing import Dict
+
+ROOT = "relation"
+
+
+def registry(hierarchy: Hierarchy, inverses: Dict[str, str]) -> Dict[str, str]:
+    # Maps every relation to its inverse: its own inverse slot if it has one, else its first
+    # parent's (in the order the parents are listed). Relations are visited parents first
+    # (Kahn's algorithm over the relation subtree), so each is resolved exactly once.
+    relations = {ROOT: ROOT}
+    if ROOT not in hierarchy:
+        return relations
+
+    subtree = hierarchy.descendants(ROOT) | {ROOT}
+
+    waiting = {}
+    for relation in subtree:
+        parents = filter(lambda p: p in subtree, hierarchy.parents.get(relation, []))
+        waiting[relation] = len(set(parents))
+
+    ready = [ROOT] if waiting[ROOT] == 0 else []
+    while len(ready) > 0:
+        relation = ready.pop()
+
+        if relation in inverses and relation != ROOT:
+            relations[relation] = inverses[relation]
+        elif relation not in relations:
+            for parent in hierarchy.parents.get(relation, []):
+                if parent in relations:
+                    relations[relation] = relations[parent]
+                    break
+
+        for child in set(hierarchy.children.get(relation, [])):
+            waiting[child] -= 1
+            if waiting[child] == 0:
+                ready.append(child)
+
+    return relations
+
+
+_lock = RLock()
+_registries = {}
+
+
+def load(collection, hierarchy: Hierarchy) -> Dict[str, str]:
+    # The registry for the hierarchy's version of the collection, computed once per version
+    key = (collection.database.name, collection.name)
+    with _lock:
+        cached = _registries.get(key)
+        if cached is not None and cached[0] == hierarchy.version:
+            return cached[1]
+
+    inverses = {}
+    for record in collection.find(
+        {"localProperties.slot": "inverse"}, {"name": 1, "localProperties": 1, "_id": 0}
+    ):
+        for lp in record["localProperties"]:
+            if lp["slot"] == "inverse":
+                inverses[record["name"]] = lp["filler"]
+
+    relations = registry(hierarchy, inverses)
+
+    if hierarchy.version is not None:
+        with _lock:
+            _registries[key] = (hierarchy.version, relations)
+
+    return relations
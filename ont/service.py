@@ -7,6 +7,8 @@ from flask import (
     abort,
     render_template,
     session,
+    stream_with_context,
+    Response,
 )
 from flask_cors import CORS
 from flask_socketio import SocketIO
@@ -14,6 +16,7 @@ from itertools import groupby
 from ont.api import OntologyAPI
 
 import json
+import ont.jobs
 import ont.management
 import os
 
@@ -61,7 +64,11 @@ def api_get():
         pass
 
     concepts = request.args.getlist("concept")
-    return json.dumps(OntologyAPI().get(concepts, local=local))
+    slots = request.args.getlist("slot") or None
+    facets = request.args.getlist("facet") or None
+    return json.dumps(
+        OntologyAPI().get(concepts, local=local, slots=slots, facets=facets)
+    )
 
 
 @app.route("/ontology/api/roots", methods=["GET"])
@@ -150,6 +157,30 @@ def api_relations():
     return json.dumps(OntologyAPI().relations(inverses=inverses))
 
 
+@app.route("/ontology/api/relations_to_inverses", methods=["GET"])
+def api_relations_to_inverses():
+    return json.dumps(OntologyAPI().relations_to_inverses())
+
+
+@app.route("/ontology/api/check_fillers", methods=["POST"])
+def api_check_fillers():
+    if not request.get_json():
+        abort(400)
+
+    data = request.get_json()
+    if "triples" not in data or type(data["triples"]) is not list:
+        abort(400)
+
+    # Each triple is a [concept, slot, filler] list of strings
+    for triple in data["triples"]:
+        if type(triple) is not list or len(triple) != 3:
+            abort(400)
+        if not all(map(lambda t: type(t) is str, triple)):
+            abort(400)
+
+    return json.dumps(OntologyAPI().check_fillers(data["triples"]))
+
+
 @app.route("/ontology/api/domains_and_ranges", methods=["GET"])
 def api_domains_and_ranges():
     if "property" not in request.args:
@@ -160,6 +191,11 @@ def api_domains_and_ranges():
     return json.dumps(OntologyAPI().domains_and_ranges(property))
 
 
+@app.route("/ontology/api/version", methods=["GET"])
+def api_version():
+    return json.dumps(OntologyAPI().version())
+
+
 ### /ontology/view - routes for the editor and browser ui, GET only
 
 
@@ -470,7 +506,10 @@ def edit_add_parent(concept):
             make_response(jsonify(message="Unknown concept %s." % parent.lower()), 400)
         )
 
-    OntologyAPI().add_parent(concept, parent)
+    try:
+        OntologyAPI().add_parent(concept, parent)
+    except Exception as e:
+        abort(make_response(jsonify(message=str(e)), 400))
 
     return "OK"
 
@@ -551,6 +590,32 @@ def edit_remove_concept(concept):
     return "OK"
 
 
+@app.route("/ontology/edit/batch", methods=["POST"])
+def edit_batch():
+    if not EDITING_ENABLED:
+        abort(403)
+
+    if not request.get_json():
+        abort(400)
+
+    data = request.get_json()
+    if "edits" not in data or type(data["edits"]) is not list:
+        abort(400)
+
+    # Each edit is an object naming its operation, alongside its arguments: strings (or
+    # null), bar include_usages, a boolean
+    for edit in data["edits"]:
+        if type(edit) is not dict or type(edit.get("operation")) is not str:
+            abort(400)
+        for key, value in edit.items():
+            if key == "include_usages" and type(value) is not bool:
+                abort(400)
+            if key != "include_usages" and value is not None and type(value) is not str:
+                abort(400)
+
+    return json.dumps(OntologyAPI().apply_edits(data["edits"]))
+
+
 ### /ontology/manage - routes for the version management system
 
 
@@ -578,6 +643,7 @@ def manage():
         "message": message,
         "error": error,
         "compiled": compile_progress(),
+        "jobs": ont.jobs.list_jobs(),
     }
 
     return render_template("manager.html", payload=payload, env=env_payload())
@@ -593,11 +659,80 @@ def manage_activate():
 
         activate(ontology)
     except Exception as e:
-        return redirect("/ontology/manage?error=" + e.message)
+        return redirect("/ontology/manage?error=" + str(e))
 
     return redirect("/ontology/manage")
 
 
+@app.route("/ontology/manage/indexes", methods=["POST"])
+def manage_indexes():
+
+    ontology = request.form["ontology"]
+
+    try:
+        from ont.management import ensure_indexes, verify_indexes
+
+        ensure_indexes(ontology)
+        scans = verify_indexes(ontology)
+    except Exception as e:
+        return redirect("/ontology/manage?error=" + str(e))
+
+    if len(scans) > 0:
+        queries = ", ".join(map(lambda scan: json.dumps(scan["query"]), scans))
+        return redirect("/ontology/manage?error=Collection scans in " + queries + ".")
+
+    message = "Indexed " + ontology + "."
+    return redirect("/ontology/manage?message=" + message)
+
+
+@app.route("/ontology/manage/check", methods=["POST"])
+def manage_check():
+
+    ontology = request.form["ontology"]
+
+    try:
+        from ont.integrity import check, valid
+
+        report = check(ont.management.getclient()[ont.management.DATABASE][ontology])
+    except Exception as e:
+        return redirect("/ontology/manage?error=" + str(e))
+
+    if not valid(report):
+        problems = "%d duplicates, %d cycles, %d dangling parents, %d dangling fillers"
+        problems = problems % (
+            len(report["duplicates"]),
+            len(report["cycles"]),
+            len(report["dangling_parents"]),
+            len(report["dangling_fillers"]),
+        )
+        return redirect("/ontology/manage?error=" + ontology + " has " + problems + ".")
+
+    message = "Checked %d concepts in %s; no problems found." % (
+        report["concepts"],
+        ontology,
+    )
+    return redirect("/ontology/manage?message=" + message)
+
+
+@app.route("/ontology/manage/diff", methods=["GET"])
+def manage_diff():
+    if "original" not in request.args or "updated" not in request.args:
+        abort(400)
+
+    from ont.diff import diff
+
+    db = ont.management.getclient()[ont.management.DATABASE]
+    deltas = diff(
+        db[request.args["original"]],
+        db[request.args["updated"]],
+        under=request.args.get("under"),
+    )
+
+    # One JSON delta per line, streamed as the two collections are merged
+    lines = map(lambda delta: json.dumps(delta) + "\n", deltas)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
 @app.route("/ontology/manage/copy", methods=["POST"])
 def manage_copy():
 
@@ -638,35 +773,9 @@ def manage_archive():
     name = request.form["name"]
     ontology = request.form["ontology"]
 
-    filename = name + ".gz"
+    job = ont.jobs.submit("archive", collection=ontology, name=name)
 
-    try:
-        from ont.management import (
-            collection_to_file,
-            list_collections,
-            rename_collection,
-            ARCHIVE_PATH,
-        )
-
-        if name != ontology and name in list_collections():
-            raise Exception("Cannot archive using another name that already exists.")
-
-        path = os.environ[ARCHIVE_PATH] if ARCHIVE_PATH in os.environ else None
-
-        if path is None:
-            raise Exception("Unknown ARCHIVE_PATH variable.")
-
-        if name != ontology:
-            rename_collection(ontology, name)
-
-        collection_to_file(name, path)
-
-        if name != ontology:
-            rename_collection(name, ontology)
-    except Exception as e:
-        return redirect("/ontology/manage?error=" + e.message)
-
-    message = "Archived " + ontology + " to " + filename + "."
+    message = "Archive of " + ontology + " queued as job " + job + "."
     return redirect("/ontology/manage?message=" + message)
 
 
@@ -676,21 +785,32 @@ def manage_compile():
     compile_inherited_values = "inh" in request.form
     compile_domains_and_ranges = "dr" in request.form
     compile_inverses = "inv" in request.form
+    processes = request.form.get("processes")
+    processes = int(processes) if processes else None
+
+    # Run by the job runner, in a process of its own
+    job = ont.jobs.submit(
+        "compile",
+        collection=ontology,
+        compile_inherited_values=compile_inherited_values,
+        compile_domains_and_ranges=compile_domains_and_ranges,
+        compile_inverses=compile_inverses,
+        processes=processes,
+    )
 
-    from threading import Thread
+    message = "Compile of " + ontology + " queued as job " + job + "."
+    return redirect("/ontology/manage?message=" + message)
 
-    t = Thread(
-        target=ont.management.compile,
-        args=(ontology,),
-        kwargs={
-            "compile_inherited_values": compile_inherited_values,
-            "compile_domains_and_ranges": compile_domains_and_ranges,
-            "compile_inverses": compile_inverses,
-        },
-    )
-    t.start()
 
-    message = "Compile started on " + ontology + "."
+@app.route("/ontology/manage/compile/cancel", methods=["POST"])
+def manage_compile_cancel():
+    ontology = request.form["ontology"]
+
+    if not ont.management.cancel_compile(ontology):
+        error = "No compile is running on " + ontology + "."
+        return redirect("/ontology/manage?error=" + error)
+
+    message = "Cancelling the compile of " + ontology + "."
     return redirect("/ontology/manage?message=" + message)
 
 
@@ -699,11 +819,44 @@ def manage_export():
     ontology = request.form["ontology"]
     format = request.form["format"]
 
-    file = ont.management.export(ontology, format)
+    job = ont.jobs.submit("export", collection=ontology, format=format)
+
+    message = "Export of " + ontology + " queued as job " + job + "."
+    return redirect("/ontology/manage?message=" + message)
+
+
+@app.route("/ontology/manage/jobs", methods=["GET"])
+def manage_jobs():
+    return json.dumps(ont.jobs.list_jobs())
+
+
+@app.route("/ontology/manage/jobs/<job>", methods=["GET"])
+def manage_job(job):
+    job = ont.jobs.get(job)
+    if job is None:
+        abort(404)
+
+    return json.dumps(job)
+
+
+@app.route("/ontology/manage/jobs/<job>/cancel", methods=["POST"])
+def manage_job_cancel(job):
+    if not ont.jobs.cancel(job):
+        return redirect("/ontology/manage?error=Job " + job + " is not running.")
+
+    message = "Cancelling job " + job + "."
+    return redirect("/ontology/manage?message=" + message)
+
+
+@app.route("/ontology/manage/jobs/<job>/download", methods=["GET"])
+def manage_job_download(job):
+    job = ont.jobs.get(job)
+    if job is None or job["kind"] != "export" or job["status"] != ont.jobs.FINISHED:
+        abort(404)
 
     from flask import send_file
 
-    return send_file(file, as_attachment=True)
+    return send_file(job["result"], as_attachment=True)
 
 
 @app.route("/ontology/manage/delete", methods=["POST"])
@@ -727,21 +880,9 @@ def manage_local_install():
 
     ontology = request.form["ontology"]
 
-    try:
-        from ont.management import file_to_collection, ARCHIVE_PATH
-
-        path = os.environ[ARCHIVE_PATH] if ARCHIVE_PATH in os.environ else None
+    job = ont.jobs.submit("restore", name=ontology)
 
-        if path is None:
-            raise Exception("Unknown ARCHIVE_PATH variable.")
-
-        path = path + "/" + ontology + ".gz"
-
-        file_to_collection(path)
-    except Exception as e:
-        return redirect("/ontology/manage?error=" + e.message)
-
-    message = "Installed " + ontology + "."
+    message = "Install of " + ontology + " queued as job " + job + "."
     return redirect("/ontology/manage?message=" + message)
 
 
@@ -808,6 +949,7 @@ def manage_new():
 if __name__ == "__main__":
     host = "127.0.0.1"
     port = 5003
+    jobs = True
 
     import sys
 
@@ -820,5 +962,12 @@ if __name__ == "__main__":
                 host = v
             if k == "port":
                 port = int(v)
+            if k == "jobs":
+                jobs = v.lower() == "true"
+
+    # Compiles, exports, archives and restores are run by a job runner in a process of its
+    # own; with jobs=false, one is expected to be run separately (python -m ont.jobs)
+    if jobs:
+        ont.jobs.start()
 
     socketio.run(app, host=host, port=port, debug=False)
@@ -1,8 +1,11 @@
 from ont.api import OntologyAPI
-from tests.TestUtils import mock_concept
+from tests.TestUtils import count_commands, mock_concept
+from typing import List
 
+import ont.hierarchy
 import ont.management
 import os
+import pymongo.errors
 import unittest
 
 
@@ -317,6 +320,67 @@ class APIGetTestCase(unittest.TestCase):
             results[0]["child"]["test"]["sem"],
         )
 
+    def test_get_slots(self):
+        parent = mock_concept(
+            "parent",
+            localProperties=[
+                {"slot": "agent", "facet": "sem", "filler": "human"},
+                {"slot": "theme", "facet": "sem", "filler": "object"},
+            ],
+        )
+        child = mock_concept(
+            "child",
+            parents=["parent"],
+            localProperties=[
+                {"slot": "agent", "facet": "default", "filler": "doctor"},
+                {"slot": "location", "facet": "sem", "filler": "place"},
+            ],
+            totallyRemovedProperties=[
+                {"slot": "theme", "facet": "sem", "filler": "object"}
+            ],
+        )
+
+        results = OntologyAPI().get("child", slots=["Agent"])
+        self.assertEqual(
+            [{"child": {"agent": {"default": ["doctor"], "sem": ["human"]}}}], results
+        )
+
+        results = OntologyAPI().get("child", slots=["agent", "is-a"], facets=["sem"])
+        self.assertEqual(
+            [{"child": {"is-a": {"value": ["parent"]}, "agent": {"sem": ["human"]}}}],
+            results,
+        )
+
+        results = OntologyAPI().get("child", slots=["theme", "subclasses"])
+        self.assertEqual([{"child": {"subclasses": {"value": []}}}], results)
+
+        # Facets alone filter "is-a" and "subclasses" like any other slot
+        results = OntologyAPI().get("child", facets=["sem"])
+        self.assertEqual(
+            [{"child": {"agent": {"sem": ["human"]}, "location": {"sem": ["place"]}}}],
+            results,
+        )
+
+        results = OntologyAPI().get("child", facets=["value"])
+        self.assertEqual(
+            [{"child": {"is-a": {"value": ["parent"]}, "subclasses": {"value": []}}}],
+            results,
+        )
+
+    def test_get_slots_local(self):
+        parent = mock_concept(
+            "parent",
+            localProperties=[{"slot": "agent", "facet": "sem", "filler": "human"}],
+        )
+        child = mock_concept(
+            "child",
+            parents=["parent"],
+            localProperties=[{"slot": "theme", "facet": "sem", "filler": "object"}],
+        )
+
+        results = OntologyAPI().get("child", local=True, slots=["agent", "theme"])
+        self.assertEqual([{"child": {"theme": {"sem": ["object"]}}}], results)
+
     def test_get_metadata_specifies_original_definition_per_filler(self):
         grandparent = mock_concept(
             "grandparent",
@@ -396,6 +460,57 @@ class APIGetTestCase(unittest.TestCase):
             results[0]["child"]["test"]["sem"],
         )
 
+    def test_get_metadata_blocks_are_not_shared_between_concepts(self):
+        parent = mock_concept(
+            "parent",
+            localProperties=[{"slot": "test", "facet": "sem", "filler": "value"}],
+        )
+        blocking = mock_concept(
+            "blocking",
+            parents=["parent"],
+            totallyRemovedProperties=[
+                {"slot": "test", "facet": "sem", "filler": "value"}
+            ],
+        )
+        inheriting = mock_concept("inheriting", parents=["parent"])
+
+        results = OntologyAPI().get(["blocking", "inheriting"], metadata=True)
+        results = dict(map(lambda r: list(r.items())[0], results))
+
+        self.assertTrue(results["blocking"]["test"]["sem"][0]["blocked"])
+        self.assertFalse(results["inheriting"]["test"]["sem"][0]["blocked"])
+        self.assertNotIn(
+            "metadata", ont.management.handle().find_one({"name": "parent"})
+        )
+
+    def test_get_resolves_shared_ancestors_once(self):
+        mock_concept(
+            "all", localProperties=[{"slot": "test", "facet": "sem", "filler": "all"}]
+        )
+        mock_concept("parent", parents=["all"])
+        for i in range(10):
+            mock_concept("child-%d" % i, parents=["parent"])
+
+        api = OntologyAPI()
+        inherit = api._inherit
+        resolved = []
+
+        def counting_inherit(concept, **kwargs):
+            resolved.append(concept["name"])
+            return inherit(concept, **kwargs)
+
+        api._inherit = counting_inherit
+
+        results = api.get(list(map(lambda i: "child-%d" % i, range(10))))
+        self.assertEqual(10, len(results))
+        for result in results:
+            self.assertEqual(["all"], list(result.values())[0]["test"]["sem"])
+
+        # Each child asks for its parent's properties, but they are only resolved once, so
+        # the root is only ever reached once
+        self.assertEqual(10, resolved.count("parent"))
+        self.assertEqual(1, resolved.count("all"))
+
     def test_get_metadata_augments_slots_with_type(self):
         mock_concept("relation")
         mock_concept(
@@ -428,6 +543,288 @@ class APIGetTestCase(unittest.TestCase):
         self.assertTrue(results[0]["concept"]["rel2-of"]["is_relation"])
 
 
+class APIRoundTripTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def mock_subtree(self, root: str, size: int) -> List[str]:
+        mock_concept(root, parents=["all"])
+
+        names = []
+        for i in range(size):
+            name = "%s-%d" % (root, i)
+            mock_concept(
+                name,
+                parents=[root],
+                localProperties=[{"slot": "agent", "facet": "sem", "filler": "all"}],
+            )
+            names.append(name)
+
+        return names
+
+    def test_get_round_trips_do_not_scale_with_concepts(self):
+        mock_concept("all")
+        small = self.mock_subtree("small", 2)
+        large = self.mock_subtree("large", 20)
+
+        OntologyAPI().get(small, metadata=True)
+
+        with count_commands() as small_commands:
+            OntologyAPI().get(small, metadata=True)
+        with count_commands() as large_commands:
+            OntologyAPI().get(large, metadata=True)
+
+        self.assertEqual(small_commands["commands"], large_commands["commands"])
+
+    def test_get_round_trips_do_not_scale_with_depth(self):
+        mock_concept("all")
+        parent = "all"
+        for i in range(12):
+            mock_concept("level-%d" % i, parents=[parent])
+            parent = "level-%d" % i
+
+        OntologyAPI().get("level-0")
+
+        with count_commands() as shallow_commands:
+            OntologyAPI().get("level-0")
+        with count_commands() as deep_commands:
+            OntologyAPI().get("level-11")
+
+        self.assertEqual(shallow_commands["commands"], deep_commands["commands"])
+
+    def test_cold_get_round_trips(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("physical-object", parents=["object"])
+
+        # Reading the version, the concepts with their ancestors and children, and the
+        # version again; a cold hierarchy index is not built
+        ont.management.invalidate(ont.management.handle())
+        ont.hierarchy.discard(ont.management.handle())
+        from_collection = ont.hierarchy.Hierarchy.from_collection
+        ont.hierarchy.Hierarchy.from_collection = None
+        try:
+            with count_commands() as commands:
+                results = OntologyAPI().get("object")
+        finally:
+            ont.hierarchy.Hierarchy.from_collection = from_collection
+
+        self.assertEqual(3, commands["commands"])
+        self.assertEqual(
+            ["physical-object"], results[0]["object"]["subclasses"]["value"]
+        )
+        self.assertEqual(["all"], results[0]["object"]["is-a"]["value"])
+
+    def test_edit_round_trips(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        ont.management.invalidate(ont.management.handle())
+
+        # The opening bump (which also reads the materialized flag), the write, the log
+        # entry and the closing bump
+        with count_commands() as commands:
+            OntologyAPI().insert_property("object", "slot", "sem", "all")
+
+        self.assertEqual(4, commands["commands"])
+
+    def test_descendants_round_trips_do_not_scale_with_subtree(self):
+        mock_concept("all")
+        self.mock_subtree("small", 2)
+        self.mock_subtree("large", 30)
+
+        OntologyAPI().descendants("small", details=True)
+
+        with count_commands() as small_commands:
+            OntologyAPI().descendants("small", details=True)
+        with count_commands() as large_commands:
+            OntologyAPI().descendants("large", details=True)
+
+        self.assertEqual(small_commands["commands"], large_commands["commands"])
+
+
+class APISnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_edits_bump_version(self):
+        concept = mock_concept("concept")
+
+        collection = ont.management.handle()
+        version = ont.management.version(collection)
+
+        OntologyAPI().insert_property("concept", "slot", "sem", "filler")
+        self.assertGreater(ont.management.version(collection), version)
+
+    def test_read_retries_after_concurrent_edit(self):
+        parent = mock_concept(
+            "parent",
+            localProperties=[{"slot": "slot", "facet": "sem", "filler": "value1"}],
+        )
+        concept = mock_concept("concept", parents=["parent"])
+
+        api = OntologyAPI()
+        format = api.format
+        calls = []
+
+        def format_during_edit(concept, **kwargs):
+            if len(calls) == 0:
+                OntologyAPI().insert_property("parent", "slot", "sem", "value2")
+            calls.append(concept["name"])
+            return format(concept, **kwargs)
+
+        api.format = format_during_edit
+
+        result = api.get("concept")
+        self.assertEqual(2, len(calls))
+        self.assertEqual(["value1", "value2"], result[0]["concept"]["slot"]["sem"])
+
+    def test_read_during_stalled_edit_is_not_accepted(self):
+        mock_concept("concept")
+        collection = ont.management.handle()
+
+        delay = ont.management.READ_DELAY
+        ont.management.READ_DELAY = 0.0
+        try:
+            with ont.management.editing(collection, "insert_property", {}):
+                collection.update_one(
+                    {"name": "concept"},
+                    {
+                        "$push": {
+                            "localProperties": {
+                                "slot": "slot",
+                                "facet": "sem",
+                                "filler": "value",
+                            }
+                        }
+                    },
+                )
+                with self.assertRaises(Exception):
+                    OntologyAPI().get("concept")
+        finally:
+            ont.management.READ_DELAY = delay
+
+        result = OntologyAPI().get("concept")
+        self.assertEqual(["value"], result[0]["concept"]["slot"]["sem"])
+
+    def test_read_fails_if_every_attempt_is_edited(self):
+        mock_concept("concept")
+
+        api = OntologyAPI()
+        format = api.format
+
+        def format_during_edit(concept, **kwargs):
+            OntologyAPI().insert_property("concept", "slot", "sem", "value")
+            return format(concept, **kwargs)
+
+        api.format = format_during_edit
+
+        with self.assertRaises(Exception):
+            api.get("concept")
+        self.assertFalse(api._pinned)
+
+    def test_cache_is_dropped_on_new_version(self):
+        concept = mock_concept("concept", parents=["parent"])
+        parent = mock_concept("parent")
+
+        api = OntologyAPI()
+        api.get("concept")
+        self.assertIn("parent", api._cache)
+
+        OntologyAPI().insert_property("parent", "slot", "sem", "value")
+
+        result = api.get("concept")
+        self.assertEqual(["value"], result[0]["concept"]["slot"]["sem"])
+
+
+class APIEditLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_version(self):
+        concept = mock_concept("concept")
+
+        version = OntologyAPI().version()
+        self.assertEqual(version, OntologyAPI().version())
+
+        OntologyAPI().update_definition("concept", "a definition")
+        self.assertEqual(version + 2, OntologyAPI().version())
+
+    def test_edits_are_logged_in_order(self):
+        concept = mock_concept("concept")
+        parent = mock_concept("parent")
+
+        collection = ont.management.handle()
+        version = ont.management.version(collection)
+
+        OntologyAPI().insert_property("concept", "Slot", "sem", "filler ")
+        OntologyAPI().add_parent("concept", "parent")
+
+        edits = ont.management.edits_since(collection, version)
+        self.assertEqual(
+            ["insert_property", "add_parent"],
+            list(map(lambda e: e["operation"], edits)),
+        )
+        self.assertEqual(
+            {"concept": "concept", "slot": "slot", "facet": "sem", "filler": "filler"},
+            edits[0]["arguments"],
+        )
+        self.assertEqual(
+            {"concept": "concept", "parent": "parent"}, edits[1]["arguments"]
+        )
+
+    def test_unlogged_writes_cannot_be_replayed(self):
+        concept = mock_concept("concept")
+
+        collection = ont.management.handle()
+        version = ont.management.version(collection)
+
+        # Writes made around the API are marked as such by invalidate()
+        mock_concept("other")
+        ont.management.invalidate(collection)
+        self.assertIsNone(ont.management.edits_since(collection, version))
+
+    def test_hierarchy_catches_up_from_the_log(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+
+        index = OntologyAPI().hierarchy()
+
+        # Simulate another process editing, whose index this process never sees
+        ont.hierarchy.discard(ont.management.handle())
+        OntologyAPI().add_concept("animal", "object", "")
+        OntologyAPI().insert_property("animal", "slot", "sem", "filler")
+        ont.hierarchy._store(ont.management.handle(), index)
+
+        caught_up = OntologyAPI().hierarchy()
+        self.assertNotIn("animal", index)
+        self.assertEqual(OntologyAPI().version(), caught_up.version)
+        self.assertEqual({"object", "all"}, caught_up.ancestors("animal"))
+
+
 class APIRootsTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -710,6 +1107,156 @@ class APIRelationsTestCase(unittest.TestCase):
         self.assertTrue("rel3-of" in results)
 
 
+class APIRelationsToInversesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_relations_to_inverses(self):
+        mock_concept("all")
+        mock_concept("relation", parents=["all"])
+        mock_concept(
+            "rel1",
+            parents=["relation"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "rel1-of"}],
+        )
+        mock_concept("rel2", parents=["rel1"])
+        mock_concept(
+            "rel3",
+            parents=["relation"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "rel3-of"}],
+        )
+        mock_concept("rel4", parents=["rel3", "rel1"])
+        mock_concept("rel5", parents=["relation"])
+        mock_concept(
+            "object",
+            parents=["all"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "x"}],
+        )
+
+        self.assertEqual(
+            {
+                "relation": "relation",
+                "rel1": "rel1-of",
+                "rel2": "rel1-of",
+                "rel3": "rel3-of",
+                "rel4": "rel3-of",
+                "rel5": "relation",
+            },
+            OntologyAPI().relations_to_inverses(),
+        )
+
+    def test_relations_to_inverses_follows_edits(self):
+        mock_concept("relation")
+        mock_concept("rel1", parents=["relation"])
+
+        self.assertEqual("relation", OntologyAPI().relations_to_inverses()["rel1"])
+
+        OntologyAPI().insert_property("rel1", "inverse", "sem", "rel1-of")
+        self.assertEqual("rel1-of", OntologyAPI().relations_to_inverses()["rel1"])
+
+        # The returned map is a copy of the cached registry
+        OntologyAPI().relations_to_inverses()["rel1"] = "changed"
+        self.assertEqual("rel1-of", OntologyAPI().relations_to_inverses()["rel1"])
+
+    def test_relations_to_inverses_without_relations(self):
+        mock_concept("all")
+
+        self.assertEqual(
+            {"relation": "relation"}, OntologyAPI().relations_to_inverses()
+        )
+
+
+class APICheckFillersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_check_fillers(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("animal", parents=["object"])
+        mock_concept("human", parents=["animal"])
+        mock_concept("doctor", parents=["human"])
+        mock_concept("dog", parents=["animal"])
+        mock_concept("rock", parents=["object"])
+        mock_concept(
+            "event",
+            parents=["all"],
+            localProperties=[
+                {"slot": "agent", "facet": "sem", "filler": "human"},
+                {"slot": "agent", "facet": "relaxable-to", "filler": "animal"},
+            ],
+        )
+        mock_concept(
+            "heal",
+            parents=["event"],
+            localProperties=[{"slot": "agent", "facet": "default", "filler": "doctor"}],
+        )
+
+        results = OntologyAPI().check_fillers(
+            [
+                ("heal", "agent", "doctor"),
+                ("heal", "AGENT", "human"),
+                ("heal", "agent", "dog"),
+                ("heal", "agent", "rock"),
+                ("event", "agent", "doctor"),
+                ("event", "theme", "rock"),
+                ("missing", "agent", "human"),
+            ]
+        )
+
+        self.assertEqual(7, len(results))
+        self.assertEqual(
+            ["default", "sem", "relaxable-to", None, "sem", None, None],
+            list(map(lambda r: r["verdict"], results)),
+        )
+        self.assertEqual(
+            {
+                "concept": "heal",
+                "slot": "agent",
+                "filler": "doctor",
+                "known": True,
+                "constrained": True,
+                "verdict": "default",
+                "default": True,
+                "sem": True,
+                "relaxable-to": True,
+            },
+            results[0],
+        )
+        self.assertFalse(results[5]["constrained"])
+        self.assertFalse(results[6]["known"])
+
+    def test_check_fillers_literals(self):
+        mock_concept(
+            "event",
+            localProperties=[{"slot": "count", "facet": "sem", "filler": 1}],
+        )
+
+        results = OntologyAPI().check_fillers(
+            [("event", "count", 1), ("event", "count", 2)]
+        )
+        self.assertEqual(["sem", None], list(map(lambda r: r["verdict"], results)))
+
+    def test_check_fillers_empty(self):
+        self.assertEqual([], OntologyAPI().check_fillers([]))
+
+
 class APIDomainsAndRangesTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -1246,6 +1793,271 @@ class APIRemoveConceptTestCase(unittest.TestCase):
         )
 
 
+class APIApplyEditsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_apply_edits(self):
+        parent = mock_concept("parent")
+        concept = mock_concept(
+            "concept",
+            localProperties=[{"slot": "slot1", "facet": "sem", "filler": "value1"}],
+        )
+
+        version = OntologyAPI().version()
+
+        results = OntologyAPI().apply_edits(
+            [
+                {
+                    "operation": "update_definition",
+                    "concept": "concept",
+                    "definition": "xyz",
+                },
+                {"operation": "add_parent", "concept": "Concept", "parent": "parent"},
+                {
+                    "operation": "remove_property",
+                    "concept": "concept",
+                    "slot": "slot1",
+                    "facet": "sem",
+                    "filler": "value1",
+                },
+                {
+                    "operation": "insert_property",
+                    "concept": "concept",
+                    "slot": "slot2",
+                    "facet": "sem",
+                    "filler": "value2",
+                },
+                {
+                    "operation": "add_concept",
+                    "concept": "child",
+                    "parent": "concept",
+                    "definition": "",
+                },
+                {
+                    "operation": "block_property",
+                    "concept": "child",
+                    "slot": "slot2",
+                    "facet": "sem",
+                    "filler": "value2",
+                },
+            ]
+        )
+
+        self.assertTrue(all(map(lambda r: r["applied"], results)))
+        self.assertEqual(version + 2, OntologyAPI().version())
+
+        result = OntologyAPI().get("concept", metadata=True)[0]["concept"]
+        self.assertEqual("xyz", result["_metadata"]["definition"])
+        self.assertEqual(["parent"], result["is-a"]["value"])
+        self.assertNotIn("slot1", result)
+        self.assertEqual("value2", result["slot2"]["sem"][0]["filler"])
+
+        self.assertEqual(["concept", "parent"], OntologyAPI().ancestors("child"))
+        self.assertNotIn("slot2", OntologyAPI().get("child")[0]["child"])
+
+    def test_apply_edits_reports_invalid_edits(self):
+        concept = mock_concept("concept")
+
+        results = OntologyAPI().apply_edits(
+            [
+                {"operation": "add_parent", "concept": "concept", "parent": "concept"},
+                {"operation": "add_parent", "concept": "concept", "parent": "unknown"},
+                {
+                    "operation": "insert_property",
+                    "concept": "unknown",
+                    "slot": "slot",
+                    "facet": "sem",
+                    "filler": "value",
+                },
+                {"operation": "insert_property", "concept": "concept", "slot": "slot"},
+                {"operation": "rename", "concept": "concept"},
+                {
+                    "operation": "add_concept",
+                    "concept": "concept",
+                    "parent": None,
+                    "definition": "",
+                },
+                {
+                    "operation": "insert_property",
+                    "concept": "concept",
+                    "slot": "slot",
+                    "facet": "sem",
+                    "filler": "value",
+                },
+            ]
+        )
+
+        self.assertEqual(
+            [False, False, False, False, False, False, True],
+            list(map(lambda r: r["applied"], results)),
+        )
+        self.assertEqual(
+            "Cannot assign concept as a parent of itself.", results[0]["error"]
+        )
+        self.assertEqual("Unknown concept unknown.", results[1]["error"])
+        self.assertEqual("Unknown concept unknown.", results[2]["error"])
+        self.assertEqual("Missing facet for insert_property.", results[3]["error"])
+        self.assertEqual("Unknown edit operation rename.", results[4]["error"])
+        self.assertEqual("Concept concept already exists.", results[5]["error"])
+        self.assertIsNone(results[6]["error"])
+
+        self.assertEqual(
+            ["value"], OntologyAPI().get("concept")[0]["concept"]["slot"]["sem"]
+        )
+
+    def test_apply_edits_reports_malformed_edits(self):
+        concept = mock_concept("concept")
+
+        results = OntologyAPI().apply_edits(
+            [
+                "oops",
+                {"operation": "update_definition", "concept": 1, "definition": ""},
+                {
+                    "operation": "remove_concept",
+                    "concept": "concept",
+                    "include_usages": 1,
+                },
+                {
+                    "operation": "update_definition",
+                    "concept": "concept",
+                    "definition": "x",
+                },
+            ]
+        )
+
+        self.assertEqual(
+            [False, False, False, True], list(map(lambda r: r["applied"], results))
+        )
+        self.assertIsNone(results[0]["operation"])
+        self.assertEqual("Edit 0 is not an object.", results[0]["error"])
+        self.assertEqual(
+            "The concept of update_definition must be a string.", results[1]["error"]
+        )
+        self.assertEqual(
+            "The include_usages of remove_concept must be a boolean.",
+            results[2]["error"],
+        )
+
+    def test_apply_edits_remove_concept(self):
+        concept = mock_concept("concept")
+        child = mock_concept("child", parents=["concept"])
+        other = mock_concept(
+            "other",
+            localProperties=[
+                {"slot": "slot1", "facet": "sem", "filler": "concept"},
+                {"slot": "slot2", "facet": "default", "filler": "concept"},
+                {"slot": "slot3", "facet": "sem", "filler": "other"},
+            ],
+        )
+
+        results = OntologyAPI().apply_edits(
+            [
+                {
+                    "operation": "remove_concept",
+                    "concept": "concept",
+                    "include_usages": True,
+                },
+                {"operation": "add_parent", "concept": "child", "parent": "concept"},
+            ]
+        )
+
+        self.assertEqual([True, False], list(map(lambda r: r["applied"], results)))
+        self.assertEqual([], OntologyAPI().get("concept"))
+        self.assertEqual([], OntologyAPI().ancestors("child"))
+        self.assertEqual(
+            ["slot3"],
+            list(
+                filter(
+                    lambda s: s not in ["is-a", "subclasses"],
+                    OntologyAPI().get("other")[0]["other"].keys(),
+                )
+            ),
+        )
+
+    def test_apply_edits_maintains_the_hierarchy(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+
+        index = OntologyAPI().hierarchy()
+        OntologyAPI().apply_edits(
+            [
+                {
+                    "operation": "add_concept",
+                    "concept": "animal",
+                    "parent": "all",
+                    "definition": "",
+                },
+                {"operation": "add_parent", "concept": "animal", "parent": "object"},
+                {"operation": "remove_parent", "concept": "animal", "parent": "all"},
+            ]
+        )
+
+        # Maintained from the edit, not reread from the collection
+        from_collection = ont.hierarchy.Hierarchy.from_collection
+        ont.hierarchy.Hierarchy.from_collection = None
+        try:
+            maintained = OntologyAPI().hierarchy()
+        finally:
+            ont.hierarchy.Hierarchy.from_collection = from_collection
+
+        self.assertNotIn("animal", index)
+        self.assertEqual({"object", "all"}, maintained.ancestors("animal"))
+
+    def test_partly_applied_edit_is_not_replayable(self):
+        class FailingCollection(object):
+            # Makes the first write of each bulk write, then fails the next
+            def __init__(self, collection):
+                self.collection = collection
+
+            def __getattr__(self, name):
+                return getattr(self.collection, name)
+
+            def bulk_write(self, requests, **kwargs):
+                self.collection.bulk_write(requests[:1])
+                raise pymongo.errors.BulkWriteError(
+                    {"writeErrors": [{"index": 1, "errmsg": "Failed."}]}
+                )
+
+        mock_concept("all")
+        mock_concept("concept", parents=["all"])
+        mock_concept("child", parents=["concept"])
+
+        collection = ont.management.handle()
+        ont.hierarchy.backfill(collection)
+        version = OntologyAPI().version()
+        index = OntologyAPI().hierarchy()
+
+        results = OntologyAPI(collection=FailingCollection(collection)).apply_edits(
+            [
+                {
+                    "operation": "remove_concept",
+                    "concept": "concept",
+                    "include_usages": True,
+                }
+            ]
+        )
+
+        self.assertFalse(results[0]["applied"])
+        self.assertEqual("Partly applied; Failed.", results[0]["error"])
+        self.assertEqual([], collection.find_one({"name": "child"})["parents"])
+
+        # The change is caught up by rereading, not replaying, and the materialized fields
+        # are no longer trusted
+        self.assertIsNone(ont.management.edits_since(collection, version))
+        self.assertFalse(ont.management.materialized(collection))
+        self.assertEqual([], OntologyAPI().hierarchy().parents["child"])
+        self.assertEqual(["concept"], index.parents["child"])
+
+
 class APISearchTestCase(unittest.TestCase):
 
     def setUp(self):
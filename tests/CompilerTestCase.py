@@ -0,0 +1,364 @@
+from ont.api import OntologyAPI
+from typing import List
+
+import ont.compiler
+import ont.management
+import os
+import time
+import unittest
+
+
+class CountingCollection(object):
+    # Counts the calls made through it to each method of the wrapped collection
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+class CompilerTestCase(unittest.TestCase):
+
+    OPTIONS = {
+        "compile_inherited_values": True,
+        "compile_domains_and_ranges": True,
+        "compile_inverses": True,
+    }
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.db = client["unittest"]
+        self.api = OntologyAPI(collection=self.db["unittest"])
+
+        self.api.add_concept("all", None, "")
+        self.api.add_concept("property", "all", "")
+        self.api.add_concept("relation", "property", "")
+        self.api.add_concept("agent", "relation", "")
+        self.api.add_concept("theme", "relation", "")
+        self.api.add_concept("object", "all", "")
+        self.api.add_concept("human", "object", "")
+        self.api.add_concept("event", "all", "")
+        self.api.add_concept("walk", "event", "")
+        self.api.add_concept("run", "event", "")
+
+        self.api.insert_property("agent", "inverse", "value", "agent-of")
+        self.api.insert_property("theme", "inverse", "value", "theme-of")
+        self.api.insert_property("event", "agent", "sem", "object")
+        self.api.insert_property("walk", "agent", "sem", "human")
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def frames(self, name: str) -> dict:
+        # Compiled frames, with list order (which follows set and index order) normalized
+        frames = {}
+        for frame in self.db["compiled_" + name].find({"_id": {"$ne": "PROGRESS"}}):
+            for slot, facets in frame.items():
+                if isinstance(facets, dict):
+                    for facet, fillers in facets.items():
+                        facets[facet] = sorted(fillers, key=str)
+            frames[frame["_id"]] = frame
+        return frames
+
+    def progress(self) -> dict:
+        return self.db["compiled_unittest"].find_one({"_id": "PROGRESS"})
+
+    def interrupt(self, compiler, after: int, interruption):
+        # Calls interruption once the compiler has compiled the given number of frames
+        frames = compiler.frames
+
+        def interrupted(snapshot, concepts, processes):
+            for i, compiled in enumerate(frames(snapshot, concepts, processes)):
+                if i == after:
+                    interruption()
+                yield compiled
+
+        compiler.frames = interrupted
+
+    def recompiled(self, compiler) -> list:
+        # The concepts the compiler goes on to compile
+        concepts = []
+        frames = compiler.frames
+
+        def recorded(snapshot, c, processes):
+            concepts.extend(c)
+            return frames(snapshot, c, processes)
+
+        compiler.frames = recorded
+        return concepts
+
+    def assertMatchesFullCompile(self, options: dict = None):
+        ont.management.copy_collection("unittest", "fresh")
+        ont.compiler.compile(
+            "fresh", incremental=False, **(self.OPTIONS if options is None else options)
+        )
+
+        self.assertEqual(self.frames("fresh"), self.frames("unittest"))
+
+    def test_incremental_compile_recompiles_affected_concepts(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+        self.assertEqual(10, self.progress()["status"]["total"])
+
+        self.api.insert_property("run", "theme", "sem", "human")
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        # The concept itself, and the property whose domain and range it feeds
+        self.assertEqual(2, self.progress()["status"]["total"])
+        self.assertIsNotNone(self.progress()["finished"])
+        self.assertMatchesFullCompile()
+
+    def test_incremental_compile_follows_hierarchy_edits(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        self.api.add_concept("stroll", "walk", "")
+        self.api.add_parent("run", "object")
+        self.api.remove_parent("run", "event")
+        self.api.insert_property("event", "theme", "sem", "object")
+        self.api.remove_concept("human")
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        self.assertNotIn("HUMAN", self.frames("unittest"))
+        self.assertMatchesFullCompile()
+
+    def test_incremental_compile_follows_concepts_out_of_properties(self):
+        options = dict(self.OPTIONS, compile_inherited_values=False)
+        self.api.add_concept("case-role", "relation", "")
+        self.api.add_concept("beneficiary", "case-role", "")
+        ont.compiler.compile("unittest", **options)
+        self.assertIn("DOMAIN", self.frames("unittest")["BENEFICIARY"])
+
+        self.api.remove_parent("case-role", "relation")
+        self.api.add_parent("case-role", "object")
+        ont.compiler.compile("unittest", **options)
+
+        self.assertNotIn("DOMAIN", self.frames("unittest")["BENEFICIARY"])
+        self.assertMatchesFullCompile(options)
+
+    def test_no_edits_recompiles_nothing(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+        frames = self.frames("unittest")
+
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        self.assertEqual(0, self.progress()["status"]["total"])
+        self.assertEqual(frames, self.frames("unittest"))
+
+    def test_full_compile_if_options_change_or_log_is_incomplete(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        ont.compiler.compile("unittest")
+        self.assertEqual(10, self.progress()["status"]["total"])
+
+        ont.management.invalidate(self.db["unittest"])
+        ont.compiler.compile("unittest")
+        self.assertEqual(10, self.progress()["status"]["total"])
+
+    def test_parallel_compile_matches_serial_compile(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        ont.management.copy_collection("unittest", "parallel")
+        chunk_size = ont.compiler.CHUNK_SIZE
+        ont.compiler.CHUNK_SIZE = 3
+        try:
+            ont.compiler.compile("parallel", processes=2, **self.OPTIONS)
+        finally:
+            ont.compiler.CHUNK_SIZE = chunk_size
+
+        progress = self.db["compiled_parallel"].find_one({"_id": "PROGRESS"})
+        self.assertEqual(10, progress["status"]["count"])
+        self.assertEqual(self.frames("unittest"), self.frames("parallel"))
+
+    def test_frames_are_written_in_batches(self):
+        compiler = ont.compiler.Compiler("unittest", **self.OPTIONS)
+        compiler.compiled = CountingCollection(compiler.compiled)
+        compiler.run(batch_size=4)
+
+        # 10 frames in 3 batches, then the inverses in one; progress is reported at most
+        # once a batch (alongside the inverses and the finish)
+        self.assertEqual(4, compiler.compiled.calls["insert_many"])
+        self.assertNotIn("insert_one", compiler.compiled.calls)
+        self.assertLessEqual(compiler.compiled.calls["update_one"], 6)
+
+        progress = self.progress()
+        self.assertEqual(10, progress["status"]["count"])
+        self.assertEqual("walk", progress["status"]["last"])
+        self.assertEqual(
+            10,
+            ont.management.compile_progress()["unittest"]["progress"]["status"][
+                "count"
+            ],
+        )
+
+    def reported_counts(self, interval: float, frames: int) -> List[int]:
+        # The counts a compile in batches of 2 reports, with the given progress triggers
+        compiler = ont.compiler.Compiler("unittest", **self.OPTIONS)
+        counts = []
+        report = compiler.report
+        compiler.report = lambda count, last: (
+            counts.append(count),
+            report(count, last),
+        )
+
+        progress = ont.compiler.PROGRESS_INTERVAL, ont.compiler.PROGRESS_FRAMES
+        ont.compiler.PROGRESS_INTERVAL, ont.compiler.PROGRESS_FRAMES = interval, frames
+        try:
+            compiler.run(batch_size=2)
+        finally:
+            ont.compiler.PROGRESS_INTERVAL, ont.compiler.PROGRESS_FRAMES = progress
+
+        return counts
+
+    def test_progress_is_reported_by_time(self):
+        self.assertEqual([2, 4, 6, 8, 10, 10], self.reported_counts(0.0, 1000))
+
+    def test_progress_is_reported_by_frames(self):
+        self.assertEqual([4, 8, 10], self.reported_counts(1000.0, 3))
+
+    def test_frames_match_api(self):
+        self.api.insert_property("object", "theme", "sem", "human")
+        self.api.insert_property("walk", "theme", "sem", "human")
+        self.api.add_parent("walk", "object")
+        self.api.block_property("run", "agent", "sem", "object")
+        self.db["unittest"].update_one(
+            {"name": "walk"},
+            {
+                "$push": {
+                    "overriddenFillers": {
+                        "slot": "agent",
+                        "facet": "sem",
+                        "filler": "object",
+                    }
+                }
+            },
+        )
+
+        snapshot = ont.compiler.Snapshot.load(self.db["unittest"])
+        for inherited in [True, False]:
+            frames = ont.compiler.Frames(
+                snapshot,
+                {
+                    "compile_inherited_values": inherited,
+                    "compile_domains_and_ranges": False,
+                    "compile_inverses": False,
+                },
+            )
+            frames.resolve(snapshot.records.keys())
+
+            for c in snapshot.records.keys():
+                expected = self.api.get(c, local=not inherited)[0]
+                self.assertEqual(
+                    ont.compiler.format_frame_for_insert(c, expected),
+                    frames.compile_concept(c),
+                )
+
+    def test_interrupted_compile_resumes_from_checkpoint(self):
+        def crash():
+            raise RuntimeError
+
+        compiler = ont.compiler.Compiler("unittest", **self.OPTIONS)
+        self.interrupt(compiler, 5, crash)
+        with self.assertRaises(RuntimeError):
+            compiler.run(batch_size=2)
+
+        self.assertIsNone(self.progress()["finished"])
+        self.assertFalse(ont.compiler.running(self.progress()))
+
+        # The frames written are kept, bar those edited since
+        self.api.insert_property("run", "theme", "sem", "human")
+        compiler = ont.compiler.Compiler("unittest", **self.OPTIONS)
+        concepts = self.recompiled(compiler)
+        compiler.run(batch_size=2)
+
+        self.assertEqual(
+            ["object", "property", "relation", "run", "theme", "walk"], concepts
+        )
+        self.assertEqual(10, self.progress()["status"]["count"])
+        self.assertEqual(10, self.progress()["status"]["total"])
+        self.assertMatchesFullCompile()
+
+    def test_stale_lock_is_taken_over(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        self.db["compiled_unittest"].update_one(
+            {"_id": "PROGRESS"},
+            {
+                "$set": {
+                    "finished": None,
+                    "owner": "elsewhere",
+                    "heartbeat": time.time(),
+                }
+            },
+        )
+        with self.assertRaises(PermissionError):
+            ont.compiler.compile("unittest", **self.OPTIONS)
+
+        self.db["compiled_unittest"].update_one(
+            {"_id": "PROGRESS"},
+            {"$inc": {"heartbeat": -ont.compiler.HEARTBEAT_TIMEOUT - 1}},
+        )
+        self.assertFalse(ont.compiler.cancel("unittest"))
+        self.assertNotIn("cancelled", self.progress())
+        ont.compiler.compile("unittest", **self.OPTIONS)
+
+        self.assertIsNotNone(self.progress()["finished"])
+        self.assertEqual(10, self.progress()["status"]["total"])
+
+    def test_progress_percent_before_total_is_known(self):
+        ont.compiler.compile("unittest", **self.OPTIONS)
+        self.db["compiled_unittest"].update_one(
+            {"_id": "PROGRESS"},
+            {"$set": {"status": {"count": 0, "total": 0, "last": None}}},
+        )
+
+        # Finished with nothing to compile
+        status = ont.management.compile_progress()["unittest"]["progress"]["status"]
+        self.assertEqual(100, status["percent"])
+
+        # Claimed, but not yet counted
+        self.db["compiled_unittest"].update_one(
+            {"_id": "PROGRESS"},
+            {
+                "$set": {
+                    "finished": None,
+                    "owner": "elsewhere",
+                    "heartbeat": time.time(),
+                }
+            },
+        )
+        status = ont.management.compile_progress()["unittest"]["progress"]["status"]
+        self.assertEqual(0, status["percent"])
+
+    def test_cancelled_compile_stops_at_checkpoint(self):
+        compiler = ont.compiler.Compiler("unittest", **self.OPTIONS)
+        self.interrupt(compiler, 2, lambda: ont.compiler.cancel("unittest"))
+        compiler.run(batch_size=2)
+
+        # Stopped once the batch it was cancelled in was written
+        self.assertEqual("cancelled", compiler.stopped)
+        self.assertEqual(4, self.progress()["status"]["count"])
+        self.assertIsNone(self.progress()["finished"])
+        self.assertFalse(
+            ont.management.compile_progress()["unittest"]["progress"]["running"]
+        )
+        self.assertFalse(ont.compiler.cancel("unittest"))
+
+        compiler = ont.compiler.Compiler("unittest", **self.OPTIONS)
+        concepts = self.recompiled(compiler)
+        compiler.run()
+
+        self.assertEqual(6, len(concepts))
+        self.assertIsNotNone(self.progress()["finished"])
+        self.assertMatchesFullCompile()
@@ -0,0 +1,130 @@
+from ont.diff import content_hash, diff, summarize
+
+import ont.management
+import os
+import unittest
+
+
+class DiffTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.original = client["unittest"]["original"]
+        self.updated = client["unittest"]["updated"]
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def concept(self, name, parents=None, properties=None, definition=""):
+        return {
+            "name": name,
+            "parents": [] if parents is None else parents,
+            "definition": definition,
+            "localProperties": [] if properties is None else properties,
+            "overriddenFillers": [],
+            "totallyRemovedProperties": [],
+        }
+
+    def test_content_hash_follows_list_order(self):
+        p1 = {"slot": "agent", "facet": "sem", "filler": "human"}
+        p2 = {"facet": "sem", "slot": "theme", "filler": "object"}
+
+        self.assertNotEqual(
+            content_hash(self.concept("a", ["b", "c"], [p1, p2])),
+            content_hash(self.concept("a", ["c", "b"], [p2, p1])),
+        )
+        self.assertEqual(
+            content_hash(self.concept("a", ["b", "c"], [p1, p2]), ordered=False),
+            content_hash(self.concept("a", ["c", "b"], [p2, p1]), ordered=False),
+        )
+        self.assertNotEqual(
+            content_hash(self.concept("a", ["b"], [p1])),
+            content_hash(self.concept("a", ["b"], [p2])),
+        )
+
+    def test_identical(self):
+        for name in ["all", "object", "event"]:
+            self.original.insert_one(self.concept(name))
+            self.updated.insert_one(self.concept(name))
+
+        self.assertEqual([], list(diff(self.original, self.updated)))
+
+    def test_diff(self):
+        agent = {"slot": "agent", "facet": "sem", "filler": "human"}
+        theme = {"slot": "theme", "facet": "sem", "filler": "object"}
+
+        self.original.insert_many(
+            [
+                self.concept("all"),
+                self.concept("event", ["all"], [agent], definition="old"),
+                self.concept("removed", ["all"]),
+                self.concept("object", ["all"]),
+            ]
+        )
+        self.updated.insert_many(
+            [
+                self.concept("object", ["all"]),
+                self.concept("added", ["all"]),
+                self.concept("event", ["object"], [theme], definition="new"),
+                self.concept("all"),
+            ]
+        )
+
+        deltas = list(diff(self.original, self.updated))
+        self.assertEqual(
+            [
+                {"concept": "added", "change": "added"},
+                {
+                    "concept": "event",
+                    "change": "changed",
+                    "fields": {
+                        "parents": {"added": ["object"], "removed": ["all"]},
+                        "localProperties": {"added": [theme], "removed": [agent]},
+                        "definition": {"old": "old", "new": "new"},
+                    },
+                },
+                {"concept": "removed", "change": "removed"},
+            ],
+            deltas,
+        )
+
+        self.assertEqual(
+            {"added": ["added"], "removed": ["removed"], "changed": ["event"]},
+            summarize(iter(deltas)),
+        )
+
+    def test_diff_under(self):
+        agent = {"slot": "agent", "facet": "sem", "filler": "human"}
+
+        self.original.insert_many(
+            [
+                self.concept("all"),
+                self.concept("event", ["all"]),
+                self.concept("walk", ["event"]),
+                self.concept("object", ["all"]),
+            ]
+        )
+        self.updated.insert_many(
+            [
+                self.concept("all"),
+                self.concept("event", ["all"]),
+                self.concept("walk", ["event"], [agent]),
+                self.concept("object", ["all"], definition="changed"),
+            ]
+        )
+
+        self.assertEqual(
+            ["walk"],
+            list(
+                map(lambda d: d["concept"], diff(self.original, self.updated, "event"))
+            ),
+        )
+        self.assertEqual(
+            ["object", "walk"],
+            list(map(lambda d: d["concept"], diff(self.original, self.updated, "all"))),
+        )
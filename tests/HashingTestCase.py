@@ -0,0 +1,153 @@
+from ont.api import OntologyAPI
+
+import ont.diff
+import ont.hashing
+import ont.management
+import os
+import unittest
+
+
+class HashingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.db = client["unittest"]
+        self.collection = self.db["unittest"]
+        self.api = OntologyAPI(collection=self.collection)
+
+        self.api.add_concept("all", None, "root")
+        self.api.add_concept("object", "all", "")
+        self.api.add_concept("event", "all", "")
+        self.api.add_concept("walk", "event", "")
+        self.api.add_concept("run", "event", "")
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def stored(self, collection) -> dict:
+        return dict(
+            map(
+                lambda r: (r["_id"], r),
+                ont.hashing.hash_collection(collection).find(),
+            )
+        )
+
+    def rebuilt(self, collection) -> tuple:
+        version = ont.management.version(collection)
+        hashes = ont.hashing.rebuild(collection, version)
+        return hashes["collection"], self.stored(collection)
+
+    def test_edits_update_hashes_incrementally(self):
+        ont.hashing.refresh(self.collection)
+
+        self.api.insert_property("walk", "agent", "sem", "object")
+        self.api.add_concept("stroll", "walk", "")
+        self.api.add_parent("run", "object")
+        self.api.remove_parent("run", "event")
+        self.api.remove_concept("stroll")
+        self.api.apply_edits(
+            [
+                {
+                    "operation": "update_definition",
+                    "concept": "event",
+                    "definition": "x",
+                },
+                {"operation": "add_concept", "concept": "jog", "parent": "run"},
+            ]
+        )
+
+        hashes = ont.hashing.refresh(self.collection)
+        stored = self.stored(self.collection)
+
+        self.assertEqual(ont.management.version(self.collection), hashes["version"])
+        self.assertEqual((hashes["collection"], stored), self.rebuilt(self.collection))
+
+    def test_reordering_changes_hashes(self):
+        self.api.add_parent("run", "object")
+        ont.management.copy_collection("unittest", "reordered")
+        reordered = self.db["reordered"]
+        OntologyAPI(collection=reordered).remove_parent("run", "event")
+        OntologyAPI(collection=reordered).add_parent("run", "event")
+
+        # The first parent is now another, so the collections differ, though a diff (which
+        # ignores list order) finds nothing to report
+        self.assertEqual(
+            ["object", "event"], reordered.find_one({"name": "run"})["parents"]
+        )
+        self.assertFalse(ont.hashing.identical(self.collection, reordered))
+        self.assertEqual([], list(ont.diff.diff(self.collection, reordered)))
+
+    def test_hashes_of_an_earlier_scheme_are_rebuilt(self):
+        hashes = ont.hashing.refresh(self.collection)
+        ont.hashing._record(
+            self.collection, dict(hashes, scheme=1, collection=ont.hashing.EMPTY)
+        )
+
+        self.assertEqual(hashes, ont.hashing.refresh(self.collection))
+
+    def test_subtree_hash(self):
+        walk = ont.hashing.subtree_hash(self.collection, "walk")
+        event = ont.hashing.subtree_hash(self.collection, "event")
+        object = ont.hashing.subtree_hash(self.collection, "object")
+
+        self.api.insert_property("walk", "agent", "sem", "object")
+
+        self.assertNotEqual(walk, ont.hashing.subtree_hash(self.collection, "walk"))
+        self.assertNotEqual(event, ont.hashing.subtree_hash(self.collection, "event"))
+        self.assertEqual(object, ont.hashing.subtree_hash(self.collection, "object"))
+        self.assertIsNone(ont.hashing.subtree_hash(self.collection, "missing"))
+
+    def test_copies_are_identical(self):
+        ont.hashing.refresh(self.collection)
+        ont.management.copy_collection("unittest", "copied")
+        copied = self.db["copied"]
+
+        # The copy adopts the original's hashes rather than computing its own
+        self.assertIsNotNone(ont.hashing.current(copied))
+        self.assertTrue(ont.hashing.identical(self.collection, copied))
+
+        OntologyAPI(collection=copied).insert_property("walk", "agent", "sem", "object")
+        self.assertFalse(ont.hashing.identical(self.collection, copied))
+
+    def test_rename_moves_hashes(self):
+        hashes = ont.hashing.refresh(self.collection)
+        ont.management.rename_collection("unittest", "renamed")
+        renamed = self.db["renamed"]
+
+        self.assertEqual(
+            hashes["collection"], ont.hashing.current(renamed)["collection"]
+        )
+        self.assertEqual(
+            (hashes["collection"], self.stored(renamed)), self.rebuilt(renamed)
+        )
+
+    def test_changed_under(self):
+        ont.management.copy_collection("unittest", "copied")
+        copied = OntologyAPI(collection=self.db["copied"])
+
+        copied.insert_property("walk", "agent", "sem", "object")
+        copied.add_concept("stroll", "walk", "")
+        copied.update_definition("object", "changed")
+
+        self.assertEqual(
+            ["stroll", "walk"],
+            ont.hashing.changed_under(self.collection, self.db["copied"], "event"),
+        )
+        self.assertEqual(
+            ["object", "stroll", "walk"],
+            ont.hashing.changed_under(self.collection, self.db["copied"], "all"),
+        )
+        self.assertEqual(
+            [], ont.hashing.changed_under(self.collection, self.db["copied"], "run")
+        )
+
+    def test_delete_collection_drops_hashes(self):
+        ont.hashing.refresh(self.collection)
+        ont.management.delete_collection("unittest")
+
+        self.assertNotIn("_hashes_unittest", self.db.list_collection_names())
@@ -0,0 +1,344 @@
+from ont.api import OntologyAPI
+from ont.hierarchy import Closure, Hierarchy
+from tests.TestUtils import mock_concept
+
+import ont.hierarchy
+import ont.management
+import os
+import unittest
+
+
+class HierarchyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.hierarchy = Hierarchy(
+            {
+                "all": [],
+                "object": ["all"],
+                "event": ["all"],
+                "animal": ["object"],
+                "dog": ["animal"],
+                "robot-dog": ["dog", "artifact"],
+                "artifact": ["object"],
+            }
+        )
+
+    def test_children(self):
+        self.assertEqual(["object", "event"], self.hierarchy.children["all"])
+        self.assertEqual(["robot-dog"], self.hierarchy.children["artifact"])
+        self.assertEqual([], self.hierarchy.children["robot-dog"])
+
+    def test_ancestors(self):
+        self.assertEqual(set(), self.hierarchy.ancestors("all"))
+        self.assertEqual(
+            {"dog", "animal", "artifact", "object", "all"},
+            self.hierarchy.ancestors("robot-dog"),
+        )
+
+    def test_ancestors_ignores_dangling_parents(self):
+        hierarchy = Hierarchy({"all": [], "concept": ["all", "missing"]})
+        self.assertEqual({"all"}, hierarchy.ancestors("concept"))
+
+    def test_ancestors_terminates_on_cycles(self):
+        hierarchy = Hierarchy({"a": ["b"], "b": ["a"]})
+        self.assertEqual({"a", "b"}, hierarchy.ancestors("a"))
+
+    def test_descendants(self):
+        self.assertEqual(
+            {"animal", "dog", "robot-dog", "artifact"},
+            self.hierarchy.descendants("object"),
+        )
+
+    def test_add_parent_updates_descendant_closures(self):
+        self.assertNotIn("event", self.hierarchy.ancestors("robot-dog"))
+
+        self.hierarchy.add_parent("animal", "event")
+        self.assertIn("event", self.hierarchy.ancestors("animal"))
+        self.assertIn("event", self.hierarchy.ancestors("robot-dog"))
+        self.assertIn("animal", self.hierarchy.children["event"])
+
+    def test_remove_parent_updates_descendant_closures(self):
+        self.assertIn("animal", self.hierarchy.ancestors("robot-dog"))
+
+        self.hierarchy.remove_parent("robot-dog", "dog")
+        self.assertEqual(
+            {"artifact", "object", "all"}, self.hierarchy.ancestors("robot-dog")
+        )
+        self.assertNotIn("robot-dog", self.hierarchy.children["dog"])
+
+        # Unrelated closures are left untouched
+        self.assertEqual({"animal", "object", "all"}, self.hierarchy.ancestors("dog"))
+
+    def test_add_and_remove_concept(self):
+        self.hierarchy.add_concept("cat", ["animal"])
+        self.assertIn("cat", self.hierarchy.children["animal"])
+        self.assertEqual({"animal", "object", "all"}, self.hierarchy.ancestors("cat"))
+
+        self.hierarchy.remove_concept("cat")
+        self.assertNotIn("cat", self.hierarchy)
+        self.assertNotIn("cat", self.hierarchy.children["animal"])
+
+    def test_depth(self):
+        self.assertEqual(0, self.hierarchy.depth("all"))
+        self.assertEqual(2, self.hierarchy.depth("artifact"))
+        self.assertEqual(4, self.hierarchy.depth("robot-dog"))
+
+        self.hierarchy.add_parent("artifact", "robot-dog")
+        self.assertEqual(5, self.hierarchy.depth("artifact"))
+
+    def test_closure(self):
+        closure = Closure(self.hierarchy)
+
+        for concept in self.hierarchy.parents:
+            for ancestor in self.hierarchy.parents:
+                self.assertEqual(
+                    ancestor in self.hierarchy.ancestors(concept),
+                    closure.has_ancestor(concept, ancestor),
+                )
+        self.assertFalse(closure.has_ancestor("missing", "all"))
+
+        # Parents are numbered before their children
+        self.assertLess(closure.ids["artifact"], closure.ids["robot-dog"])
+
+        self.assertEqual(
+            {"animal", "artifact", "event", 3},
+            closure.minimal({"dog", "animal", "robot-dog", "artifact", "event", 3}),
+        )
+        self.assertEqual({"all"}, closure.minimal({"all", "robot-dog"}))
+        self.assertEqual(set(), closure.minimal(set()))
+
+    def test_closure_on_cycles(self):
+        closure = Closure(Hierarchy({"all": [], "a": ["all", "b"], "b": ["a"]}))
+
+        self.assertTrue(closure.has_ancestor("a", "b"))
+        self.assertTrue(closure.has_ancestor("a", "all"))
+        self.assertEqual({"all"}, closure.minimal({"all", "a", "b"}))
+
+    def test_materialize(self):
+        changes = ont.hierarchy.parent_changes(
+            self.hierarchy,
+            [
+                ("add_concept", {"concept": "machine", "parent": "object"}),
+                ("add_parent", {"concept": "artifact", "parent": "machine"}),
+                ("remove_concept", {"concept": "dog", "include_usages": True}),
+            ],
+        )
+        self.assertEqual(
+            {"machine": ["object"], "artifact": ["object", "machine"]},
+            {k: v for k, v in changes.items() if k in ["machine", "artifact"]},
+        )
+        self.assertIsNone(changes["dog"])
+        self.assertEqual(["artifact"], changes["robot-dog"])
+
+        fields = ont.hierarchy.materialize(self.hierarchy, changes)
+        self.assertEqual({"machine", "artifact", "robot-dog"}, set(fields.keys()))
+        self.assertEqual(
+            {"ancestors": ["all", "object"], "depth": 2}, fields["machine"]
+        )
+        self.assertEqual(
+            {"ancestors": ["all", "artifact", "machine", "object"], "depth": 4},
+            fields["robot-dog"],
+        )
+
+
+class HierarchyMaintenanceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_edits_maintain_the_loaded_index(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("event", parents=["all"])
+
+        index = OntologyAPI().hierarchy()
+
+        OntologyAPI().add_concept("animal", "object", "")
+        OntologyAPI().add_parent("animal", "event")
+        OntologyAPI().insert_property("animal", "slot", "sem", "filler")
+        OntologyAPI().remove_parent("animal", "object")
+
+        # Each edit shared an edited copy; the index read before them is unchanged
+        maintained = OntologyAPI().hierarchy()
+        self.assertIsNot(index, maintained)
+        self.assertNotIn("animal", index)
+        self.assertEqual(OntologyAPI().version(), maintained.version)
+        self.assertEqual({"event", "all"}, maintained.ancestors("animal"))
+
+        reloaded = Hierarchy.from_collection(ont.management.handle())
+        self.assertEqual(reloaded.parents, maintained.parents)
+        self.assertEqual(reloaded.children, maintained.children)
+
+    def test_remove_concept_maintains_the_loaded_index(self):
+        mock_concept("all")
+        mock_concept("concept", parents=["all"])
+        mock_concept("child", parents=["concept"])
+
+        index = OntologyAPI().hierarchy()
+        index.ancestors("child")
+        OntologyAPI().remove_concept("concept", include_usages=True)
+
+        maintained = OntologyAPI().hierarchy()
+        self.assertNotIn("concept", maintained)
+        self.assertEqual([], maintained.parents["child"])
+        self.assertEqual(set(), maintained.ancestors("child"))
+
+        self.assertIn("concept", index)
+        self.assertEqual(["concept"], index.parents["child"])
+        self.assertEqual(["child"], index.children["concept"])
+        self.assertEqual({"concept", "all"}, index.ancestors("child"))
+
+    def test_pinned_versions_are_served_without_a_rescan(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+
+        collection = ont.management.handle()
+        version = ont.management.version(collection)
+        index = ont.hierarchy.load(collection, version)
+
+        OntologyAPI().add_concept("animal", "object", "")
+        OntologyAPI().add_parent("animal", "all")
+
+        from_collection = Hierarchy.from_collection
+        Hierarchy.from_collection = None
+        try:
+            self.assertIs(index, ont.hierarchy.load(collection, version))
+            current = ont.hierarchy.load(collection, OntologyAPI().version())
+        finally:
+            Hierarchy.from_collection = from_collection
+
+        self.assertEqual({"object", "all"}, current.ancestors("animal"))
+
+
+class MaterializedHierarchyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def assertMaterialized(self):
+        collection = ont.management.handle()
+        hierarchy = Hierarchy.from_collection(collection)
+        for record in collection.find({}):
+            self.assertEqual(
+                sorted(hierarchy.ancestors(record["name"])), record["ancestors"]
+            )
+            self.assertEqual(hierarchy.depth(record["name"]), record["depth"])
+
+    def test_backfill(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("animal", parents=["object"])
+
+        self.assertFalse(ont.management.materialized(ont.management.handle()))
+        self.assertEqual(3, ont.hierarchy.backfill(ont.management.handle()))
+        self.assertTrue(ont.management.materialized(ont.management.handle()))
+
+        animal = ont.management.handle().find_one({"name": "animal"})
+        self.assertEqual(["all", "object"], animal["ancestors"])
+        self.assertEqual(2, animal["depth"])
+
+    def test_backfill_edits_a_batch_at_a_time(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("animal", parents=["object"])
+
+        collection = ont.management.handle()
+        ont.hierarchy.backfill(collection, batch_size=2)
+
+        # Two batches, then the flag
+        entries = ont.management.edit_log(collection).find(
+            {"operation": "materialize_ancestors"}
+        )
+        self.assertEqual(3, len(list(entries)))
+        self.assertMaterialized()
+
+    def test_edits_maintain_materialized_fields(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("event", parents=["all"])
+        mock_concept("animal", parents=["object"])
+        mock_concept("dog", parents=["animal"])
+        ont.hierarchy.backfill(ont.management.handle())
+
+        OntologyAPI().add_parent("animal", "event")
+        self.assertMaterialized()
+
+        OntologyAPI().add_concept("pet", "animal", "")
+        OntologyAPI().add_parent("dog", "pet")
+        self.assertMaterialized()
+
+        OntologyAPI().remove_parent("animal", "object")
+        self.assertMaterialized()
+
+        OntologyAPI().remove_concept("animal", include_usages=True)
+        self.assertMaterialized()
+
+        OntologyAPI().apply_edits(
+            [
+                {"operation": "add_concept", "concept": "cat", "parent": "object"},
+                {"operation": "add_parent", "concept": "dog", "parent": "cat"},
+                {"operation": "add_parent", "concept": "missing", "parent": "cat"},
+            ]
+        )
+        self.assertMaterialized()
+
+    def test_descendants_use_materialized_ancestors(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        mock_concept("animal", parents=["object"])
+        mock_concept("dog", parents=["animal"])
+        ont.hierarchy.backfill(ont.management.handle())
+
+        self.assertEqual(["animal", "dog"], sorted(OntologyAPI().descendants("object")))
+
+        OntologyAPI().add_concept("cat", "animal", "")
+        self.assertEqual(
+            ["animal", "cat", "dog"], sorted(OntologyAPI().descendants("object"))
+        )
+
+    def test_rename_and_copy_carry_the_flag(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        ont.hierarchy.backfill(ont.management.handle())
+
+        ont.management.rename_collection("unittest", "renamed")
+        ont.management.copy_collection("renamed", "unittest")
+        db = ont.management.getclient()[ont.management.DATABASE]
+
+        self.assertTrue(ont.management.materialized(db["renamed"]))
+        self.assertTrue(ont.management.materialized(db["unittest"]))
+
+        OntologyAPI(collection=db["unittest"]).add_concept("animal", "object", "")
+        self.assertMaterialized()
+
+    def test_rematerialize(self):
+        mock_concept("all")
+        mock_concept("object", parents=["all"])
+        collection = ont.management.handle()
+
+        # Restored over a materialized name, without the fields
+        ont.management.set_materialized(collection, True)
+        ont.management.rematerialize(collection)
+        self.assertFalse(ont.management.materialized(collection))
+
+        # Restored with stale fields
+        collection.update_one(
+            {"name": "object"}, {"$set": {"ancestors": [], "depth": 0}}
+        )
+        ont.management.rematerialize(collection)
+        self.assertTrue(ont.management.materialized(collection))
+        self.assertMaterialized()
@@ -0,0 +1,154 @@
+from ont.api import OntologyAPI
+from ont.importer import import_concepts
+from tests.TestUtils import mock_concept
+
+import json
+import ont.hierarchy
+import ont.management
+import os
+import unittest
+
+
+class ImportConceptsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_import_concepts(self):
+        mock_concept("all")
+
+        lines = [
+            json.dumps({"name": "Object", "parents": ["all"]}),
+            json.dumps(
+                {
+                    "name": "animal",
+                    "parents": ["object"],
+                    "definition": "a living thing",
+                    "localProperties": [
+                        {"slot": "agent-of", "facet": "sem", "filler": "event"}
+                    ],
+                }
+            ),
+            "",
+            json.dumps({"name": "dog", "parents": ["animal"]}),
+        ]
+
+        report = import_concepts(ont.management.handle(), lines, chunk_size=2)
+        self.assertEqual(3, report["read"])
+        self.assertEqual(3, report["inserted"])
+        self.assertEqual([], report["errors"])
+        self.assertEqual({}, report["dangling"])
+
+        self.assertEqual(["animal", "object", "all"], OntologyAPI().ancestors("dog"))
+
+        animal = OntologyAPI().get("animal", metadata=True)[0]["animal"]
+        self.assertEqual("a living thing", animal["_metadata"]["definition"])
+        self.assertEqual("event", animal["agent-of"]["sem"][0]["filler"])
+
+        document = ont.management.handle().find_one({"name": "dog"})
+        self.assertEqual([], document["totallyRemovedProperties"])
+        self.assertEqual("", document["definition"])
+
+    def test_import_concepts_skips_duplicates_and_bad_lines(self):
+        mock_concept("all")
+
+        lines = [
+            json.dumps({"name": "all"}),
+            json.dumps({"name": "concept", "parents": ["all"]}),
+            json.dumps({"name": "concept", "parents": ["all"]}),
+            json.dumps({"parents": ["all"]}),
+            json.dumps({"name": "self", "parents": ["self"]}),
+            "{not json",
+        ]
+
+        report = import_concepts(ont.management.handle(), lines)
+        self.assertEqual(6, report["read"])
+        self.assertEqual(1, report["inserted"])
+        self.assertEqual(["all", "concept"], report["duplicates"])
+        self.assertEqual([4, 5, 6], list(map(lambda e: e["line"], report["errors"])))
+
+    def test_import_concepts_normalizes_parents(self):
+        mock_concept("all")
+
+        lines = [
+            json.dumps({"name": "event", "parents": "all"}),
+            json.dumps({"name": "object", "parents": {"name": "all"}}),
+            json.dumps({"name": "property", "parents": ["all", 1]}),
+        ]
+
+        report = import_concepts(ont.management.handle(), lines)
+        self.assertEqual(1, report["inserted"])
+        self.assertEqual([2, 3], list(map(lambda e: e["line"], report["errors"])))
+
+        document = ont.management.handle().find_one({"name": "event"})
+        self.assertEqual(["all"], document["parents"])
+
+    def test_import_concepts_reports_dangling_parents(self):
+        lines = [
+            json.dumps({"name": "child", "parents": ["parent", "missing"]}),
+            json.dumps({"name": "parent"}),
+        ]
+
+        report = import_concepts(ont.management.handle(), lines)
+        self.assertEqual(2, report["inserted"])
+        self.assertEqual({"missing": ["child"]}, report["dangling"])
+
+    def test_import_concepts_reports_progress(self):
+        lines = map(lambda i: json.dumps({"name": "concept%d" % i}), range(5))
+
+        reports = []
+        import_concepts(
+            ont.management.handle(),
+            lines,
+            chunk_size=2,
+            progress=lambda r: reports.append(r["inserted"]),
+        )
+
+        self.assertEqual([2, 4, 5], reports)
+
+    def test_import_concepts_edits_a_chunk_at_a_time(self):
+        lines = map(lambda i: json.dumps({"name": "concept%d" % i}), range(5))
+        collection = ont.management.handle()
+
+        # Between chunks, nothing is being written, and what is there can be read
+        writing = []
+        import_concepts(
+            collection,
+            lines,
+            chunk_size=2,
+            progress=lambda r: writing.append(
+                ont.management.pinned_version(collection)[1]
+            ),
+        )
+
+        self.assertEqual([False, False, False], writing)
+        entries = ont.management.edit_log(collection).find(
+            {"operation": "import_concepts"}
+        )
+        self.assertEqual(
+            [2, 2, 1], list(map(lambda e: e["arguments"]["inserted"], entries))
+        )
+
+    def test_import_concepts_rematerializes(self):
+        mock_concept("all")
+        collection = ont.management.handle()
+        ont.hierarchy.backfill(collection)
+
+        import_concepts(collection, [json.dumps({"name": "object", "parents": "all"})])
+
+        self.assertTrue(ont.management.materialized(collection))
+        self.assertEqual(["all"], collection.find_one({"name": "object"})["ancestors"])
+
+    def test_import_concepts_bumps_version(self):
+        version = OntologyAPI().version()
+
+        import_concepts(ont.management.handle(), [json.dumps({"name": "concept"})])
+        self.assertGreater(OntologyAPI().version(), version)
+        self.assertIn("concept", OntologyAPI().hierarchy())
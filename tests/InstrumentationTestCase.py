@@ -0,0 +1,106 @@
+from ont.api import OntologyAPI
+from ont.instrumentation import CommandCounter, measuring
+from tests.TestUtils import mock_concept
+from types import SimpleNamespace
+
+import ont.instrumentation
+import ont.management
+import os
+import pymongo.monitoring
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_public_methods_are_measured(self):
+        mock_concept("all")
+        mock_concept("concept", parents=["all"])
+
+        with measuring() as measurements:
+            OntologyAPI().get("concept")
+
+        methods = list(map(lambda m: m["method"], measurements))
+        self.assertIn("OntologyAPI.get", methods)
+        self.assertIn("OntologyAPI.format", methods)
+        self.assertNotIn("OntologyAPI._inherit", methods)
+
+        # The enclosing call is reported last, and includes the time of its nested calls
+        get = measurements[-1]
+        self.assertEqual("OntologyAPI.get", get["method"])
+        self.assertGreaterEqual(get["seconds"], measurements[0]["seconds"])
+
+    def test_failed_calls_are_measured(self):
+        with measuring() as measurements:
+            with self.assertRaises(Exception):
+                OntologyAPI().ancestors("missing")
+
+        self.assertEqual("OntologyAPI.ancestors", measurements[-1]["method"])
+
+    def test_hooks_are_removed(self):
+        with measuring() as measurements:
+            pass
+
+        OntologyAPI().roots()
+        self.assertEqual([], measurements)
+        self.assertEqual([], ont.instrumentation._hooks)
+
+    def test_commands_are_counted_for_every_active_call(self):
+        counter = CommandCounter()
+        reply = {"cursor": {"firstBatch": [{"name": "a"}, {"name": "b"}]}}
+
+        outer = {"commands": 0, "documents": 0}
+        inner = {"commands": 0, "documents": 0}
+        ont.instrumentation._active().extend([outer, inner])
+        try:
+            counter.started(SimpleNamespace())
+            counter.succeeded(SimpleNamespace(reply=reply))
+            ont.instrumentation._active().pop()
+            counter.started(SimpleNamespace())
+            counter.succeeded(SimpleNamespace(reply={"ok": 1}))
+        finally:
+            ont.instrumentation._active().clear()
+
+        self.assertEqual({"commands": 2, "documents": 2}, outer)
+        self.assertEqual({"commands": 1, "documents": 2}, inner)
+
+    def test_counting(self):
+        counter = CommandCounter()
+
+        with ont.instrumentation.counting() as counters:
+            counter.started(SimpleNamespace())
+        counter.started(SimpleNamespace())
+
+        self.assertEqual({"commands": 1, "documents": 0}, counters)
+        self.assertEqual([], ont.instrumentation._active())
+
+    def test_listener_is_registered_on_first_use(self):
+        # Importing the API registers nothing with pymongo
+        code = (
+            "import ont.api, pymongo.monitoring; "
+            "print(len(pymongo.monitoring._LISTENERS.command_listeners))"
+        )
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT)
+        self.assertEqual("0", output.decode("utf-8").strip())
+
+        with ont.instrumentation.counting():
+            pass
+        with measuring():
+            pass
+
+        listeners = pymongo.monitoring._LISTENERS.command_listeners
+        counters = list(filter(lambda l: isinstance(l, CommandCounter), listeners))
+        self.assertEqual(1, len(counters))
@@ -0,0 +1,145 @@
+from ont.api import OntologyAPI
+from ont.integrity import check, cycles, valid
+from tests.TestUtils import mock_concept
+
+import ont.management
+import os
+import unittest
+
+
+class CyclesTestCase(unittest.TestCase):
+
+    def test_no_cycles(self):
+        parents = {"all": [], "a": ["all"], "b": ["a", "all"], "c": ["b", "missing"]}
+        self.assertEqual([], cycles(parents))
+
+    def test_cycles(self):
+        parents = {
+            "all": [],
+            "a": ["all", "c"],
+            "b": ["a"],
+            "c": ["b"],
+            "d": ["d"],
+            "e": ["f"],
+            "f": ["e", "a"],
+        }
+        self.assertEqual([["a", "b", "c"], ["d"], ["e", "f"]], sorted(cycles(parents)))
+
+    def test_deep_hierarchy(self):
+        parents = {"concept-0": ["concept-9999"]}
+        for i in range(1, 10000):
+            parents["concept-%d" % i] = ["concept-%d" % (i - 1)]
+
+        found = cycles(parents)
+        self.assertEqual(1, len(found))
+        self.assertEqual(10000, len(found[0]))
+
+
+class IntegrityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_check_valid(self):
+        mock_concept("all")
+        mock_concept("relation", parents=["all"])
+        mock_concept(
+            "agent",
+            parents=["relation"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "agent-of"}],
+        )
+        mock_concept(
+            "event",
+            parents=["all"],
+            localProperties=[
+                {"slot": "agent", "facet": "sem", "filler": "all"},
+                {"slot": "agent-of", "facet": "sem", "filler": "event"},
+                {"slot": "definition", "facet": "value", "filler": "not a concept"},
+            ],
+        )
+
+        report = check(ont.management.handle())
+        self.assertEqual(4, report["concepts"])
+        self.assertTrue(valid(report))
+
+    def test_check(self):
+        mock_concept("all")
+        mock_concept("relation", parents=["all"])
+        mock_concept(
+            "theme",
+            parents=["relation"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "theme-of"}],
+        )
+        mock_concept(
+            "a",
+            parents=["b", "missing"],
+            localProperties=[
+                {"slot": "theme", "facet": "sem", "filler": "deleted"},
+                {"slot": "theme-of", "facet": "default", "filler": "all"},
+                {"slot": "theme", "facet": "sem", "filler": 1},
+            ],
+        )
+        mock_concept("b", parents=["a"])
+        mock_concept("b", parents=["all"])
+
+        report = check(ont.management.handle())
+        self.assertFalse(valid(report))
+        self.assertEqual(["b"], report["duplicates"])
+        self.assertEqual([["a", "b"]], report["cycles"])
+        self.assertEqual({"a": ["missing"]}, report["dangling_parents"])
+        self.assertEqual(
+            [{"concept": "a", "slot": "theme", "facet": "sem", "filler": "deleted"}],
+            report["dangling_fillers"],
+        )
+
+    def test_add_parent_rejects_cycles(self):
+        mock_concept("all")
+        mock_concept("a", parents=["all"])
+        mock_concept("b", parents=["a"])
+
+        with self.assertRaises(Exception):
+            OntologyAPI().add_parent("all", "b")
+        with self.assertRaises(Exception):
+            OntologyAPI().add_parent("a", "b")
+
+        OntologyAPI().add_parent("b", "all")
+        self.assertTrue(valid(check(ont.management.handle())))
+
+    def test_apply_edits_rejects_cycles(self):
+        mock_concept("all")
+        mock_concept("a", parents=["all"])
+
+        results = OntologyAPI().apply_edits(
+            [
+                {
+                    "operation": "add_concept",
+                    "concept": "b",
+                    "parent": "a",
+                    "definition": "",
+                },
+                {
+                    "operation": "add_concept",
+                    "concept": "c",
+                    "parent": None,
+                    "definition": "",
+                },
+                {"operation": "add_parent", "concept": "c", "parent": "b"},
+                {"operation": "add_parent", "concept": "a", "parent": "c"},
+                {"operation": "remove_parent", "concept": "c", "parent": "b"},
+                {"operation": "add_parent", "concept": "all", "parent": "c"},
+            ]
+        )
+
+        self.assertEqual(
+            [True, True, True, False, True, True],
+            list(map(lambda r: r["applied"], results)),
+        )
+        self.assertIn("descendant", results[3]["error"])
+        self.assertTrue(valid(check(ont.management.handle())))
@@ -0,0 +1,116 @@
+from ont.api import OntologyAPI
+
+import ont.jobs
+import ont.management
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class JobsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.db = client["unittest"]
+        self.api = OntologyAPI(collection=self.db["unittest"])
+
+        self.api.add_concept("all", None, "")
+        self.api.add_concept("object", "all", "")
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_claim_respects_workers_and_limits(self):
+        runner = ont.jobs.Runner(workers=2, limits={"compile": 1})
+
+        first = ont.jobs.submit("compile", collection="unittest")
+        second = ont.jobs.submit("compile", collection="unittest")
+        export = ont.jobs.submit("export", collection="unittest", format="lisp")
+
+        job = runner.claim()
+        self.assertEqual(first, job["_id"])
+        self.assertEqual(ont.jobs.RUNNING, job["status"])
+        runner.running[job["_id"]] = (job, None)
+
+        # The second compile waits for the first, so the export goes ahead of it
+        job = runner.claim()
+        self.assertEqual(export, job["_id"])
+        runner.running[job["_id"]] = (job, None)
+
+        self.assertIsNone(runner.claim())
+        self.assertEqual(ont.jobs.QUEUED, ont.jobs.get(second)["status"])
+
+    def test_execute_records_result_and_timings(self):
+        id = ont.jobs.submit("compile", collection="unittest")
+        ont.jobs.Runner().claim()
+        ont.jobs.execute(id)
+
+        job = ont.jobs.get(id)
+        self.assertEqual(ont.jobs.FINISHED, job["status"])
+        self.assertGreaterEqual(job["seconds"], 0)
+        self.assertGreaterEqual(job["started"], job["submitted"])
+
+        progress = self.db["compiled_unittest"].find_one({"_id": "PROGRESS"})
+        self.assertIsNotNone(progress["finished"])
+
+    def test_execute_records_errors_in_log(self):
+        # Nothing has been compiled to export
+        os.environ[ont.management.EXPORT_PATH] = tempfile.mkdtemp()
+        id = ont.jobs.submit("export", collection="unittest", format="lisp")
+        ont.jobs.Runner().claim()
+        try:
+            ont.jobs.execute(id)
+        finally:
+            shutil.rmtree(os.environ.pop(ont.management.EXPORT_PATH))
+
+        job = ont.jobs.get(id)
+        self.assertEqual(ont.jobs.FAILED, job["status"])
+        self.assertEqual("PermissionError", job["error"])
+        self.assertEqual("Traceback (most recent call last):", job["log"][0])
+
+    def test_cancel(self):
+        queued = ont.jobs.submit("compile", collection="unittest")
+        running = ont.jobs.submit("export", collection="unittest", format="lisp")
+        ont.jobs.jobs_collection().update_one(
+            {"_id": running}, {"$set": {"status": ont.jobs.RUNNING}}
+        )
+
+        self.assertTrue(ont.jobs.cancel(queued))
+        self.assertEqual(ont.jobs.CANCELLED, ont.jobs.get(queued)["status"])
+        self.assertIsNone(ont.jobs.Runner().claim())
+
+        # A running job is left to its runner to stop
+        self.assertTrue(ont.jobs.cancel(running))
+        self.assertIsNotNone(ont.jobs.get(running)["cancelling"])
+        self.assertFalse(ont.jobs.cancel(queued))
+
+    def test_running_archive_is_not_cancelled(self):
+        class Process(object):
+            def is_alive(self):
+                return True
+
+            def terminate(self):
+                raise AssertionError("Terminated")
+
+        id = ont.jobs.submit("archive", collection="unittest", name="archived")
+        runner = ont.jobs.Runner()
+        job = runner.claim()
+        runner.running[id] = (job, Process())
+
+        self.assertFalse(ont.jobs.cancel(id))
+        self.assertNotIn("cancelling", ont.jobs.get(id))
+
+        # Nor is one whose cancellation was requested by other means
+        ont.jobs.jobs_collection().update_one({"_id": id}, {"$set": {"cancelling": 0}})
+        runner.poll()
+        self.assertEqual(ont.jobs.RUNNING, ont.jobs.get(id)["status"])
+
+    def test_unknown_kind(self):
+        with self.assertRaises(Exception):
+            ont.jobs.submit("unknown")
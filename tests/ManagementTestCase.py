@@ -0,0 +1,65 @@
+from tests.TestUtils import mock_concept
+
+import ont.management
+import os
+import unittest
+
+
+class IndexesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def indexed(self, name) -> dict:
+        client = ont.management.getclient()
+        indexes = client[ont.management.DATABASE][name].index_information()
+        return dict(
+            map(lambda i: (i["key"][0][0], i.get("unique", False)), indexes.values())
+        )
+
+    def test_ensure_indexes(self):
+        ont.management.ensure_indexes("unittest")
+
+        indexed = self.indexed("unittest")
+        self.assertTrue(indexed["name"])
+        self.assertFalse(indexed["parents"])
+        self.assertFalse(indexed["localProperties.slot"])
+        self.assertFalse(indexed["localProperties.filler"])
+
+    def test_ensure_indexes_is_idempotent(self):
+        ont.management.ensure_indexes("unittest")
+        ont.management.ensure_indexes("unittest")
+
+        self.assertEqual(7, len(ont.management.handle().index_information()))
+
+    def test_ensure_indexes_tolerates_duplicate_names(self):
+        mock_concept("concept")
+        mock_concept("concept")
+
+        ont.management.ensure_indexes("unittest")
+        self.assertFalse(self.indexed("unittest")["name"])
+
+        # As when the collection is activated, copied or restored again
+        ont.management.ensure_indexes("unittest")
+        self.assertFalse(self.indexed("unittest")["name"])
+
+    def test_activate_ensures_indexes(self):
+        ont.management.activate("other")
+
+        try:
+            self.assertIn("parents", self.indexed("other"))
+        finally:
+            os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+    def test_copy_collection_ensures_indexes(self):
+        mock_concept("all")
+        ont.management.copy_collection("unittest", "copied")
+
+        self.assertTrue(self.indexed("copied")["name"])
@@ -59,6 +59,25 @@ class APIGetServiceTestCase(unittest.TestCase):
         response = json.loads(response.data)
         self.assertEqual(response, OntologyAPI().get("child", local=True))
 
+    def test_get_slots(self):
+        concept = mock_concept(
+            "concept",
+            localProperties=[
+                {"slot": "agent", "facet": "sem", "filler": "human"},
+                {"slot": "agent", "facet": "default", "filler": "doctor"},
+                {"slot": "theme", "facet": "sem", "filler": "object"},
+            ],
+        )
+
+        response = self.app.get(
+            "/ontology/api/get?concept=concept&slot=agent&slot=is-a&facet=sem&facet=value"
+        )
+        response = json.loads(response.data)
+        self.assertEqual(
+            response,
+            [{"concept": {"is-a": {"value": []}, "agent": {"sem": ["human"]}}}],
+        )
+
 
 class APIRootsServiceTestCase(unittest.TestCase):
 
@@ -381,6 +400,95 @@ class APIRelationsServiceTestCase(unittest.TestCase):
         self.assertTrue("rel3-of" in response)
 
 
+class APIRelationsToInversesServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.app = service.test_client()
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_relations_to_inverses(self):
+        mock_concept("relation")
+        mock_concept(
+            "rel1",
+            parents=["relation"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "rel1-of"}],
+        )
+        mock_concept("rel2", parents=["rel1"])
+
+        response = self.app.get("/ontology/api/relations_to_inverses")
+        response = json.loads(response.data)
+
+        self.assertEqual(
+            {"relation": "relation", "rel1": "rel1-of", "rel2": "rel1-of"}, response
+        )
+
+
+class APICheckFillersServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.app = service.test_client()
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_check_fillers_requires_triples(self):
+        response = self.app.post("/ontology/api/check_fillers", json={})
+        self.assertEqual(400, response.status_code)
+
+        response = self.app.post(
+            "/ontology/api/check_fillers", json={"triples": [["a", "b"]]}
+        )
+        self.assertEqual(400, response.status_code)
+
+    def test_check_fillers_rejects_malformed_triples(self):
+        mock_concept("all")
+
+        for triples in [
+            "event agent human",
+            ["event", "agent", "human"],
+            [{"concept": "event", "slot": "agent", "filler": "human"}],
+            [["event", "agent", "human", "all"]],
+            [["event", "agent", 1]],
+            [["event", None, "human"]],
+        ]:
+            response = self.app.post(
+                "/ontology/api/check_fillers", json={"triples": triples}
+            )
+            self.assertEqual(400, response.status_code)
+
+    def test_check_fillers(self):
+        mock_concept("all")
+        mock_concept("human", parents=["all"])
+        mock_concept(
+            "event",
+            localProperties=[{"slot": "agent", "facet": "sem", "filler": "all"}],
+        )
+
+        response = self.app.post(
+            "/ontology/api/check_fillers",
+            json={
+                "triples": [["event", "agent", "human"], ["event", "theme", "human"]]
+            },
+        )
+        response = json.loads(response.data)
+
+        self.assertEqual(["sem", None], list(map(lambda r: r["verdict"], response)))
+
+
 class APIDomainsAndRangesServiceTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -429,6 +537,28 @@ class APIDomainsAndRangesServiceTestCase(unittest.TestCase):
         self.assertEqual({"d1": ["r1", "r2", "r3"], "d2": ["r1", "r2"]}, response)
 
 
+class APIVersionServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.app = service.test_client()
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_version(self):
+        mock_concept("concept")
+
+        response = self.app.get("/ontology/api/version")
+        response = json.loads(response.data)
+        self.assertEqual(OntologyAPI().version(), response)
+
+
 class APIEditDefineServiceTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -694,6 +824,26 @@ class APIEditAddParentServiceTestCase(unittest.TestCase):
             json.loads(response.data.decode("utf-8")),
         )
 
+    def test_400_if_cycle(self):
+        mock_concept("parent")
+        mock_concept("child", parents=["parent"])
+
+        data = {"parent": "child"}
+
+        response = self.app.post(
+            "/ontology/edit/add_parent/parent",
+            data=json.dumps(data),
+            content_type="application/json",
+        )
+        self.assertEqual(400, response._status_code)
+        self.assertEqual(
+            {
+                "message": "Cannot assign child as a parent of parent; child is already its descendant."
+            },
+            json.loads(response.data.decode("utf-8")),
+        )
+        self.assertEqual([], OntologyAPI().ancestors("parent"))
+
 
 class APIEditRemoveParentServiceTestCase(unittest.TestCase):
 
@@ -732,6 +882,80 @@ class APIEditRemoveParentServiceTestCase(unittest.TestCase):
         self.assertEqual([], OntologyAPI().ancestors("child", immediate=True))
 
 
+class APIEditBatchServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.app = service.test_client()
+        ont.service.EDITING_ENABLED = True
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_403_if_editing_disabled(self):
+        ont.service.EDITING_ENABLED = False
+        response = self.app.post("/ontology/edit/batch")
+        self.assertEqual(403, response._status_code)
+
+    def test_400_without_edits(self):
+        response = self.app.post(
+            "/ontology/edit/batch",
+            data=json.dumps({"edit": []}),
+            content_type="application/json",
+        )
+        self.assertEqual(400, response._status_code)
+
+    def test_400_with_malformed_edits(self):
+        mock_concept("concept")
+
+        for edits in [
+            ["oops"],
+            [{"concept": "concept", "definition": ""}],
+            [{"operation": 1, "concept": "concept", "definition": ""}],
+            [{"operation": "update_definition", "concept": 1, "definition": ""}],
+            [
+                {
+                    "operation": "remove_concept",
+                    "concept": "concept",
+                    "include_usages": 1,
+                }
+            ],
+        ]:
+            response = self.app.post(
+                "/ontology/edit/batch",
+                data=json.dumps({"edits": edits}),
+                content_type="application/json",
+            )
+            self.assertEqual(400, response._status_code)
+
+    def test_batch(self):
+        mock_concept("parent")
+        mock_concept("child")
+
+        data = {
+            "edits": [
+                {"operation": "add_parent", "concept": "child", "parent": "parent"},
+                {"operation": "add_parent", "concept": "child", "parent": "unknown"},
+            ]
+        }
+
+        response = self.app.post(
+            "/ontology/edit/batch",
+            data=json.dumps(data),
+            content_type="application/json",
+        )
+        self.assertEqual(200, response._status_code)
+
+        results = json.loads(response.data)
+        self.assertEqual([True, False], list(map(lambda r: r["applied"], results)))
+        self.assertEqual(["parent"], OntologyAPI().ancestors("child", immediate=True))
+
+
 class APIEditAddConceptParentServiceTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -841,3 +1065,73 @@ class APIEditRemoveConceptParentServiceTestCase(unittest.TestCase):
 
         self.assertEqual(0, len(OntologyAPI().get("concept")))
         self.assertEqual([], OntologyAPI().ancestors("child"))
+
+
+class ManageDiffServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.app = service.test_client()
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_400_without_collections(self):
+        response = self.app.get("/ontology/manage/diff?original=unittest")
+        self.assertEqual(400, response.status_code)
+
+    def test_diff(self):
+        mock_concept("all")
+        ont.management.copy_collection("unittest", "copied")
+        OntologyAPI().add_concept("concept", "all", "")
+
+        response = self.app.get(
+            "/ontology/manage/diff?original=copied&updated=unittest"
+        )
+        lines = response.data.decode("utf-8").splitlines()
+
+        self.assertEqual(
+            [{"concept": "concept", "change": "added"}], list(map(json.loads, lines))
+        )
+
+
+class ManageJobsServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        client = ont.management.getclient()
+
+        ont.management.DATABASE = "unittest"
+        os.environ[ont.management.ONTOLOGY_ACTIVE] = "unittest"
+
+        self.app = service.test_client()
+
+    def tearDown(self):
+        client = ont.management.getclient()
+        client.drop_database("unittest")
+
+    def test_compile_is_queued(self):
+        response = self.app.post(
+            "/ontology/manage/compile", data={"ontology": "unittest", "inh": "on"}
+        )
+        self.assertEqual(302, response.status_code)
+
+        jobs = json.loads(self.app.get("/ontology/manage/jobs").data)
+        self.assertEqual(1, len(jobs))
+        self.assertEqual("compile", jobs[0]["kind"])
+        self.assertEqual("queued", jobs[0]["status"])
+        self.assertTrue(jobs[0]["arguments"]["compile_inherited_values"])
+
+        job = json.loads(self.app.get("/ontology/manage/jobs/" + jobs[0]["_id"]).data)
+        self.assertEqual([], job["log"])
+
+    def test_404_for_unknown_job(self):
+        response = self.app.get("/ontology/manage/jobs/unknown")
+        self.assertEqual(404, response.status_code)
+
+        response = self.app.get("/ontology/manage/jobs/unknown/download")
+        self.assertEqual(404, response.status_code)
@@ -1,6 +1,13 @@
+import ont.instrumentation
 import ont.management
 
 
+def count_commands():
+    # Counts the Mongo commands issued inside the block (on this thread), for asserting
+    # round-trip budgets: with count_commands() as counters: ...; counters["commands"]
+    return ont.instrumentation.counting()
+
+
 def mock_concept(
     name,
     definition=None,
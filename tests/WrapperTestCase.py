@@ -40,6 +40,30 @@ class OntologyWrapperTestCase(unittest.TestCase):
         response = Ontology().get(["concept"], local=True)
         self.assertEqual(response, [OntologyAPI().format(concept, local=True)])
 
+    def test_get_slots_and_facets(self):
+        parent = mock_concept(
+            "parent",
+            localProperties=[
+                {"slot": "agent", "facet": "sem", "filler": "human"},
+                {"slot": "agent", "facet": "default", "filler": "doctor"},
+            ],
+        )
+        concept = mock_concept(
+            "concept",
+            parents=["parent"],
+            localProperties=[{"slot": "theme", "facet": "sem", "filler": "object"}],
+        )
+
+        response = Ontology().get(
+            ["concept"], local=False, slots=["agent"], facets=["sem"]
+        )
+        self.assertEqual([{"concept": {"agent": {"sem": ["human"]}}}], response)
+
+        response = Ontology().get(["concept"], facets=["sem"])
+        self.assertEqual(
+            response, OntologyAPI().get("concept", local=True, facets=["sem"])
+        )
+
     def test_search(self):
         c = mock_concept("concept")
 
@@ -231,6 +255,40 @@ class OntologyWrapperTestCase(unittest.TestCase):
         self.assertTrue("rel2-of" in relations)
         self.assertTrue("rel3-of" in relations)
 
+    def test_relations_to_inverses(self):
+        mock_concept("relation")
+        mock_concept(
+            "rel1",
+            parents=["relation"],
+            localProperties=[{"slot": "inverse", "facet": "sem", "filler": "rel1-of"}],
+        )
+        mock_concept("rel2", parents=["rel1"])
+
+        relations_to_inverses = Ontology().relations_to_inverses()
+        self.assertEqual("rel1-of", relations_to_inverses["rel1"])
+        self.assertEqual("rel1-of", relations_to_inverses["rel2"])
+        self.assertEqual(relations_to_inverses, OntologyAPI().relations_to_inverses())
+
+    def test_check_fillers(self):
+        mock_concept("all")
+        mock_concept("human", parents=["all"])
+        mock_concept(
+            "event",
+            parents=["all"],
+            localProperties=[{"slot": "agent", "facet": "sem", "filler": "all"}],
+        )
+
+        results = Ontology().check_fillers(
+            [("event", "agent", "human"), ("event", "theme", "human")]
+        )
+        self.assertEqual(["sem", None], list(map(lambda r: r["verdict"], results)))
+        self.assertEqual(
+            results,
+            OntologyAPI().check_fillers(
+                [("event", "agent", "human"), ("event", "theme", "human")]
+            ),
+        )
+
     def test_domains_and_ranges(self):
         mock_concept(
             "d1", localProperties=[{"slot": "prop", "facet": "sem", "filler": "r1"}]
@@ -527,3 +585,26 @@ class OntologyWrapperTestCase(unittest.TestCase):
         self.assertIn(
             "other1", OntologyAPI().get("other2")[0]["other2"]["slot1"]["sem"]
         )
+
+    def test_edit_apply_edits(self):
+        parent = mock_concept("parent")
+        child = mock_concept("child")
+
+        results = Ontology().apply_edits(
+            [
+                {"operation": "add_parent", "concept": "child", "parent": "parent"},
+                {
+                    "operation": "insert_property",
+                    "concept": "child",
+                    "slot": "slot",
+                    "facet": "sem",
+                    "filler": "value",
+                },
+            ]
+        )
+        self.assertEqual([True, True], list(map(lambda r: r["applied"], results)))
+
+        self.assertEqual(["parent"], OntologyAPI().ancestors("child", immediate=True))
+        self.assertEqual(
+            ["value"], OntologyAPI().get("child")[0]["child"]["slot"]["sem"]
+        )